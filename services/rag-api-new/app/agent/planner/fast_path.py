@@ -0,0 +1,340 @@
+"""
+Fast-path planner - deterministic QueryPlanV3 for unambiguous questions.
+
+Questions like "контакты", "где сейчас работает", "какие проекты с RAG" map
+onto one IntentV3 plus at most one entity from EntityRegistry. They are
+routed here by patterns, registry entities and ScopeGuard signals, and the
+Planner LLM round trip is skipped. The plan confidence is the product of
+the rule, entity, scope and complexity factors. When it is below the
+threshold (settings.planner_fast_path_threshold), the question goes to
+PlannerLLM as before.
+
+Decisions and planning latency (fast path vs LLM) are reported under
+"planner_fast_path" in /admin/stats.
+"""
+from __future__ import annotations
+
+import collections
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Pattern, Sequence, Tuple
+
+from .schemas_v3 import (
+    AnswerStyleV3,
+    FallbackConfigV3,
+    InfoNeed,
+    IntentV3,
+    LimitsConfigV3,
+    QueryPlanV3,
+    RenderStyleV3,
+    TechCategory,
+    TechFilter,
+    ToolCallV3,
+)
+from ...rag.entities import get_entity_registry
+from ...rag.search_types import Entity, EntityType
+from ...utils.cache import register_cache_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.8
+
+
+def _compile(*patterns: str) -> Tuple[Pattern[str], ...]:
+    return tuple(re.compile(p) for p in patterns)
+
+
+# Intents without an entity: (intent, patterns, base confidence)
+_PLAIN_RULES: Sequence[Tuple[IntentV3, Tuple[Pattern[str], ...], float]] = (
+    (IntentV3.CONTACTS, _compile(
+        r"\bконтакт", r"\bсвязат[ьс]", r"\bcontacts?\b", r"\bтелеграм", r"\btelegram\b",
+        r"\be-?mail\b", r"\bпочт[аыу]\b",
+    ), 0.95),
+    (IntentV3.CURRENT_JOB, _compile(
+        r"\bгде\s+(?:сейчас\s+)?работает\b", r"\bгде\s+работает\s+сейчас\b",
+        r"\bтекущ\w*\s+(?:мест\w*\s+работы|работ\w*|должност\w*|позици\w*)",
+        r"\bcurrent\s+(?:job|position|role)\b", r"\bwhere\s+does\s+\w+\s+work\b",
+    ), 0.95),
+    (IntentV3.EXPERIENCE_SUMMARY, _compile(
+        r"\bопыт\w*\s+работы\b", r"\bгде\s+(?:раньше\s+)?работал\b", r"\bкарьер",
+        r"\bwork\s+experience\b", r"\bсколько\s+лет\s+опыта\b",
+    ), 0.85),
+)
+
+# technology_overview by category: (tool tech_category, patterns); order matters
+_CATEGORY_RULES: Sequence[Tuple[str, Tuple[Pattern[str], ...]]] = (
+    ("vector_store", _compile(r"\bвекторн\w*\s+(?:баз|бд|хранилищ)", r"\bvector\s+(?:stores?|databases?)\b")),
+    ("language", _compile(r"\bязык\w*\s+программировани", r"\bкакие\s+языки\b", r"\bprogramming\s+languages?\b")),
+    ("database", _compile(r"\bбаз\w*\s+данных\b", r"\bкакие\s+(?:бд|субд)\b", r"\bdatabases?\b")),
+    ("framework", _compile(r"\bфреймворк", r"\bframeworks?\b")),
+    ("message_broker", _compile(r"\bброкер\w*\s+сообщений\b", r"\bmessage\s+brokers?\b")),
+    ("library", _compile(r"\bбиблиотек", r"\blibrar(?:y|ies)\b")),
+)
+_CATEGORY_CONFIDENCE = 0.9
+
+# Cues that pick the intent for a question about one entity
+_ACHIEVEMENT_CUES = _compile(r"\bдостижени", r"\bрезультат", r"\bachievements?\b")
+_STACK_CUES = _compile(r"\bтехнолог", r"\bстек", r"\bstack\b", r"\bна\s+ч[её]м\s+(?:написан|сделан)")
+_USAGE_CUES = _compile(
+    r"\bгде\b", r"\bпримен", r"\bиспольз", r"\bопыт", r"\bпроект\w*\s+(?:с|на)\b",
+    r"\bработал\w*\s+с\b", r"\bwhere\b", r"\bused?\b",
+)
+_EXPERIENCE_CUES = _compile(
+    r"\bчто\s+делал", r"\bчем\s+занимал", r"\bобязанност", r"\bопыт", r"\bработал", r"\bрол[ьи]\b",
+)
+
+# Signs of a compound or comparative question
+_COMPOUND_CUES = _compile(
+    r"\bи\s+(?:где|какие|как|что|сколько|почему|зачем)\b", r"\bа\s+также\b",
+    r"\bсравни", r"\bотлича", r"\bлучше\b", r"\bпочему\b", r"\bзачем\b",
+)
+_MAX_WORDS = 12
+
+# InfoNeed, render style and limits per intent (mirrors the Planner prompt examples)
+_PRESETS: Dict[IntentV3, Tuple[InfoNeed, RenderStyleV3, AnswerStyleV3, Tuple[int, int, int], List[str]]] = {
+    IntentV3.CONTACTS: (InfoNeed.DETAILS, RenderStyleV3.BULLETS, AnswerStyleV3.NATURAL_RU, (10, 2, 1), ["NO_RESULTS"]),
+    IntentV3.CURRENT_JOB: (InfoNeed.ROLE, RenderStyleV3.SHORT, AnswerStyleV3.NATURAL_RU, (5, 2, 2), ["NO_RESULTS"]),
+    IntentV3.EXPERIENCE_SUMMARY: (
+        InfoNeed.RESPONSIBILITIES, RenderStyleV3.GROUPED_BULLETS, AnswerStyleV3.NATURAL_RU, (15, 6, 3),
+        ["NO_RESULTS", "LOW_COVERAGE"],
+    ),
+    IntentV3.TECHNOLOGY_OVERVIEW: (InfoNeed.SUMMARY, RenderStyleV3.BULLETS, AnswerStyleV3.NATURAL_RU, (12, 3, 2), ["NO_RESULTS"]),
+    IntentV3.TECHNOLOGY_USAGE: (
+        InfoNeed.USAGE, RenderStyleV3.GROUPED_BULLETS, AnswerStyleV3.NATURAL_RU, (10, 4, 3),
+        ["NO_RESULTS", "LOW_COVERAGE"],
+    ),
+    IntentV3.PROJECT_DETAILS: (InfoNeed.DETAILS, RenderStyleV3.SHORT, AnswerStyleV3.DETAILED, (10, 4, 4), ["NO_RESULTS"]),
+    IntentV3.PROJECT_ACHIEVEMENTS: (
+        InfoNeed.ACHIEVEMENTS, RenderStyleV3.BULLETS, AnswerStyleV3.NATURAL_RU, (10, 4, 4),
+        ["NO_RESULTS", "LOW_COVERAGE"],
+    ),
+    IntentV3.PROJECT_TECH_STACK: (InfoNeed.TECH_STACK, RenderStyleV3.BULLETS, AnswerStyleV3.NATURAL_RU, (12, 3, 2), ["NO_RESULTS"]),
+}
+
+
+@dataclass(frozen=True)
+class FastPathRoute:
+    """Rule-based routing decision (before building QueryPlanV3)."""
+    intent: IntentV3
+    confidence: float
+    entity: Entity | None = None
+    tech_category: str | None = None
+    rule: str = ""
+
+
+def _any(patterns: Sequence[Pattern[str]], text: str) -> bool:
+    return any(p.search(text) for p in patterns)
+
+
+def _entity_route(entity: Entity, q: str) -> Tuple[IntentV3, float, str] | None:
+    """Intent for a question about a single entity: (intent, base confidence, rule)."""
+    if entity.type == EntityType.TECHNOLOGY:
+        if _any(_USAGE_CUES, q):
+            return IntentV3.TECHNOLOGY_USAGE, 0.9, "technology_usage"
+        return IntentV3.TECHNOLOGY_USAGE, 0.8, "technology_bare"
+    if entity.type == EntityType.PROJECT:
+        if _any(_ACHIEVEMENT_CUES, q):
+            return IntentV3.PROJECT_ACHIEVEMENTS, 0.9, "project_achievements"
+        if _any(_STACK_CUES, q):
+            return IntentV3.PROJECT_TECH_STACK, 0.9, "project_tech_stack"
+        return IntentV3.PROJECT_DETAILS, 0.85, "project_details"
+    if entity.type == EntityType.COMPANY:
+        if _any(_ACHIEVEMENT_CUES, q):
+            return IntentV3.PROJECT_ACHIEVEMENTS, 0.85, "company_achievements"
+        if _any(_EXPERIENCE_CUES, q):
+            return IntentV3.EXPERIENCE_SUMMARY, 0.9, "company_experience"
+        return IntentV3.EXPERIENCE_SUMMARY, 0.8, "company_bare"
+    return None
+
+
+def route_question(question: str, entities: Sequence[Entity], scope_reason: str = "") -> Tuple[FastPathRoute | None, str]:
+    """
+    Route a question by rules.
+
+    Args:
+        question: User's question
+        entities: EntityRegistry.extract_entities(question)
+        scope_reason: ScopeDecision.reason of an in-scope portfolio question
+
+    Returns:
+        (route, "") or (None, reason the question is deferred to the LLM)
+    """
+    q = " ".join(question.lower().split())
+    found = {(e.type, e.slug): e for e in entities if e.type != EntityType.PERSON}
+    if len(found) > 1:
+        return None, "ambiguous_entities"
+
+    candidates: List[Tuple[IntentV3, float, Entity | None, str | None, str]] = []
+    for intent, patterns, base in _PLAIN_RULES:
+        if _any(patterns, q):
+            candidates.append((intent, base, None, None, intent.value))
+    for category, patterns in _CATEGORY_RULES:
+        if _any(patterns, q):
+            candidates.append((IntentV3.TECHNOLOGY_OVERVIEW, _CATEGORY_CONFIDENCE, None, category, f"category_{category}"))
+            break
+    if found:
+        entity = next(iter(found.values()))
+        routed = _entity_route(entity, q)
+        if routed is not None:
+            # the entity decides over plain rules ("опыт работы с Python")
+            intent, base, rule = routed
+            candidates = [(intent, base, entity, None, rule)]
+    if not candidates:
+        return None, "no_rule"
+
+    intent, confidence, entity, category, rule = candidates[0]
+    if len({c[0] for c in candidates}) > 1:
+        confidence *= 0.8
+    if entity is not None:
+        # exact alias 1.0 -> 1.0, partial 0.7 -> ~0.84, fuzzy 0.4..0.6 -> 0.63..0.77
+        confidence *= entity.confidence ** 0.5
+    if _any(_COMPOUND_CUES, q) or q.count("?") > 1:
+        confidence *= 0.8
+    if len(q.split()) > _MAX_WORDS:
+        confidence *= 0.85
+    if scope_reason and not scope_reason.startswith("portfolio_patterns_matched") and entity is None:
+        # ScopeGuard saw no portfolio signal: rule-only match is weaker
+        confidence *= 0.9
+    return FastPathRoute(intent, round(confidence, 3), entity, category, rule), ""
+
+
+def build_plan(route: FastPathRoute) -> QueryPlanV3:
+    """QueryPlanV3 for a route, in the shape of the Planner prompt examples."""
+    info_need, render_style, answer_style, (max_items, max_groups, max_paragraphs), when = _PRESETS[route.intent]
+    args: Dict[str, Any] = {"intent": route.intent.value}
+    entities: List[Dict[str, Any]] = []
+    if route.entity is not None:
+        entity_id = f"{route.entity.type.value}:{route.entity.slug}"
+        args["entity_id"] = entity_id
+        entities.append({
+            "type": route.entity.type.value,
+            "id": entity_id,
+            "name": route.entity.name,
+            "confidence": route.entity.confidence,
+        })
+    tech_filter = None
+    if route.tech_category:
+        args["tech_category"] = route.tech_category
+        if route.tech_category in {c.value for c in TechCategory}:
+            tech_filter = TechFilter(category=TechCategory(route.tech_category), strict=True)
+
+    return QueryPlanV3(
+        intents=[route.intent],
+        entities=entities,
+        tool_calls=[ToolCallV3(tool="graph_query_tool", args=args)],
+        fallback=FallbackConfigV3(enabled=True, tool="portfolio_search_tool", when=list(when)),
+        limits=LimitsConfigV3(max_items=max_items, max_groups=max_groups, max_paragraphs=max_paragraphs),
+        render_style=render_style,
+        answer_style=answer_style,
+        confidence=route.confidence,
+        tech_filter=tech_filter,
+        info_need=info_need,
+    )
+
+
+class FastPathPlanner:
+    """
+    Rule-based planner stage in front of PlannerLLM.
+
+    plan() returns a QueryPlanV3 when the route confidence reaches the
+    threshold, otherwise None (use the LLM). Counts decisions and planning
+    latency for stats().
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, history: int = 1024):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._fast = 0
+        self._deferred: Counter[str] = Counter()
+        self._by_intent: Counter[str] = Counter()
+        self._fast_ms: Deque[float] = collections.deque(maxlen=history)
+        self._llm_ms: Deque[float] = collections.deque(maxlen=history)
+        register_cache_stats("planner_fast_path", self.stats)
+
+    def route(self, question: str) -> Tuple[FastPathRoute | None, str]:
+        from ..scope_guard.scope_guard import get_scope_guard
+
+        decision = get_scope_guard().evaluate(question)
+        if not decision.in_scope or decision.category != "portfolio":
+            return None, "scope"
+        entities = get_entity_registry().extract_entities(question)
+        return route_question(question, entities, decision.reason)
+
+    def plan(self, question: str) -> QueryPlanV3 | None:
+        started = time.perf_counter()
+        try:
+            route, reason = self.route(question)
+        except Exception as e:
+            logger.warning("Fast-path planner failed: %s", e)
+            route, reason = None, "error"
+        if route is not None and route.confidence < self.threshold:
+            reason = "low_confidence"
+        if reason:
+            with self._lock:
+                self._deferred[reason] += 1
+            logger.info(
+                "Fast-path planner deferred to LLM: reason=%s route=%s",
+                reason, route and (route.rule, route.confidence),
+            )
+            return None
+
+        plan = build_plan(route)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._fast += 1
+            self._by_intent[route.intent.value] += 1
+            self._fast_ms.append(elapsed_ms)
+        logger.info(
+            "Fast-path plan: rule=%s intent=%s entity=%s confidence=%.2f (%.2f ms)",
+            route.rule, route.intent.value,
+            route.entity and f"{route.entity.type.value}:{route.entity.slug}",
+            route.confidence, elapsed_ms,
+        )
+        return plan
+
+    def record_llm(self, elapsed_ms: float) -> None:
+        """Planning latency of a question that went to the Planner LLM."""
+        with self._lock:
+            self._llm_ms.append(elapsed_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            deferred = sum(self._deferred.values())
+            total = self._fast + deferred
+            llm_avg = sum(self._llm_ms) / len(self._llm_ms) if self._llm_ms else 0.0
+            fast_avg = sum(self._fast_ms) / len(self._fast_ms) if self._fast_ms else 0.0
+            return {
+                "threshold": self.threshold,
+                "questions": total,
+                "fast_path": self._fast,
+                "deferred": deferred,
+                "avoided_share": self._fast / total if total else 0.0,
+                "deferred_reasons": dict(self._deferred),
+                "by_intent": dict(self._by_intent),
+                "fast_path_ms_avg": fast_avg,
+                "llm_ms_avg": llm_avg,
+                "saved_ms_est": self._fast * max(llm_avg - fast_avg, 0.0),
+            }
+
+
+_fast_path: FastPathPlanner | None = None
+_fast_path_lock = threading.Lock()
+
+
+def get_fast_path_planner() -> FastPathPlanner | None:
+    """Fast-path planner singleton; None if disabled (settings.planner_fast_path)."""
+    global _fast_path
+    from ...settings import get_settings
+
+    s = get_settings()
+    if not s.planner_fast_path:
+        return None
+    if _fast_path is None:
+        with _fast_path_lock:
+            if _fast_path is None:
+                _fast_path = FastPathPlanner(threshold=s.planner_fast_path_threshold)
+    return _fast_path
@@ -0,0 +1,297 @@
+"""
+Plan cache - reuse QueryPlanV3 for repeated and paraphrased questions.
+
+Users ask the same questions in many wordings, and the Planner LLM returns
+the same plan for each of them. The cache sits in front of the LLM:
+
+1. exact lookup by normalized text (NFC, collapsed whitespace, lowercase,
+   trailing punctuation stripped);
+2. nearest neighbour over the embeddings of cached questions: cosine
+   similarity must reach the threshold (settings.planner_plan_cache_similarity)
+   and the neighbour must mention the same EntityRegistry entities, so
+   "опыт с Python" never reuses the plan for "опыт с Java".
+
+Only validated, sanitized LLM plans are stored (not fallback plans), together
+with the index version they were built against. When the version changes
+(ingest, collection reset, graph rebuild) the whole cache is dropped. Size is
+bounded by LRU. Question embeddings go through CachedEmbeddings, so the
+vector computed here is reused by dense retrieval of the same question.
+
+Hit rate and the similarity distribution of nearest neighbours are reported
+under "planner_plan_cache" in /admin/stats.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Sequence, Tuple
+
+import numpy as np
+
+from .schemas_v3 import QueryPlanV3
+from ...indexing.version import index_version
+from ...rag.nlp import normalize_query
+from ...utils.cache import register_cache_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIMILARITY = 0.95
+
+# Upper bounds of the nearest-neighbour similarity histogram buckets
+_SIMILARITY_BUCKETS: Tuple[float, ...] = (0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.99)
+
+EntityKey = FrozenSet[Tuple[str, str]]
+
+
+def plan_cache_key(question: str) -> str:
+    """Exact-lookup key: the plan does not depend on case or trailing punctuation."""
+    return normalize_query(question).lower().rstrip("?!. ")
+
+
+def question_entities(question: str) -> EntityKey:
+    """EntityRegistry entities of the question (without the portfolio owner)."""
+    from ...rag.entities import get_entity_registry
+    from ...rag.search_types import EntityType
+
+    return frozenset(
+        (e.type.value, e.slug)
+        for e in get_entity_registry().extract_entities(question)
+        if e.type != EntityType.PERSON
+    )
+
+
+_BUCKET_LABELS: Tuple[str, ...] = (
+    f"<{_SIMILARITY_BUCKETS[0]:.2f}",
+    *(f"{lo:.2f}-{hi:.2f}" for lo, hi in zip(_SIMILARITY_BUCKETS, _SIMILARITY_BUCKETS[1:])),
+    f">={_SIMILARITY_BUCKETS[-1]:.2f}",
+)
+
+
+def _bucket(similarity: float) -> str:
+    return _BUCKET_LABELS[bisect_right(_SIMILARITY_BUCKETS, similarity)]
+
+
+@dataclass
+class _Entry:
+    plan: QueryPlanV3
+    version: int
+    entities: EntityKey
+    slot: int  # row in the vector matrix, -1 if the question has no embedding
+
+
+class PlanCache:
+    """
+    LRU cache of Planner LLM plans with exact and nearest-neighbour lookup.
+
+    Vectors of cached questions are L2-normalized rows of one matrix (a row
+    per LRU slot, reused after eviction), so a lookup is one matrix-vector
+    product.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Sequence[float]],
+        maxsize: int = 512,
+        similarity: float = DEFAULT_SIMILARITY,
+        entities: Callable[[str], EntityKey] = question_entities,
+    ):
+        self.maxsize = maxsize
+        self.similarity = similarity
+        self._embed = embed
+        self._entities = entities
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._vectors: np.ndarray | None = None
+        self._slot_keys: List[str | None] = []
+        self._free: List[int] = []
+        self._version = index_version()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.entity_mismatches = 0
+        self.invalidations = 0
+        self._similarity_hist: Dict[str, int] = dict.fromkeys(_BUCKET_LABELS, 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _vector(self, question: str) -> np.ndarray | None:
+        try:
+            vector = np.asarray(self._embed(normalize_query(question)), dtype=np.float32)
+        except Exception as e:
+            logger.warning("Plan cache embedding failed: %s", e)
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def _check_version(self) -> None:
+        """Drop everything built against an older index version (caller holds the lock)."""
+        version = index_version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._slot_keys = [None] * len(self._slot_keys)
+            self._free = list(range(len(self._slot_keys)))
+            self._version = version
+
+    def _hit(self, key: str, entry: _Entry) -> QueryPlanV3:
+        self._entries.move_to_end(key)
+        return entry.plan.model_copy(deep=True)
+
+    def get(self, question: str) -> QueryPlanV3 | None:
+        """Cached plan for the question or a close paraphrase of it; None on miss."""
+        key = plan_cache_key(question)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return self._hit(key, entry)
+            if not self._entries or self._vectors is None:
+                self.misses += 1
+                return None
+
+        vector = self._vector(question)
+        entities = self._entities(question) if vector is not None else frozenset()
+        with self._lock:
+            self._check_version()
+            if vector is None or self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+            live = [slot for slot, k in enumerate(self._slot_keys) if k is not None]
+            if not live:
+                self.misses += 1
+                return None
+            scores = self._vectors[live] @ vector
+            order = np.argsort(-scores)
+            nearest = float(scores[order[0]])
+            self._similarity_hist[_bucket(nearest)] += 1
+
+            # nearest paraphrase about the same entities
+            for i in order:
+                similarity = float(scores[i])
+                if similarity < self.similarity:
+                    break
+                cached = self._slot_keys[live[i]]
+                entry = self._entries[cached]
+                if entry.entities == entities and entry.version == self._version:
+                    self.semantic_hits += 1
+                    logger.info(
+                        "Plan cache semantic hit: similarity=%.3f question=%r cached=%r",
+                        similarity, key, cached,
+                    )
+                    return self._hit(cached, entry)
+            if nearest >= self.similarity:
+                self.entity_mismatches += 1
+            self.misses += 1
+            return None
+
+    def put(self, question: str, plan: QueryPlanV3, version: int | None = None) -> None:
+        """
+        Store a validated, sanitized Planner LLM plan for the question.
+
+        Args:
+            question: User's question
+            plan: Plan to reuse for the question and its paraphrases
+            version: index_version() the plan was built against (default: current)
+        """
+        if self.maxsize <= 0:
+            return
+        key = plan_cache_key(question)
+        if version is None:
+            version = index_version()
+        # repeated embedding of the same question is a CachedEmbeddings hit
+        vector = self._vector(question)
+        entities = self._entities(question)
+        with self._lock:
+            self._check_version()
+            if version != self._version:
+                return  # re-ingest while the plan was being built
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._release(old.slot)
+            slot = self._store_vector(key, vector)
+            self._entries[key] = _Entry(plan.model_copy(deep=True), version, entities, slot)
+            while len(self._entries) > self.maxsize:
+                _key, evicted = self._entries.popitem(last=False)
+                self._release(evicted.slot)
+
+    def _release(self, slot: int) -> None:
+        if slot >= 0:
+            self._slot_keys[slot] = None
+            self._free.append(slot)
+
+    def _store_vector(self, key: str, vector: np.ndarray | None) -> int:
+        if vector is None:
+            return -1
+        if self._vectors is None:
+            self._vectors = np.zeros((self.maxsize + 1, vector.shape[0]), dtype=np.float32)
+            self._slot_keys = [None] * (self.maxsize + 1)
+            self._free = list(range(self.maxsize, -1, -1))
+        if vector.shape[0] != self._vectors.shape[1] or not self._free:
+            return -1  # embedding model changed: exact lookup only
+        slot = self._free.pop()
+        self._vectors[slot] = vector
+        self._slot_keys[slot] = key
+        return slot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._vectors = None
+            self._slot_keys = []
+            self._free = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "similarity_threshold": self.similarity,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "entity_mismatches": self.entity_mismatches,
+                "invalidations": self.invalidations,
+                "index_version": self._version,
+                "nearest_similarity": dict(self._similarity_hist),
+            }
+
+
+_CACHE: PlanCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache | None:
+    """Plan cache singleton; None if disabled (settings.planner_plan_cache_size=0)."""
+    global _CACHE
+    from ...settings import get_settings
+
+    s = get_settings()
+    if s.planner_plan_cache_size <= 0:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                from ...deps import embeddings
+
+                _CACHE = PlanCache(
+                    embed=embeddings().embed_query,
+                    maxsize=s.planner_plan_cache_size,
+                    similarity=s.planner_plan_cache_similarity,
+                )
+                register_cache_stats("planner_plan_cache", _CACHE.stats)
+    return _CACHE
+
+
+def reset_plan_cache() -> None:
+    global _CACHE
+    _CACHE = None
@@ -2,17 +2,22 @@
 Planner LLM - LLM-based query planning.
 
 Uses structured output to generate QueryPlanV3 from user questions.
+Unambiguous questions are planned by the rule-based fast path
+(fast_path.py) without the LLM round trip; plans of repeated and
+paraphrased questions come from the plan cache (plan_cache.py).
 """
 from __future__ import annotations
 
 import copy
 import logging
 import re
+import time
 from typing import TYPE_CHECKING
 
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from .schemas import make_default_fallback_plan
+from ...indexing.version import index_version
 from .schemas_v3 import QueryPlanV3, TechFilter, TechCategory
 from .prompts import PLANNER_SYSTEM_PROMPT, PLANNER_REPAIR_PROMPT
 from ...rag.entities import get_entity_registry
@@ -22,6 +27,9 @@ from ...utils.logging_utils import compact_json, truncate_text
 if TYPE_CHECKING:
     from langchain_core.language_models import BaseChatModel
 
+    from .fast_path import FastPathPlanner
+    from .plan_cache import PlanCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,6 +46,8 @@ class PlannerLLM:
         llm: BaseChatModel,
         max_retries: int = 2,
         temperature: float = 0.0,
+        fast_path: FastPathPlanner | None = None,
+        plan_cache: PlanCache | None = None,
     ):
         """
         Initialize PlannerLLM.
@@ -46,10 +56,14 @@ class PlannerLLM:
             llm: LangChain chat model
             max_retries: Max attempts on validation failure
             temperature: LLM temperature (0.0 for deterministic)
+            fast_path: Optional rule-based planner tried before the LLM
+            plan_cache: Optional cache of LLM plans for repeated/paraphrased questions
         """
         self.llm = llm
         self.max_retries = max_retries
         self.temperature = temperature
+        self.fast_path = fast_path
+        self.plan_cache = plan_cache
 
         # Check if LLM supports structured output
         self._supports_structured = hasattr(llm, "with_structured_output")
@@ -58,7 +72,8 @@ class PlannerLLM:
         """
         Generate QueryPlanV3 from user question.
 
-        Attempts structured output first, falls back to default plan on failure.
+        Tries the rule-based fast path and the plan cache first (if configured),
+        then structured output, falls back to default plan on failure.
 
         Args:
             question: User's question
@@ -72,9 +87,26 @@ class PlannerLLM:
 
         logger.info("Planner input question=%r", truncate_text(question, limit=500))
 
+        if self.fast_path is not None:
+            plan = self.fast_path.plan(question)
+            if plan is not None:
+                return plan
+
+        if self.plan_cache is not None:
+            plan = self.plan_cache.get(question)
+            if plan is not None:
+                return plan
+
+        version = index_version()
+        started = time.perf_counter()
         try:
             if self._supports_structured:
-                return self._plan_structured(question)
+                plan = self._plan_structured(question)
+                if plan is None:
+                    return make_default_fallback_plan(question)
+                if self.plan_cache is not None:
+                    self.plan_cache.put(question, plan, version=version)
+                return plan
             else:
                 logger.warning("LLM doesn't support structured output, using fallback")
                 return make_default_fallback_plan(question)
@@ -82,12 +114,16 @@ class PlannerLLM:
         except Exception as e:
             logger.error("Planner failed: %s", e)
             return make_default_fallback_plan(question)
+        finally:
+            if self.fast_path is not None:
+                self.fast_path.record_llm((time.perf_counter() - started) * 1000)
 
-    def _plan_structured(self, question: str) -> QueryPlanV3:
+    def _plan_structured(self, question: str) -> QueryPlanV3 | None:
         """
         Use LLM's structured output capability.
 
         Attempts with_structured_output() with retry on failure.
+        Returns None if every attempt failed.
         """
         messages = [
             SystemMessage(content=PLANNER_SYSTEM_PROMPT),
@@ -154,12 +190,12 @@ class PlannerLLM:
                         )
                     )
 
-        # Complete failure - return default fallback
+        # Complete failure - caller uses default fallback
         logger.error(
             "Planner failed after %d attempts, using fallback",
             self.max_retries + 1,
         )
-        return make_default_fallback_plan(question)
+        return None
 
     def _validate_plan(self, plan: QueryPlanV3) -> bool:
         """
@@ -57,6 +57,8 @@ def portfolio_rag_tool(question: str) -> dict:
     # Import dependencies
     from ..deps import planner_llm, answer_llm
     from .planner import PlannerLLM
+    from .planner.fast_path import get_fast_path_planner
+    from .planner.plan_cache import get_plan_cache
     from .executor import PlanExecutor
     from .render import RenderEngine
     from .answer import AnswerLLM
@@ -69,7 +71,7 @@ def portfolio_rag_tool(question: str) -> dict:
 
     try:
         # 1. Plan
-        planner = PlannerLLM(planner_llm())
+        planner = PlannerLLM(planner_llm(), fast_path=get_fast_path_planner(), plan_cache=get_plan_cache())
         plan = planner.plan(question)
 
         logger.info(
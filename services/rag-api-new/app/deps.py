@@ -1,8 +1,8 @@
 from functools import lru_cache
+from pathlib import Path
 from typing import Optional
 
 import torch
-from sentence_transformers import CrossEncoder
 
 import chromadb
 from chromadb.config import Settings as ChromaSettings
@@ -13,6 +13,11 @@ from langchain_chroma import Chroma
 
 from langchain_gigachat.chat_models import GigaChat
 from .agent.graph import build_agent_graph
+from .rag.embedding_cache import CachedEmbeddings
+from .rag.rerank_backends import ensure_int8, load_reranker_backend
+from .rag.rerank_batcher import MicroBatchReranker
+from .rag.rerank_cache import CachedReranker
+from .rag.scoring_pool import ProcessReranker
 
 from .settings import get_settings
 import logging
@@ -27,13 +32,19 @@ def settings():
 
 
 @lru_cache()
-def embeddings() -> OpenAIEmbeddings:
+def embeddings() -> CachedEmbeddings:
     s = settings()
-    return OpenAIEmbeddings(
+    base = OpenAIEmbeddings(
         api_key=s.litellm_api_key or "EMPTY",
         base_url=str(s.litellm_base_url),
         model=s.embedding_model,
     )
+    return CachedEmbeddings(
+        base,
+        model=s.embedding_model,
+        maxsize=s.embedding_cache_size,
+        ttl_s=s.embedding_cache_ttl_s,
+    )
 
 
 @lru_cache()
@@ -55,15 +66,42 @@ def vectorstore(collection: Optional[str] = None) -> Chroma:
     )
 
 
+def search_vectorstore(collection: Optional[str] = None):
+    """
+    Vectorstore для dense-поиска.
+
+    При vector_backend="local" запросы обслуживает in-process VectorIndex,
+    Chroma остаётся источником истины и fallback.
+    """
+    s = settings()
+    vs = vectorstore(collection)
+    if s.vector_backend == "local":
+        from .indexing.vector_index import LocalVectorStore
+        return LocalVectorStore(vs, collection or s.chroma_collection)
+    return vs
+
+
 @lru_cache()
-def reranker() -> CrossEncoder:
+def reranker() -> CachedReranker:
     s = settings()
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    return CrossEncoder(
-        s.reranker_model,
-        device=device,
-        trust_remote_code=True
-    )
+    backend_args = (s.reranker_backend, s.reranker_model, s.reranker_max_tokens, Path(s.index_data_dir) / "models")
+    if s.reranker_process_workers > 0:
+        # модель грузится в каждом процессе пула, здесь — только прокси;
+        # int8-экспорт — один раз здесь, до запуска воркеров
+        if s.reranker_backend == "onnx-int8":
+            ensure_int8(s.reranker_model, backend_args[3])
+        model = ProcessReranker(load_reranker_backend, backend_args + ("cpu",), workers=s.reranker_process_workers)
+        model.warmup()
+    else:
+        model = load_reranker_backend(*backend_args, device=device)
+    if s.reranker_batch_window_ms > 0:
+        model = MicroBatchReranker(
+            model,
+            window_ms=s.reranker_batch_window_ms,
+            max_pairs=s.reranker_batch_max_pairs,
+        )
+    return CachedReranker(model, model=s.reranker_model, maxsize=s.reranker_cache_size)
 
 
 @lru_cache()
@@ -5,7 +5,15 @@ Graph module - граф знаний портфолио.
 к данным портфолио.
 """
 from .schema import NodeType, EdgeType, GraphNode, GraphEdge
-from .store import GraphStore, get_graph_store, reset_graph_store
+from .store import (
+    GraphSnapshot,
+    GraphStore,
+    current_graph,
+    get_graph_store,
+    pinned_graph,
+    publish_graph,
+    reset_graph_store,
+)
 from .builder import build_graph_from_export
 from .query import graph_query
 
@@ -14,8 +22,12 @@ __all__ = [
     "EdgeType",
     "GraphNode",
     "GraphEdge",
+    "GraphSnapshot",
     "GraphStore",
+    "current_graph",
     "get_graph_store",
+    "pinned_graph",
+    "publish_graph",
     "reset_graph_store",
     "build_graph_from_export",
     "graph_query",
@@ -6,15 +6,21 @@ Graph Builder - построение графа знаний из ExportPayload.
 """
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
 import re
-from typing import List
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import List, Mapping, Set, Tuple
 
+from ..indexing.version import bump_index_version
 from ..schemas.export import ExportPayload
-from ..rag.entities import get_entity_registry, reset_entity_registry
+from ..rag.entities import EntityRegistry
 from ..rag.search_types import EntityType
+from .query import materialize_views
 from .schema import NodeType, EdgeType, GraphNode, GraphEdge
-from .store import GraphStore, get_graph_store, reset_graph_store
+from .store import GraphSnapshot, GraphStore, pinned_graph, publish_graph
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +30,49 @@ def _make_node_id(node_type: NodeType, ref: str | int) -> str:
     return f"{node_type.value}:{ref}"
 
 
+@dataclass
+class Fragment:
+    """
+    Вклад одной сущности экспорта в граф: узлы, рёбра и алиасы реестра.
+
+    key — id основного узла сущности; content_hash — хэш содержимого
+    фрагмента, по нему graph/diff.py находит изменившиеся сущности.
+    """
+    key: str
+    nodes: List[GraphNode] = field(default_factory=list)
+    edges: List[GraphEdge] = field(default_factory=list)
+    aliases: List[Tuple[EntityType, str, str, List[str]]] = field(default_factory=list)
+
+    @cached_property
+    def content_hash(self) -> str:
+        content = [
+            [[n.id, n.type.value, n.name, n.slug, n.data] for n in self.nodes],
+            [[e.source_id, e.target_id, e.type.value, e.data] for e in self.edges],
+            [[t.value, slug, name, aliases] for t, slug, name, aliases in self.aliases],
+        ]
+        raw = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _FragmentCollector:
+    """Принимает add_node / add_edge / register в текущий фрагмент (begin)."""
+
+    def __init__(self) -> None:
+        self.fragments: List[Fragment] = []
+
+    def begin(self, key: str) -> None:
+        self.fragments.append(Fragment(key))
+
+    def add_node(self, node: GraphNode) -> None:
+        self.fragments[-1].nodes.append(node)
+
+    def add_edge(self, edge: GraphEdge) -> None:
+        self.fragments[-1].edges.append(edge)
+
+    def register(self, entity_type: EntityType, slug: str, name: str, aliases: List[str] | None = None) -> None:
+        self.fragments[-1].aliases.append((entity_type, slug, name, list(aliases or [])))
+
+
 def _extract_achievements(text: str | None) -> List[str]:
     """
     Извлечь достижения из markdown-текста.
@@ -71,22 +120,30 @@ def _generate_aliases(name: str) -> List[str]:
     return list(set(a for a in aliases if a and a != name_lower))
 
 
-def build_graph_from_export(payload: ExportPayload) -> GraphStore:
+def _validate(store: GraphStore, registry: EntityRegistry, payload: ExportPayload) -> None:
     """
-    Построить граф знаний из ExportPayload.
+    Проверить граф перед публикацией.
 
-    Создаёт узлы и рёбра для всех сущностей портфолио.
-    Также заполняет EntityRegistry для поиска.
+    Raises:
+        ValueError: граф пуст при непустом payload или рёбра ссылаются
+            на отсутствующие узлы — прежний граф остаётся опубликованным.
+    """
+    has_content = bool(payload.profile or payload.technologies or payload.experiences or payload.projects)
+    if has_content and (not store.stats()["nodes"] or not sum(registry.stats().values())):
+        raise ValueError("Graph rebuild produced an empty graph")
+    dangling = store.dangling_edges()
+    if dangling:
+        raise ValueError(f"Graph rebuild produced {dangling} dangling edges")
 
-    Args:
-        payload: Данные портфолио из content-api
 
-    Returns:
-        GraphStore с построенным графом
+def collect_fragments(payload: ExportPayload) -> List[Fragment]:
     """
-    # Сброс хранилищ
-    store = reset_graph_store()
-    registry = reset_entity_registry()
+    Разложить ExportPayload на фрагменты по сущностям (в порядке построения).
+
+    Профиль, технология, компания, проект, достижение и контакт — каждый
+    отдельный фрагмент со своими узлами, рёбрами и алиасами реестра.
+    """
+    out = _FragmentCollector()
 
     person_id: str | None = None
 
@@ -94,8 +151,9 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
     if payload.profile:
         p = payload.profile
         person_id = _make_node_id(NodeType.PERSON, p.id)
+        out.begin(person_id)
 
-        store.add_node(GraphNode(
+        out.add_node(GraphNode(
             id=person_id,
             type=NodeType.PERSON,
             name=p.full_name,
@@ -110,7 +168,7 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
             }
         ))
 
-        registry.register(
+        out.register(
             EntityType.PERSON,
             "dmitry",
             p.full_name,
@@ -123,8 +181,9 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
     for tech in payload.technologies:
         tid = _make_node_id(NodeType.TECHNOLOGY, tech.id)
         tech_id_by_name[tech.name.lower()] = tid
+        out.begin(tid)
 
-        store.add_node(GraphNode(
+        out.add_node(GraphNode(
             id=tid,
             type=NodeType.TECHNOLOGY,
             name=tech.name,
@@ -132,7 +191,7 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
             data={"category": tech.category}
         ))
 
-        registry.register(
+        out.register(
             EntityType.TECHNOLOGY,
             tech.slug,
             tech.name,
@@ -141,7 +200,7 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
 
         # Person -> Technology (KNOWS)
         if person_id:
-            store.add_edge(GraphEdge(person_id, tid, EdgeType.KNOWS))
+            out.add_edge(GraphEdge(person_id, tid, EdgeType.KNOWS))
 
     # === 3. Companies from Experience ===
     company_id_by_slug: dict[str, str] = {}
@@ -149,10 +208,11 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
     for exp in payload.experiences:
         cid = _make_node_id(NodeType.COMPANY, exp.id)
         company_id_by_slug[exp.company_slug] = cid
+        out.begin(cid)
 
         company_name = exp.company_name or exp.role
 
-        store.add_node(GraphNode(
+        out.add_node(GraphNode(
             id=cid,
             type=NodeType.COMPANY,
             name=company_name,
@@ -168,7 +228,7 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
             }
         ))
 
-        registry.register(
+        out.register(
             EntityType.COMPANY,
             exp.company_slug,
             company_name,
@@ -178,7 +238,7 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
         # Person -> Company (WORKS_AT / WORKED_AT)
         if person_id:
             edge_type = EdgeType.WORKS_AT if exp.is_current else EdgeType.WORKED_AT
-            store.add_edge(GraphEdge(
+            out.add_edge(GraphEdge(
                 person_id, cid, edge_type,
                 {"role": exp.role, "is_current": exp.is_current}
             ))
@@ -187,8 +247,9 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
         for proj in exp.projects:
             project_slug = proj.slug or f"exp-{proj.id}"
             pid = _make_node_id(NodeType.PROJECT, f"exp:{proj.id}")
+            out.begin(pid)
 
-            store.add_node(GraphNode(
+            out.add_node(GraphNode(
                 id=pid,
                 type=NodeType.PROJECT,
                 name=proj.name,
@@ -203,7 +264,7 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
                 }
             ))
 
-            registry.register(
+            out.register(
                 EntityType.PROJECT,
                 project_slug,
                 proj.name,
@@ -212,16 +273,17 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
 
             # Person -> Project (CREATED)
             if person_id:
-                store.add_edge(GraphEdge(person_id, pid, EdgeType.CREATED))
+                out.add_edge(GraphEdge(person_id, pid, EdgeType.CREATED))
 
             # Project -> Company (BELONGS_TO)
-            store.add_edge(GraphEdge(pid, cid, EdgeType.BELONGS_TO))
+            out.add_edge(GraphEdge(pid, cid, EdgeType.BELONGS_TO))
 
             # Parse achievements
             for idx, ach_text in enumerate(_extract_achievements(proj.achievements_md)):
                 aid = _make_node_id(NodeType.ACHIEVEMENT, f"{proj.id}:{idx}")
+                out.begin(aid)
 
-                store.add_node(GraphNode(
+                out.add_node(GraphNode(
                     id=aid,
                     type=NodeType.ACHIEVEMENT,
                     name=ach_text[:100],  # Короткое имя
@@ -237,16 +299,17 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
 
                 # Person -> Achievement (ACHIEVED)
                 if person_id:
-                    store.add_edge(GraphEdge(person_id, aid, EdgeType.ACHIEVED))
+                    out.add_edge(GraphEdge(person_id, aid, EdgeType.ACHIEVED))
 
                 # Achievement -> Project (BELONGS_TO)
-                store.add_edge(GraphEdge(aid, pid, EdgeType.BELONGS_TO))
+                out.add_edge(GraphEdge(aid, pid, EdgeType.BELONGS_TO))
 
     # === 4. Standalone Projects ===
     for proj in payload.projects:
         pid = _make_node_id(NodeType.PROJECT, proj.id)
+        out.begin(pid)
 
-        store.add_node(GraphNode(
+        out.add_node(GraphNode(
             id=pid,
             type=NodeType.PROJECT,
             name=proj.name,
@@ -264,7 +327,7 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
             }
         ))
 
-        registry.register(
+        out.register(
             EntityType.PROJECT,
             proj.slug,
             proj.name,
@@ -273,19 +336,20 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
 
         # Person -> Project (CREATED)
         if person_id:
-            store.add_edge(GraphEdge(person_id, pid, EdgeType.CREATED))
+            out.add_edge(GraphEdge(person_id, pid, EdgeType.CREATED))
 
         # Project -> Technology (USES)
         for tech_name in (proj.technologies or []):
             tid = tech_id_by_name.get(tech_name.lower())
             if tid:
-                store.add_edge(GraphEdge(pid, tid, EdgeType.USES))
+                out.add_edge(GraphEdge(pid, tid, EdgeType.USES))
 
     # === 5. Contacts ===
     for contact in payload.contacts:
         cid = _make_node_id(NodeType.CONTACT, contact.id)
+        out.begin(cid)
 
-        store.add_node(GraphNode(
+        out.add_node(GraphNode(
             id=cid,
             type=NodeType.CONTACT,
             name=contact.label,
@@ -300,9 +364,78 @@ def build_graph_from_export(payload: ExportPayload) -> GraphStore:
 
         # Person -> Contact (HAS_CONTACT)
         if person_id:
-            store.add_edge(GraphEdge(person_id, cid, EdgeType.HAS_CONTACT))
+            out.add_edge(GraphEdge(person_id, cid, EdgeType.HAS_CONTACT))
+
+    return out.fragments
 
-    logger.info("Graph built: %s, EntityRegistry: %s",
-                store.stats(), registry.stats())
 
+def apply_fragment(fragment: Fragment, store: GraphStore, registry: EntityRegistry) -> None:
+    """Добавить фрагмент в граф и реестр."""
+    for node in fragment.nodes:
+        store.add_node(node)
+    for edge in fragment.edges:
+        store.add_edge(edge)
+    for entity_type, slug, name, aliases in fragment.aliases:
+        registry.register(entity_type, slug, name, aliases)
+
+
+def build_graph_from_export(payload: ExportPayload) -> GraphStore:
+    """
+    Построить граф знаний из ExportPayload.
+
+    Создаёт узлы и рёбра для всех сущностей портфолио.
+    Также заполняет EntityRegistry для поиска.
+
+    Новые GraphStore и EntityRegistry строятся в стороне от опубликованных,
+    проверяются (_validate) и публикуются одной атомарной заменой снимка:
+    конкурентные запросы до замены видят прежний граф целиком.
+
+    Args:
+        payload: Данные портфолио из content-api
+
+    Returns:
+        GraphStore с построенным графом
+    """
+    return build_graph_from_fragments(payload, collect_fragments(payload))
+
+
+def build_graph_from_fragments(payload: ExportPayload, fragments: List[Fragment]) -> GraphStore:
+    """Полная сборка графа из фрагментов collect_fragments (см. build_graph_from_export)."""
+    # Новая пара строится в стороне; опубликованный граф не трогаем
+    store = GraphStore()
+    registry = EntityRegistry()
+    for fragment in fragments:
+        apply_fragment(fragment, store, registry)
+
+    _validate(store, registry, payload)
+    by_key = {f.key: f for f in fragments}
+    # при повторяющихся ключах фрагментов diff невозможен — следующий инжест снова полный
+    publish_built_graph(store, registry, by_key if len(by_key) == len(fragments) else None)
     return store
+
+
+def publish_built_graph(
+    store: GraphStore,
+    registry: EntityRegistry,
+    fragments: Mapping[str, Fragment] | None = None,
+    previous_views: Mapping | None = None,
+    touched: Set[str] | None = None,
+) -> GraphSnapshot:
+    """
+    Опубликовать собранную пару граф + реестр (из экспорта, диффа или снапшота).
+
+    Материализованные ответы graph_query считаются по собранному, ещё не
+    опубликованному графу и публикуются вместе с ним (после диффа —
+    с переиспользованием previous_views, см. materialize_views); fragments —
+    фрагменты, из которых собран граф (база для следующего диффа, graph/diff.py).
+    Автомат алиасов реестра компилируется до публикации.
+    """
+    with pinned_graph(GraphSnapshot(store, registry)):
+        views = materialize_views(previous_views, touched)
+    registry.alias_matcher()
+
+    snapshot = publish_graph(store, registry, views, fragments)
+    logger.info("Graph built: %s, EntityRegistry: %s, views=%d",
+                store.stats(), registry.stats(), len(views))
+    bump_index_version()
+    return snapshot
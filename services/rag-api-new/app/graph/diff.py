@@ -0,0 +1,264 @@
+"""
+Graph diff - инкрементальное обновление графа знаний при инжесте.
+
+ExportPayload раскладывается на фрагменты по сущностям (builder.Fragment:
+профиль, технология, компания, проект, достижение, контакт) с хэшем
+содержимого. Фрагменты сравниваются с фрагментами опубликованного графа;
+к copy() текущих GraphStore и EntityRegistry применяются только вставки,
+обновления и удаления узлов, рёбер и алиасов изменившихся сущностей,
+результат публикуется как при полной сборке.
+
+Полная сборка (build_graph_from_fragments) остаётся, если у текущего графа
+нет фрагментов (первый инжест, восстановление из снапшота), ключи
+фрагментов повторяются, изменилась большая часть сущностей или применение
+диффа не прошло проверку.
+
+Вставки добавляются в конец, поэтому после применения диффа узлы, рёбра и
+алиасы пересортировываются по порядку фрагментов (GraphStore.reorder,
+EntityRegistry.reorder): перечисления, ответы graph_query и представления
+совпадают с полной сборкой. Материализованные представления графа
+пересчитываются только для ключей, связанных с изменёнными узлами; если
+изменился порядок сущностей в экспорте — все.
+
+Стоимость инжеста остаётся O(размер графа): copy() хранилища и реестра,
+хэши всех фрагментов нового экспорта, полная пересортировка (reorder),
+представления без ключа и по категориям и компиляция автомата алиасов
+выполняются при каждом применении диффа. Дифф экономит только применение
+неизменившихся фрагментов, проверку графа (_validate) и пересчёт
+представлений по ключам, не связанным с изменениями; на графе из сотен
+сущностей он не быстрее полной сборки.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Set, Tuple
+
+from ..rag.entities import EntityRegistry
+from ..schemas.export import ExportPayload
+from .builder import Fragment, build_graph_from_fragments, collect_fragments, publish_built_graph
+from .schema import GraphEdge, NodeType
+from .store import GraphStore, current_graph
+
+logger = logging.getLogger(__name__)
+
+# доля изменившихся сущностей, начиная с которой граф строится целиком
+FULL_REBUILD_RATIO = 0.5
+
+# дифф читает опубликованный снимок и публикует новый — инжесты по очереди
+_UPSERT_LOCK = threading.Lock()
+
+# поля data, по которым запросы графа сопоставляют узлы с ключом (graph/query.py)
+_LINK_FIELDS = {
+    NodeType.ACHIEVEMENT: ("project_slug", "company_slug", "project_name", "company_name"),
+    NodeType.PROJECT: ("company_slug",),
+}
+
+
+@dataclass
+class GraphDiff:
+    """Что изменилось в графе при инжесте (ключи фрагментов = id узлов сущностей)."""
+    inserted: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    # сохранившиеся сущности идут в экспорте в другом порядке
+    reordered: bool = False
+    full_rebuild: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted or self.reordered)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "inserted": len(self.inserted),
+            "updated": len(self.updated),
+            "deleted": len(self.deleted),
+            "unchanged": self.unchanged,
+            "reordered": self.reordered,
+            "full_rebuild": self.full_rebuild,
+        }
+
+
+def diff_fragments(old: Mapping[str, Fragment], new: Mapping[str, Fragment]) -> GraphDiff:
+    """Сравнить фрагменты по ключу и хэшу содержимого (и порядок сохранившихся)."""
+    diff = GraphDiff()
+    for key, fragment in new.items():
+        before = old.get(key)
+        if before is None:
+            diff.inserted.append(key)
+        elif before.content_hash != fragment.content_hash:
+            diff.updated.append(key)
+        else:
+            diff.unchanged += 1
+    diff.deleted = [key for key in old if key not in new]
+    diff.reordered = [key for key in new if key in old] != [key for key in old if key in new]
+    return diff
+
+
+def _edge_key(edge: GraphEdge) -> Tuple[str, str, Any, str]:
+    return edge.source_id, edge.target_id, edge.type, repr(sorted((edge.data or {}).items()))
+
+
+def _edges_minus(edges: Iterable[GraphEdge], other: Iterable[GraphEdge]) -> List[GraphEdge]:
+    """Рёбра edges, которых нет в other (как мультимножества)."""
+    remaining = Counter(_edge_key(e) for e in other)
+    out = []
+    for edge in edges:
+        key = _edge_key(edge)
+        if remaining[key]:
+            remaining[key] -= 1
+        else:
+            out.append(edge)
+    return out
+
+
+def _touched_strings(stores: Iterable[GraphStore], node_ids: Set[str]) -> Set[str]:
+    """slug, name и поля-ссылки узлов и их соседей (lowercase) — для materialize_views."""
+    strings: Set[str] = set()
+    for store in stores:
+        for node_id in node_ids:
+            around = [store.get_node(node_id)]
+            around += [store.get_node(e.target_id) for e in store.get_outgoing_edges(node_id)]
+            around += [store.get_node(e.source_id) for e in store.get_incoming_edges(node_id)]
+            for node in around:
+                if node is None:
+                    continue
+                strings.update((node.slug.lower(), node.name.lower()))
+                for name in _LINK_FIELDS.get(node.type, ()):
+                    if name in node.data:
+                        strings.add(str(node.data[name] or "").lower())
+    return strings
+
+
+def apply_diff(
+    store: GraphStore,
+    registry: EntityRegistry,
+    diff: GraphDiff,
+    old: Mapping[str, Fragment],
+    new: Mapping[str, Fragment],
+) -> Set[str]:
+    """
+    Применить diff к store и registry (копиям опубликованных).
+
+    Сначала удаления (рёбра, алиасы, узлы) удалённых и обновлённых
+    фрагментов, затем вставки — чтобы узел, переехавший между
+    фрагментами, не был удалён после добавления.
+
+    Returns:
+        id узлов изменённых фрагментов (рёбра фрагмента инцидентны его узлам,
+        поэтому их концы — соседи этих узлов)
+
+    Raises:
+        ValueError: после изменений есть рёбра на отсутствующие узлы.
+    """
+    touched: Set[str] = set()
+    for key in diff.deleted + diff.updated + diff.inserted:
+        for fragment in (old.get(key), new.get(key)):
+            if fragment is not None:
+                touched.update(node.id for node in fragment.nodes)
+
+    removed_nodes: Set[str] = set()
+    added_edges: List[GraphEdge] = []
+    empty = Fragment("")
+
+    for key in diff.deleted + diff.updated:
+        before, after = old[key], new.get(key, empty)
+        for edge in _edges_minus(before.edges, after.edges):
+            store.remove_edge(edge)
+        for i, entry in enumerate(before.aliases):
+            if i < len(after.aliases):
+                if entry != after.aliases[i]:
+                    registry.replace(entry, after.aliases[i])
+            else:
+                registry.unregister(*entry)
+        kept = {node.id for node in after.nodes}
+        for node in before.nodes:
+            if node.id not in kept and store.remove_node(node.id):
+                removed_nodes.add(node.id)
+
+    for key in diff.updated + diff.inserted:
+        before, after = old.get(key, empty), new[key]
+        for node in after.nodes:
+            if node not in before.nodes:
+                store.add_node(node)
+                removed_nodes.discard(node.id)
+        for edge in _edges_minus(after.edges, before.edges):
+            store.add_edge(edge)
+            added_edges.append(edge)
+        for entry in after.aliases[len(before.aliases):]:
+            registry.register(*entry)
+
+    # те же проверки, что и _validate полной сборки, но только по затронутому
+    dangling = sum(
+        1 for e in added_edges
+        if store.get_node(e.source_id) is None or store.get_node(e.target_id) is None
+    )
+    dangling += sum(
+        len(store.get_incoming_edges(node_id)) + len(store.get_outgoing_edges(node_id))
+        for node_id in removed_nodes
+    )
+    if dangling:
+        raise ValueError(f"Graph diff produced {dangling} dangling edges")
+    return touched
+
+
+def upsert_graph_from_export(payload: ExportPayload) -> GraphDiff:
+    """
+    Обновить граф знаний по ExportPayload: дифф к текущему графу или полная сборка.
+
+    Без изменений ничего не публикуется (и index_version не растёт).
+
+    Returns:
+        GraphDiff — изменившиеся сущности и был ли граф собран целиком
+    """
+    fragments = collect_fragments(payload)
+    new = {f.key: f for f in fragments}
+
+    with _UPSERT_LOCK:
+        current = current_graph()
+        old = current.fragments
+        if not old or len(new) != len(fragments):
+            build_graph_from_fragments(payload, fragments)
+            diff = GraphDiff(inserted=list(new), full_rebuild=True)
+            logger.info("Graph diff: %s", diff.summary())
+            return diff
+
+        diff = diff_fragments(old, new)
+        if not diff.changed:
+            logger.info("Graph diff: %s", diff.summary())
+            return diff
+
+        touched = len(diff.inserted) + len(diff.updated) + len(diff.deleted)
+        if touched > FULL_REBUILD_RATIO * max(len(new), len(old)):
+            build_graph_from_fragments(payload, fragments)
+            diff.full_rebuild = True
+        else:
+            try:
+                store = current.store.copy()
+                registry = current.registry.copy()
+                touched = apply_diff(store, registry, diff, old, new)
+                if fragments and not store.stats()["nodes"]:
+                    raise ValueError("Graph diff produced an empty graph")
+                # вставки легли в конец — порядок как при полной сборке
+                store.reorder(
+                    [node.id for f in fragments for node in f.nodes],
+                    [edge for f in fragments for edge in f.edges],
+                )
+                registry.reorder([entry for f in fragments for entry in f.aliases])
+            except Exception:
+                logger.warning("Graph diff failed, rebuilding the graph", exc_info=True)
+                build_graph_from_fragments(payload, fragments)
+                diff.full_rebuild = True
+            else:
+                publish_built_graph(
+                    store, registry, new,
+                    previous_views=None if diff.reordered else current.views,
+                    touched=_touched_strings((current.store, store), touched),
+                )
+
+    logger.info("Graph diff: %s", diff.summary())
+    return diff
@@ -0,0 +1,213 @@
+"""
+Graph persistence - восстановление графа знаний после рестарта.
+
+При инжесте сохраняются последний ExportPayload (`graph/export.json`) и
+бинарный снапшот построенного графа с EntityRegistry (`graph/graph.bin`).
+На старте граф восстанавливается из снапшота без разбора экспорта и
+сборки CSR; если снапшота нет, он повреждён или устарел, граф строится
+из export.json (и снапшот перезаписывается).
+
+Формат `graph.bin` (little-endian):
+
+    header   magic, version, sha256(export.json), n_ids, n_edges, body_len, crc32(body)
+    body     src       u32[n_edges]
+             dst       u32[n_edges]
+             etype     u8[n_edges]        (выровнен до 4)
+             out_off   u32[n_ids * T + 1] + out_items u32[n_edges]
+             in_off    u32[n_ids * T + 1] + in_items  u32[n_edges]
+             state     utf-8 JSON: узлы и их ранги, данные рёбер, индексы по
+                       типу/slug/data, EntityRegistry
+
+Снапшот помечен хэшем содержимого export.json: при расхождении (экспорт
+перезаписан, снапшот — нет) снапшот считается устаревшим.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Tuple
+
+from ..rag.entities import EntityRegistry
+from ..schemas.export import ExportPayload
+from ..utils.fs import atomic_write_bytes
+from .store import _T, GraphStore, current_graph, get_graph_store
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GRAPHSN\0"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sI32sIIQI")
+
+
+def _data_dir() -> Path:
+    from ..settings import get_settings
+
+    return Path(get_settings().index_data_dir)
+
+
+def _export_path(data_dir: str | Path | None = None) -> Path:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    return (base / "graph" / "export.json").resolve()
+
+
+def _snapshot_path(data_dir: str | Path | None = None) -> Path:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    return (base / "graph" / "graph.bin").resolve()
+
+
+def content_hash(export_bytes: bytes) -> bytes:
+    """Хэш содержимого сохранённого экспорта (sha256)."""
+    return hashlib.sha256(export_bytes).digest()
+
+
+def _le(arr: array) -> bytes:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    data = arr.tobytes()
+    return data + b"\0" * (-len(data) % 4)
+
+
+def encode_graph(store: GraphStore, registry: EntityRegistry, export_hash: bytes) -> bytes:
+    """Сериализовать граф и реестр в бинарный снапшот."""
+    state = store.export()
+    out_off, out_items = state.pop("out")
+    in_off, in_items = state.pop("in")
+    src, dst, etype = state.pop("src"), state.pop("dst"), state.pop("etype")
+    state["registry"] = registry.to_dict()
+    body = b"".join([
+        _le(src), _le(dst), _le(etype),
+        _le(out_off), _le(out_items),
+        _le(in_off), _le(in_items),
+        json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    ])
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, export_hash, len(state["ids"]), len(src), len(body), zlib.crc32(body)
+    )
+    return header + body
+
+
+class _Reader:
+    def __init__(self, buf: bytes, offset: int) -> None:
+        self.view = memoryview(buf)
+        self.pos = offset
+
+    def array(self, typecode: str, n: int) -> array:
+        arr = array(typecode)
+        size = arr.itemsize * n
+        arr.frombytes(self.view[self.pos:self.pos + size])
+        if sys.byteorder == "big":
+            arr.byteswap()
+        self.pos += size + (-size % 4)
+        return arr
+
+    def rest(self) -> bytes:
+        return bytes(self.view[self.pos:])
+
+
+def decode_graph(buf: bytes) -> Tuple[GraphStore, EntityRegistry, bytes]:
+    """
+    Восстановить граф и реестр из снапшота.
+
+    Returns:
+        (store, registry, export_hash)
+
+    Raises:
+        ValueError: неверный magic/версия или не сошлась контрольная сумма.
+    """
+    if len(buf) < _HEADER.size:
+        raise ValueError("Graph snapshot is truncated")
+    magic, version, export_hash, n_ids, n_edges, body_len, crc = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a graph snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported graph snapshot version {version}")
+    if len(buf) != _HEADER.size + body_len:
+        raise ValueError("Graph snapshot is truncated")
+    if zlib.crc32(memoryview(buf)[_HEADER.size:]) != crc:
+        raise ValueError("Graph snapshot checksum mismatch")
+
+    r = _Reader(buf, _HEADER.size)
+    state: dict[str, Any] = {
+        "src": r.array("I", n_edges),
+        "dst": r.array("I", n_edges),
+        "etype": r.array("B", n_edges),
+    }
+    state["out"] = (r.array("I", n_ids * _T + 1), r.array("I", n_edges))
+    state["in"] = (r.array("I", n_ids * _T + 1), r.array("I", n_edges))
+    state.update(json.loads(r.rest().decode("utf-8")))
+    registry = EntityRegistry.from_dict(state.pop("registry"))
+    return GraphStore.from_export(state), registry, export_hash
+
+
+def _try_save_snapshot(export_hash: bytes, data_dir: str | Path | None = None) -> None:
+    try:
+        snapshot = current_graph()
+        atomic_write_bytes(_snapshot_path(data_dir), encode_graph(snapshot.store, snapshot.registry, export_hash))
+    except Exception:
+        logger.warning("Graph snapshot save failed", exc_info=True)
+
+
+def graph_try_save_export(payload: ExportPayload, data_dir: str | Path | None = None) -> None:
+    """Сохранить ExportPayload и снапшот построенного из него текущего графа."""
+    try:
+        export_bytes = payload.model_dump_json().encode("utf-8")
+        atomic_write_bytes(_export_path(data_dir), export_bytes)
+    except Exception:
+        logger.warning("Graph export save failed", exc_info=True)
+        return
+    _try_save_snapshot(content_hash(export_bytes), data_dir)
+
+
+def _try_load_snapshot(export_hash: bytes | None, data_dir: str | Path | None) -> bool:
+    path = _snapshot_path(data_dir)
+    if not path.exists():
+        return False
+    try:
+        store, registry, snapshot_hash = decode_graph(path.read_bytes())
+    except Exception:
+        logger.warning("Graph snapshot restore failed", exc_info=True)
+        return False
+    if export_hash is not None and snapshot_hash != export_hash:
+        logger.warning("Graph snapshot %s is stale (export content hash differs)", path)
+        return False
+
+    from .builder import publish_built_graph
+
+    publish_built_graph(store, registry)
+    logger.info("Graph restored from snapshot %s: %s", path, store.stats())
+    return True
+
+
+def graph_try_load(data_dir: str | Path | None = None) -> bool:
+    """
+    Восстановить граф и EntityRegistry: из снапшота, иначе из ExportPayload.
+
+    Ничего не делает, если граф уже построен или сохранённых данных нет.
+    """
+    if get_graph_store().stats()["nodes"]:
+        return False
+    path = _export_path(data_dir)
+    export_bytes = path.read_bytes() if path.exists() else None
+    export_hash = content_hash(export_bytes) if export_bytes is not None else None
+    if _try_load_snapshot(export_hash, data_dir):
+        return True
+    if export_bytes is None:
+        return False
+    try:
+        from .builder import build_graph_from_export
+
+        payload = ExportPayload.model_validate_json(export_bytes)
+        store = build_graph_from_export(payload)
+        logger.info("Graph restored from %s: %s", path, store.stats())
+    except Exception:
+        logger.warning("Graph restore failed", exc_info=True)
+        return False
+    _try_save_snapshot(export_hash, data_dir)
+    return True
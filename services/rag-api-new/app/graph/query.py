@@ -3,18 +3,30 @@ Graph Query - запросы к графу знаний.
 
 Функции для извлечения структурированных фактов из графа
 по различным Intent'ам.
+
+Граф меняется только при перестроении, поэтому build_graph_from_export
+заранее считает ответы (materialize_views) и публикует их вместе со
+снимком: ключ (intent, entity_key, category), где entity_key — slug
+сущности, category — категория технологий graph_query_with_filters.
+Горячий путь — поиск в словаре; на промахе (произвольная подстрока,
+нестандартный limit) ответ вычисляется по графу как раньше.
 """
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
 
 from ..rag.search_types import Intent, GraphQueryResult
 from .schema import NodeType, EdgeType, GraphNode
-from .store import get_graph_store
+from .store import current_graph, get_graph_store
 
 logger = logging.getLogger(__name__)
 
+ViewKey = Tuple[Intent, Optional[str], Optional[str]]
+
+# limit graph_query_with_filters по умолчанию — для него материализуются категории
+VIEW_LIMIT = 20
+
 
 def _node_to_source(node: GraphNode) -> Dict[str, Any]:
     """Преобразовать узел в формат source."""
@@ -34,22 +46,25 @@ def _achievements_query(entity_key: str | None) -> GraphQueryResult:
     Если entity_key указан, фильтрует по project_slug или company_slug.
     """
     store = get_graph_store()
-    achievements = store.get_nodes_by_type(NodeType.ACHIEVEMENT)
 
     if entity_key:
+        # подстрочное сравнение по уникальным значениям индексов, а не по каждому достижению
         key_lower = entity_key.lower()
-        filtered = []
-        for ach in achievements:
-            proj_slug = (ach.data.get("project_slug") or "").lower()
-            comp_slug = (ach.data.get("company_slug") or "").lower()
-            proj_name = (ach.data.get("project_name") or "").lower()
-            comp_name = (ach.data.get("company_name") or "").lower()
-
-            if (key_lower in proj_slug or key_lower in comp_slug or
-                key_lower in proj_name or key_lower in comp_name or
-                proj_slug in key_lower or comp_slug in key_lower):
-                filtered.append(ach)
-        achievements = filtered
+
+        def slug_match(v: str) -> bool:
+            return key_lower in v or v in key_lower
+
+        def name_match(v: str) -> bool:
+            return key_lower in v
+
+        achievements = store.nodes_where_data(NodeType.ACHIEVEMENT, {
+            "project_slug": slug_match,
+            "company_slug": slug_match,
+            "project_name": name_match,
+            "company_name": name_match,
+        })
+    else:
+        achievements = store.get_nodes_by_type(NodeType.ACHIEVEMENT)
 
     items = [
         {
@@ -191,9 +206,10 @@ def _technologies_query(entity_key: str | None) -> GraphQueryResult:
         # Technology usage: if entity_key refers to a technology node, list projects that USE it.
         if node and node.type == NodeType.TECHNOLOGY:
             tech = node
-            incoming = store.get_incoming_edges(tech.id, EdgeType.USES)
-            projects = [store.get_node(e.source_id) for e in incoming]
-            projects = [p for p in projects if p and p.type == NodeType.PROJECT]
+            projects = [
+                p for p in store.neighbors_of_type(tech.id, EdgeType.USES, incoming=True)
+                if p.type == NodeType.PROJECT
+            ]
 
             items = [
                 {
@@ -227,20 +243,21 @@ def _technologies_query(entity_key: str | None) -> GraphQueryResult:
 
         if project:
             # Получаем технологии через рёбра USES
-            tech_edges = store.get_outgoing_edges(project.id, EdgeType.USES)
-            techs = [store.get_node(e.target_id) for e in tech_edges]
-            techs = [t for t in techs if t]
+            techs = store.neighbors_of_type(project.id, EdgeType.USES)
 
             # Также проверяем поле technologies в data
             tech_names = project.data.get("technologies") or []
+            by_name: Dict[str, GraphNode] | None = None
             for name in tech_names:
                 existing = {t.name.lower() for t in techs}
                 if name.lower() not in existing:
                     # Ищем технологию по имени
-                    for t in store.get_nodes_by_type(NodeType.TECHNOLOGY):
-                        if t.name.lower() == name.lower():
-                            techs.append(t)
-                            break
+                    if by_name is None:
+                        by_name = {}
+                        for t in store.get_nodes_by_type(NodeType.TECHNOLOGY):
+                            by_name.setdefault(t.name.lower(), t)
+                    if name.lower() in by_name:
+                        techs.append(by_name[name.lower()])
 
             items = [{"name": t.name, "category": t.data.get("category")} for t in techs]
             return GraphQueryResult(
@@ -316,19 +333,17 @@ def _project_details_query(entity_key: str) -> GraphQueryResult:
         )
 
     # Получаем связанные технологии
-    tech_edges = store.get_outgoing_edges(project.id, EdgeType.USES)
-    techs = [store.get_node(e.target_id) for e in tech_edges]
-    techs = [t for t in techs if t]
+    techs = store.neighbors_of_type(project.id, EdgeType.USES)
 
     # Также из data
     tech_list = project.data.get("technologies") or []
     tech_names = [t.name for t in techs] + tech_list
 
     # Получаем достижения проекта
-    achievements = []
-    for ach in store.get_nodes_by_type(NodeType.ACHIEVEMENT):
-        if ach.data.get("project_slug") == project.slug:
-            achievements.append(ach.data.get("text", ach.name))
+    achievements = [
+        ach.data.get("text", ach.name)
+        for ach in store.find_nodes_by_data(NodeType.ACHIEVEMENT, "project_slug", project.slug)
+    ]
 
     item = {
         "name": project.name,
@@ -369,10 +384,7 @@ def _experience_query(entity_key: str | None) -> GraphQueryResult:
     items = []
     for c in companies:
         # Получаем проекты компании
-        projects = []
-        for p in store.get_nodes_by_type(NodeType.PROJECT):
-            if p.data.get("company_slug") == c.slug:
-                projects.append(p.name)
+        projects = [p.name for p in store.find_nodes_by_data(NodeType.PROJECT, "company_slug", c.slug)]
 
         summary_md = c.data.get("company_summary_md")
         role_md = c.data.get("company_role_md")
@@ -417,6 +429,14 @@ def graph_query(intent: Intent, entity_key: str | None = None) -> GraphQueryResu
     Returns:
         GraphQueryResult со структурированными фактами
     """
+    view = current_graph().views.get((intent, entity_key, None))
+    if view is not None:
+        return view
+    return _compute_query(intent, entity_key)
+
+
+def _compute_query(intent: Intent, entity_key: str | None) -> GraphQueryResult:
+    """Вычислить ответ graph_query по графу (без представлений)."""
     handlers = {
         Intent.ACHIEVEMENTS: lambda: _achievements_query(entity_key),
         Intent.CURRENT_JOB: _current_job_query,
@@ -469,7 +489,7 @@ def graph_query_with_filters(
     Returns:
         GraphQueryResult с отфильтрованными фактами
     """
-    store = get_graph_store()
+    views = current_graph().views
 
     # === Handle technology queries with category filter ===
     # CRITICAL FIX: When tech_category is specified, return PROJECTS using those technologies
@@ -479,21 +499,23 @@ def graph_query_with_filters(
             "Technology query with category filter '%s' - returning PROJECTS using these technologies",
             tech_category
         )
-        return _projects_by_tech_category_query(tech_category, limit)
+        view = views.get((intent, None, tech_category)) if limit == VIEW_LIMIT else None
+        return view or _projects_by_tech_category_query(tech_category, limit)
 
     if intent == Intent.LANGUAGES:
         # Languages - return technologies in language category
         # Note: This returns technologies, not projects (semantic difference)
-        return _technologies_by_category_query("language", limit)
+        view = views.get((intent, None, "language")) if limit == VIEW_LIMIT else None
+        return view or _technologies_by_category_query("language", limit)
 
     # === Handle experience queries with company filter ===
     if intent == Intent.EXPERIENCE and company_key:
-        return _experience_query(company_key)
+        return graph_query(intent, company_key)
 
     # === Handle achievements with company/project filter ===
     if intent == Intent.ACHIEVEMENTS:
         key = project_key or company_key or entity_key
-        return _achievements_query(key)
+        return graph_query(intent, key)
 
     # === Default: use base query ===
     return graph_query(intent, entity_key)
@@ -513,15 +535,9 @@ def _technologies_by_category_query(
     для корректного ранжирования (Python с 5 проектами > C# с 1 проектом).
     """
     store = get_graph_store()
-    techs = store.get_nodes_by_type(NodeType.TECHNOLOGY)
 
-    # Filter by category from node.data
-    category_lower = category.lower()
-    filtered = []
-    for t in techs:
-        node_category = (t.data.get("category") or "").lower()
-        if node_category == category_lower:
-            filtered.append(t)
+    # Filter by category from node.data (вторичный индекс по category)
+    filtered = store.nodes_by_data(NodeType.TECHNOLOGY, "category", category.lower())
 
     # If no matches, return empty
     if not filtered:
@@ -539,11 +555,10 @@ def _technologies_by_category_query(
     tech_usage_counts = []
     for t in filtered:
         # Count incoming USES edges from projects
-        incoming_edges = store.get_incoming_edges(t.id, EdgeType.USES)
-        project_count = len([
-            e for e in incoming_edges
-            if store.get_node(e.source_id) and store.get_node(e.source_id).type == NodeType.PROJECT
-        ])
+        project_count = sum(
+            1 for p in store.neighbors_of_type(t.id, EdgeType.USES, incoming=True)
+            if p.type == NodeType.PROJECT
+        )
         tech_usage_counts.append((t, project_count))
 
     # Sort by usage count descending (most used first)
@@ -595,12 +610,7 @@ def _projects_by_tech_category_query(
     store = get_graph_store()
 
     # 1. Get all technologies in this category
-    techs = store.get_nodes_by_type(NodeType.TECHNOLOGY)
-    category_lower = category.lower()
-    filtered_techs = [
-        t for t in techs
-        if (t.data.get("category") or "").lower() == category_lower
-    ]
+    filtered_techs = store.nodes_by_data(NodeType.TECHNOLOGY, "category", category.lower())
 
     if not filtered_techs:
         logger.warning(
@@ -627,10 +637,8 @@ def _projects_by_tech_category_query(
     project_tech_map = {}  # project_id -> {project: GraphNode, technologies: [str]}
 
     for tech in filtered_techs:
-        incoming_edges = store.get_incoming_edges(tech.id, EdgeType.USES)
-        for edge in incoming_edges:
-            source_node = store.get_node(edge.source_id)
-            if source_node and source_node.type == NodeType.PROJECT:
+        for source_node in store.neighbors_of_type(tech.id, EdgeType.USES, incoming=True):
+            if source_node.type == NodeType.PROJECT:
                 if source_node.id not in project_tech_map:
                     project_tech_map[source_node.id] = {
                         "project": source_node,
@@ -712,3 +720,69 @@ def _projects_by_tech_category_query(
         intent=Intent.TECHNOLOGIES,
         entity_key=category,
     )
+
+
+# === Материализованные представления ===
+
+# Intent -> типы узлов, slug которых материализуются как entity_key
+_KEYED_VIEWS: Dict[Intent, Tuple[NodeType, ...]] = {
+    Intent.ACHIEVEMENTS: (NodeType.PROJECT, NodeType.COMPANY),
+    Intent.TECHNOLOGIES: (NodeType.PROJECT, NodeType.TECHNOLOGY),
+    Intent.PROJECT_DETAILS: (NodeType.PROJECT,),
+    Intent.EXPERIENCE: (NodeType.COMPANY,),
+}
+
+
+def _related(key: str, touched: Set[str]) -> bool:
+    """Подстрочная связь ключа с изменёнными строками — как в сопоставлении запросов."""
+    key = key.lower()
+    return any(key in t or t in key for t in touched)
+
+
+def materialize_views(
+    previous: Mapping[ViewKey, GraphQueryResult] | None = None,
+    touched: Set[str] | None = None,
+) -> Mapping[ViewKey, GraphQueryResult]:
+    """
+    Посчитать ответы graph_query / graph_query_with_filters по текущему графу.
+
+    Вызывается билдером внутри pinned_graph(собранный снимок) до публикации:
+    - (intent, None, None) — для всех поддерживаемых Intent'ов;
+    - (intent, slug, None) — для slug'ов узлов из _KEYED_VIEWS;
+    - (TECHNOLOGIES, None, category) — проекты по категории технологий
+      (значения category как в данных и в нижнем регистре);
+    - (LANGUAGES, None, "language") — ветка LANGUAGES graph_query_with_filters.
+
+    При инкрементальном обновлении (graph/diff.py) previous — представления
+    прежнего графа, touched — slug/name/поля-ссылки изменённых узлов и их
+    соседей (lowercase): ответы по slug без подстрочной связи с touched
+    берутся из previous, остальные пересчитываются.
+    """
+    store = get_graph_store()
+    views: Dict[ViewKey, GraphQueryResult] = {}
+
+    for intent in (Intent.ACHIEVEMENTS, Intent.CURRENT_JOB, Intent.CONTACTS, Intent.LANGUAGES,
+                   Intent.TECHNOLOGIES, Intent.PROJECT_DETAILS, Intent.EXPERIENCE):
+        views[(intent, None, None)] = _compute_query(intent, None)
+
+    for intent, node_types in _KEYED_VIEWS.items():
+        for node_type in node_types:
+            for node in store.get_nodes_by_type(node_type):
+                key = (intent, node.slug, None)
+                if key in views:
+                    continue
+                if previous is not None and key in previous and not _related(node.slug, touched or set()):
+                    views[key] = previous[key]
+                else:
+                    views[key] = _compute_query(intent, node.slug)
+
+    categories = set()
+    for tech in store.get_nodes_by_type(NodeType.TECHNOLOGY):
+        category = tech.data.get("category")
+        if category:
+            categories.update((str(category), str(category).lower()))
+    for category in sorted(categories):
+        views[(Intent.TECHNOLOGIES, None, category)] = _projects_by_tech_category_query(category, VIEW_LIMIT)
+    views[(Intent.LANGUAGES, None, "language")] = _technologies_by_category_query("language", VIEW_LIMIT)
+
+    return views
@@ -33,7 +33,7 @@ class EdgeType(str, Enum):
     HAS_CONTACT = "has_contact" # Person -> Contact
 
 
-@dataclass
+@dataclass(slots=True)
 class GraphNode:
     """
     Узел графа знаний.
@@ -52,7 +52,7 @@ class GraphNode:
     data: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class GraphEdge:
     """
     Ребро (отношение) графа знаний.
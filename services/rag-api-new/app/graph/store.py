@@ -1,58 +1,259 @@
 """
 GraphStore - in-memory хранилище графа знаний.
 
-Реализует граф на основе adjacency lists (списков смежности).
-Без внешних зависимостей, достаточно для ~1000 узлов.
+Компактное представление: строковые id узлов интернируются в int,
+узлы лежат в списке по этим int, рёбра — в трёх параллельных массивах
+(source, target, тип) с данными только у рёбер, где они есть. Смежность —
+CSR (offsets + индексы рёбер) по ключу (узел, тип ребра) в обе стороны:
+рёбра узла заданного типа — один срез, без фильтрации. CSR строится
+лениво при первом чтении (граф публикуется уже построенным, см.
+publish_graph); рёбра, добавленные после сборки, лежат в небольшой
+дельте по тому же ключу, удалённые — помечаются и отфильтровываются до
+уплотнения в copy(). Бенчмарк: `python -m scripts.bench_graph_store`.
+
+Порядок узлов и рёбер задают ранги — позиции в порядке полной сборки
+(по умолчанию порядок добавления). После инкрементального обновления
+graph/diff.py выставляет их по фрагментам (reorder), и перечисления
+совпадают с графом, собранным целиком.
 """
 from __future__ import annotations
 
-from collections import defaultdict
-from typing import Any, Dict, List, Optional, Set
+import threading
+from array import array
+from bisect import insort
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from itertools import accumulate
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
 
 from .schema import NodeType, EdgeType, GraphNode, GraphEdge
 
+def _ci(value: Any) -> Any:
+    return str(value).lower() if value else ""
+
+
+# Вторичные индексы по node.data: (тип узла, поле) -> нормализация ключа.
+# Поддерживаются в add_node; используются find_nodes_by_data / nodes_by_data.
+DATA_INDEXES: Dict[Tuple[NodeType, str], Callable[[Any], Any]] = {
+    (NodeType.COMPANY, "is_current"): lambda v: v,
+    (NodeType.TECHNOLOGY, "category"): _ci,
+    (NodeType.PROJECT, "company_slug"): lambda v: v,
+    (NodeType.ACHIEVEMENT, "project_slug"): _ci,
+    (NodeType.ACHIEVEMENT, "company_slug"): _ci,
+    (NodeType.ACHIEVEMENT, "project_name"): _ci,
+    (NodeType.ACHIEVEMENT, "company_name"): _ci,
+}
+
+_EDGE_TYPES: List[EdgeType] = list(EdgeType)
+_EDGE_CODE: Dict[EdgeType, int] = {t: i for i, t in enumerate(_EDGE_TYPES)}
+_T = len(_EDGE_TYPES)
+
+# copy() уплотняет рёбра, когда удалённых рёбер и дельты больше этой доли
+_COMPACT_RATIO = 0.25
+_COMPACT_MIN = 1024
+
+
+def _build_csr(keys: array, n_keys: int, rank: Sequence[int]) -> Tuple[array, array]:
+    """Сортировка по ключу, внутри ключа — по рангу: offsets[key]..offsets[key+1] — индексы рёбер."""
+    counts = [0] * (n_keys + 1)
+    for key, count in Counter(keys).items():
+        counts[key + 1] = count
+    offsets = array("I", accumulate(counts))
+    by_rank = sorted(range(len(keys)), key=rank.__getitem__)
+    items = array("I", sorted(by_rank, key=keys.__getitem__))
+    return offsets, items
+
 
 class GraphStore:
     """
-    In-memory граф знаний на основе adjacency lists.
-
-    Thread-safe для чтения. Записи должны быть атомарными
-    (полное перестроение при инжесте).
+    In-memory граф знаний с CSR-смежностью.
+
+    Thread-safe для чтения. Опубликованный граф не изменяется: при инжесте
+    строится новый GraphStore (или правится copy() текущего, см. graph/diff.py)
+    и публикуется через publish_graph.
+    Рёбра узла возвращаются сгруппированными по типу, внутри типа — в
+    порядке рангов (по умолчанию — добавления), узлы одного типа и по
+    индексам data — тоже.
     """
 
     def __init__(self):
-        self._nodes: Dict[str, GraphNode] = {}
-        self._edges: List[GraphEdge] = []
-        self._outgoing: Dict[str, List[GraphEdge]] = defaultdict(list)
-        self._incoming: Dict[str, List[GraphEdge]] = defaultdict(list)
-        self._by_type: Dict[NodeType, List[str]] = defaultdict(list)
-        self._by_slug: Dict[str, str] = {}  # slug -> node_id
+        self._index: Dict[str, int] = {}   # node_id -> int
+        self._ids: List[str] = []
+        self._nodes: List[GraphNode | None] = []
+        self._rank: List[int] = []          # node int -> ранг (порядок полной сборки)
+        self._n_nodes = 0
+        self._src = array("I")
+        self._dst = array("I")
+        self._etype = array("B")
+        self._erank = array("q")            # ранги рёбер
+        self._edge_data: Dict[int, Dict[str, Any]] = {}
+        self._by_type: Dict[NodeType, List[int]] = defaultdict(list)
+        self._by_slug: Dict[str, int] = {}
+        # (тип, поле) -> нормализованное значение -> узлы по возрастанию ранга
+        self._data_index: Dict[Tuple[NodeType, str], Dict[Any, List[int]]] = {spec: {} for spec in DATA_INDEXES}
+        # (offsets, items) по ключу node * _T + type; None — нужно перестроить
+        self._out: Tuple[array, array] | None = None
+        self._in: Tuple[array, array] | None = None
+        # рёбра, добавленные после сборки CSR: ключ node * _T + type -> индексы рёбер
+        self._out_delta: Dict[int, List[int]] = {}
+        self._in_delta: Dict[int, List[int]] = {}
+        # удалённые рёбра (индексы), до уплотнения
+        self._dead: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def _intern(self, node_id: str) -> int:
+        idx = self._index.get(node_id)
+        if idx is None:
+            idx = len(self._ids)
+            self._index[node_id] = idx
+            self._ids.append(node_id)
+            self._nodes.append(None)
+            self._rank.append(idx)
+        return idx
+
+    def _index_data(self, idx: int, node: GraphNode, add: bool) -> None:
+        for (node_type, key), normalize in DATA_INDEXES.items():
+            if node.type != node_type:
+                continue
+            try:
+                value = normalize(node.data.get(key))
+                if add:
+                    # по рангу узла: обновление узла на месте не меняет порядок
+                    insort(self._data_index[(node_type, key)].setdefault(value, []), idx, key=self._rank.__getitem__)
+                else:
+                    self._data_index[(node_type, key)][value].remove(idx)
+            except (TypeError, KeyError, ValueError):
+                continue  # нехэшируемое значение — узел найдётся только сканированием
 
     def add_node(self, node: GraphNode) -> None:
         """Добавить узел в граф."""
-        self._nodes[node.id] = node
-        self._by_type[node.type].append(node.id)
-        self._by_slug[node.slug] = node.id
+        idx = self._intern(node.id)
+        old = self._nodes[idx]
+        if old is None:
+            self._n_nodes += 1
+            self._by_type[node.type].append(idx)
+        else:
+            self._index_data(idx, old, add=False)
+            if old.type != node.type:
+                self._by_type[old.type].remove(idx)
+                self._by_type[node.type].append(idx)
+        self._index_data(idx, node, add=True)
+        self._nodes[idx] = node
+        self._by_slug[node.slug] = idx
 
     def add_edge(self, edge: GraphEdge) -> None:
         """Добавить ребро в граф."""
-        self._edges.append(edge)
-        self._outgoing[edge.source_id].append(edge)
-        self._incoming[edge.target_id].append(edge)
+        i = len(self._src)
+        if edge.data:
+            self._edge_data[i] = edge.data
+        src = self._intern(edge.source_id)
+        dst = self._intern(edge.target_id)
+        code = _EDGE_CODE[edge.type]
+        self._src.append(src)
+        self._dst.append(dst)
+        self._etype.append(code)
+        self._erank.append(i)
+        # CSR уже собран — ребро уходит в дельту, без пересборки
+        if self._out is not None:
+            self._out_delta.setdefault(src * _T + code, []).append(i)
+        if self._in is not None:
+            self._in_delta.setdefault(dst * _T + code, []).append(i)
+
+    def remove_node(self, node_id: str) -> bool:
+        """Удалить узел и его записи в индексах (рёбра удаляются через remove_edge)."""
+        idx = self._index.get(node_id)
+        node = self._nodes[idx] if idx is not None else None
+        if node is None:
+            return False
+        self._index_data(idx, node, add=False)
+        self._by_type[node.type].remove(idx)
+        self._nodes[idx] = None
+        self._n_nodes -= 1
+        if self._by_slug.get(node.slug) == idx:
+            del self._by_slug[node.slug]
+            # slug мог быть и у других узлов (редкий случай) — берём последний по рангу
+            others = [i for i, n in enumerate(self._nodes) if n is not None and n.slug == node.slug]
+            if others:
+                self._by_slug[node.slug] = max(others, key=self._rank.__getitem__)
+        return True
+
+    def remove_edge(self, edge: GraphEdge) -> bool:
+        """Удалить одно ребро, совпадающее с edge (с учётом data)."""
+        data = edge.data or {}
+        for i in self._edge_slice(edge.source_id, edge.type, incoming=False):
+            if self._ids[self._dst[i]] == edge.target_id and self._edge_data.get(i, {}) == data:
+                self._dead.add(i)
+                return True
+        return False
+
+    def _csr(self, incoming: bool) -> Tuple[array, array]:
+        csr = self._in if incoming else self._out
+        if csr is None:
+            with self._lock:
+                csr = self._in if incoming else self._out
+                if csr is None:
+                    ends = self._dst if incoming else self._src
+                    keys = array("I", (node * _T + t for node, t in zip(ends, self._etype)))
+                    csr = _build_csr(keys, len(self._ids) * _T, self._erank)
+                    if incoming:
+                        self._in, self._in_delta = csr, {}
+                    else:
+                        self._out, self._out_delta = csr, {}
+        return csr
+
+    def _typed(self, idx: int, code: int, incoming: bool) -> Sequence[int]:
+        """Индексы живых рёбер узла одного типа: срез CSR + дельта."""
+        offsets, items = self._csr(incoming)
+        key = idx * _T + code
+        # узлы, появившиеся после сборки CSR, в offsets не попадают
+        edges: Sequence[int] = items[offsets[key]:offsets[key + 1]] if key + 1 < len(offsets) else ()
+        delta = (self._in_delta if incoming else self._out_delta).get(key)
+        if delta:
+            edges = sorted([*edges, *delta], key=self._erank.__getitem__)
+        if self._dead:
+            edges = [i for i in edges if i not in self._dead]
+        return edges
+
+    def _edge_slice(self, node_id: str, edge_type: Optional[EdgeType], incoming: bool) -> Sequence[int]:
+        idx = self._index.get(node_id)
+        if idx is None:
+            return ()
+        if edge_type:
+            return self._typed(idx, _EDGE_CODE[edge_type], incoming)
+        offsets, items = self._csr(incoming)
+        if not self._dead and not (self._in_delta if incoming else self._out_delta):
+            lo = idx * _T
+            return items[offsets[lo]:offsets[lo + _T]] if lo + _T < len(offsets) else ()
+        out: List[int] = []
+        for code in range(_T):
+            out.extend(self._typed(idx, code, incoming))
+        return out
+
+    def _edge(self, i: int) -> GraphEdge:
+        return GraphEdge(
+            self._ids[self._src[i]],
+            self._ids[self._dst[i]],
+            _EDGE_TYPES[self._etype[i]],
+            self._edge_data.get(i, {}),
+        )
 
     def get_node(self, node_id: str) -> Optional[GraphNode]:
         """Получить узел по ID."""
-        return self._nodes.get(node_id)
+        idx = self._index.get(node_id)
+        return self._nodes[idx] if idx is not None else None
 
     def get_node_by_slug(self, slug: str) -> Optional[GraphNode]:
         """Получить узел по slug."""
-        node_id = self._by_slug.get(slug)
-        return self._nodes.get(node_id) if node_id else None
+        idx = self._by_slug.get(slug)
+        return self._nodes[idx] if idx is not None else None
 
     def get_nodes_by_type(self, node_type: NodeType) -> List[GraphNode]:
         """Получить все узлы указанного типа."""
-        return [self._nodes[nid] for nid in self._by_type.get(node_type, [])
-                if nid in self._nodes]
+        nodes = self._nodes
+        return [nodes[i] for i in self._by_type.get(node_type, [])]
 
     def get_outgoing_edges(
         self,
@@ -60,10 +261,7 @@ class GraphStore:
         edge_type: Optional[EdgeType] = None
     ) -> List[GraphEdge]:
         """Получить исходящие рёбра узла."""
-        edges = self._outgoing.get(node_id, [])
-        if edge_type:
-            return [e for e in edges if e.type == edge_type]
-        return list(edges)
+        return [self._edge(i) for i in self._edge_slice(node_id, edge_type, incoming=False)]
 
     def get_incoming_edges(
         self,
@@ -71,10 +269,23 @@ class GraphStore:
         edge_type: Optional[EdgeType] = None
     ) -> List[GraphEdge]:
         """Получить входящие рёбра узла."""
-        edges = self._incoming.get(node_id, [])
-        if edge_type:
-            return [e for e in edges if e.type == edge_type]
-        return list(edges)
+        return [self._edge(i) for i in self._edge_slice(node_id, edge_type, incoming=True)]
+
+    def neighbors_of_type(
+        self,
+        node_id: str,
+        edge_type: EdgeType,
+        incoming: bool = False,
+    ) -> List[GraphNode]:
+        """Соседи по рёбрам одного типа (срез CSR, без материализации рёбер)."""
+        ends = self._src if incoming else self._dst
+        nodes = self._nodes
+        out = []
+        for i in self._edge_slice(node_id, edge_type, incoming):
+            node = nodes[ends[i]]
+            if node is not None:
+                out.append(node)
+        return out
 
     def get_neighbors(
         self,
@@ -82,11 +293,15 @@ class GraphStore:
         edge_types: Optional[Set[EdgeType]] = None
     ) -> List[GraphNode]:
         """Получить соседние узлы (по исходящим рёбрам)."""
-        edges = self._outgoing.get(node_id, [])
         if edge_types:
-            edges = [e for e in edges if e.type in edge_types]
-        return [self._nodes[e.target_id] for e in edges
-                if e.target_id in self._nodes]
+            out: List[GraphNode] = []
+            for t in _EDGE_TYPES:
+                if t in edge_types:
+                    out.extend(self.neighbors_of_type(node_id, t))
+            return out
+        nodes = self._nodes
+        dst = self._dst
+        return [nodes[dst[i]] for i in self._edge_slice(node_id, None, incoming=False) if nodes[dst[i]] is not None]
 
     def traverse(
         self,
@@ -105,24 +320,27 @@ class GraphStore:
         Returns:
             Список узлов (без стартового)
         """
-        visited: Set[str] = {start_id}
+        start = self._index.get(start_id)
+        if start is None:
+            return []
+        codes = sorted(_EDGE_CODE[t] for t in edge_types)
+        dst = self._dst
+        visited: Set[int] = {start}
         result: List[GraphNode] = []
-        frontier: List[tuple[str, int]] = [(start_id, 0)]
-
-        while frontier:
-            node_id, depth = frontier.pop(0)
-
-            if depth > 0:
-                node = self._nodes.get(node_id)
-                if node:
-                    result.append(node)
-
-            if depth < max_depth:
-                for edge in self._outgoing.get(node_id, []):
-                    if edge.type in edge_types and edge.target_id not in visited:
-                        visited.add(edge.target_id)
-                        frontier.append((edge.target_id, depth + 1))
-
+        frontier = [start]
+        for _depth in range(max_depth):
+            nxt: List[int] = []
+            for idx in frontier:
+                for code in codes:
+                    for i in self._typed(idx, code, incoming=False):
+                        target = dst[i]
+                        if target not in visited:
+                            visited.add(target)
+                            nxt.append(target)
+                            node = self._nodes[target]
+                            if node is not None:
+                                result.append(node)
+            frontier = nxt
         return result
 
     def find_nodes_by_data(
@@ -131,46 +349,313 @@ class GraphStore:
         key: str,
         value: Any
     ) -> List[GraphNode]:
-        """Найти узлы по значению в data."""
-        result = []
-        for node in self.get_nodes_by_type(node_type):
-            if node.data.get(key) == value:
-                result.append(node)
-        return result
+        """Найти узлы по значению в data (через вторичный индекс, если он объявлен)."""
+        if (node_type, key) in DATA_INDEXES:
+            try:
+                candidates = self.nodes_by_data(node_type, key, DATA_INDEXES[(node_type, key)](value))
+            except TypeError:
+                candidates = self.get_nodes_by_type(node_type)
+        else:
+            candidates = self.get_nodes_by_type(node_type)
+        return [node for node in candidates if node.data.get(key) == value]
+
+    def nodes_by_data(self, node_type: NodeType, key: str, normalized: Any) -> List[GraphNode]:
+        """Узлы с нормализованным (см. DATA_INDEXES) значением поля — поиск в индексе."""
+        nodes = self._nodes
+        return [nodes[i] for i in self._data_index[(node_type, key)].get(normalized, [])]
+
+    def nodes_where_data(
+        self,
+        node_type: NodeType,
+        predicates: Dict[str, Callable[[Any], bool]],
+    ) -> List[GraphNode]:
+        """
+        Узлы, у которых хотя бы одно индексированное поле удовлетворяет предикату.
+
+        Предикат вычисляется один раз на уникальное нормализованное значение,
+        результат — в порядке рангов узлов.
+        """
+        ids: Set[int] = set()
+        for key, predicate in predicates.items():
+            for value, posting in self._data_index[(node_type, key)].items():
+                if predicate(value):
+                    ids.update(posting)
+        nodes = self._nodes
+        return [nodes[i] for i in sorted(ids, key=self._rank.__getitem__)]
+
+    def reorder(self, node_ids: Sequence[str], edges: Sequence[GraphEdge]) -> None:
+        """
+        Выставить ранги по порядку полной сборки и пересортировать по ним.
+
+        node_ids и edges — узлы и рёбра в порядке добавления при полной
+        сборке (фрагменты подряд). Списки узлов по типу, индексы data и
+        slug пересортировываются; собранный CSR сбрасывается (перестроится
+        лениво), только если относительный порядок прежних рёбер изменился.
+        """
+        rank = list(range(len(node_ids), len(node_ids) + len(self._ids)))
+        for pos, node_id in enumerate(node_ids):
+            idx = self._index.get(node_id)
+            if idx is not None and rank[idx] > pos:
+                rank[idx] = pos
+        self._rank = rank
+        by_rank = rank.__getitem__
+        for ids in self._by_type.values():
+            ids.sort(key=by_rank)
+        for postings in self._data_index.values():
+            for ids in postings.values():
+                ids.sort(key=by_rank)
+        self._by_slug = {}
+        for idx in sorted(range(len(self._nodes)), key=by_rank):
+            node = self._nodes[idx]
+            if node is not None:
+                self._by_slug[node.slug] = idx
+
+        # ребро -> позиция в edges; одинаковые рёбра — по прежнему порядку
+        positions: Dict[Tuple[str, str, EdgeType], List[Tuple[int, Dict[str, Any]]]] = defaultdict(list)
+        for pos, edge in enumerate(edges):
+            positions[(edge.source_id, edge.target_id, edge.type)].append((pos, edge.data or {}))
+        old = self._erank
+        live = sorted((i for i in range(len(self._src)) if i not in self._dead), key=old.__getitem__)
+        erank = array("q", (len(edges) + i for i in range(len(self._src))))
+        for i in live:
+            candidates = positions.get((self._ids[self._src[i]], self._ids[self._dst[i]], _EDGE_TYPES[self._etype[i]]))
+            data = self._edge_data.get(i, {})
+            for j, (pos, edge_data) in enumerate(candidates or ()):
+                if edge_data == data:
+                    erank[i] = pos
+                    del candidates[j]
+                    break
+        self._erank = erank
+        if any(erank[a] > erank[b] for a, b in zip(live, live[1:])):
+            with self._lock:
+                self._out = self._in = None
+                self._out_delta, self._in_delta = {}, {}
+
+    def dangling_edges(self) -> int:
+        """Число рёбер, ссылающихся на отсутствующие узлы."""
+        nodes = self._nodes
+        dead = self._dead
+        return sum(
+            1 for i, (s, d) in enumerate(zip(self._src, self._dst))
+            if (nodes[s] is None or nodes[d] is None) and i not in dead
+        )
 
     def clear(self) -> None:
         """Очистить граф."""
-        self._nodes.clear()
-        self._edges.clear()
-        self._outgoing.clear()
-        self._incoming.clear()
-        self._by_type.clear()
-        self._by_slug.clear()
+        self.__init__()
+
+    def copy(self, compact: bool | None = None) -> "GraphStore":
+        """
+        Копия для инкрементального обновления (опубликованный граф не меняется).
+
+        Узлы (GraphNode общие) и индексы копируются поверхностно, массивы
+        рёбер — целиком; собранный CSR разделяется, новые рёбра копии идут в
+        дельту. Если удалённых рёбер и дельты больше _COMPACT_RATIO от числа
+        рёбер (или compact=True), рёбра уплотняются в порядке рангов и CSR
+        строится заново лениво; id узлов при этом сохраняются.
+        """
+        clone = GraphStore()
+        clone._index = dict(self._index)
+        clone._ids = list(self._ids)
+        clone._nodes = list(self._nodes)
+        clone._rank = list(self._rank)
+        clone._n_nodes = self._n_nodes
+        for node_type, ids in self._by_type.items():
+            clone._by_type[node_type] = list(ids)
+        clone._by_slug = dict(self._by_slug)
+        clone._data_index = {
+            spec: {value: list(ids) for value, ids in postings.items()}
+            for spec, postings in self._data_index.items()
+        }
+
+        pending = len(self._dead) + max(
+            sum(map(len, self._out_delta.values())), sum(map(len, self._in_delta.values()))
+        )
+        if compact is None:
+            compact = pending > max(_COMPACT_MIN, int(len(self._src) * _COMPACT_RATIO))
+        if compact:
+            live = sorted((i for i in range(len(self._src)) if i not in self._dead), key=self._erank.__getitem__)
+            clone._src = array("I", (self._src[i] for i in live))
+            clone._dst = array("I", (self._dst[i] for i in live))
+            clone._etype = array("B", (self._etype[i] for i in live))
+            clone._erank = array("q", range(len(live)))
+            clone._edge_data = {new: self._edge_data[old] for new, old in enumerate(live) if old in self._edge_data}
+        else:
+            clone._src = array("I", self._src)
+            clone._dst = array("I", self._dst)
+            clone._etype = array("B", self._etype)
+            clone._erank = array("q", self._erank)
+            clone._edge_data = dict(self._edge_data)
+            clone._dead = set(self._dead)
+            clone._out, clone._in = self._out, self._in
+            clone._out_delta = {key: list(ids) for key, ids in self._out_delta.items()}
+            clone._in_delta = {key: list(ids) for key, ids in self._in_delta.items()}
+        return clone
+
+    def export(self) -> Dict[str, Any]:
+        """
+        Состояние для снапшота (graph/persistence.py).
+
+        Массивы рёбер (в порядке рангов) и построенный CSR в обе стороны —
+        как есть; узлы, их ранги, данные рёбер и индексы — JSON-совместимыми
+        структурами.
+        """
+        if self._dead or self._out_delta or self._in_delta or any(r != i for i, r in enumerate(self._erank)):
+            return self.copy(compact=True).export()
+        out, inc = self._csr(incoming=False), self._csr(incoming=True)
+        return {
+            "ids": list(self._ids),
+            "nodes": [
+                None if n is None else [n.type.value, n.name, n.slug, n.data]
+                for n in self._nodes
+            ],
+            "rank": list(self._rank),
+            "src": self._src,
+            "dst": self._dst,
+            "etype": self._etype,
+            "edge_data": [[i, data] for i, data in self._edge_data.items()],
+            "out": out,
+            "in": inc,
+            "by_type": {t.value: ids for t, ids in self._by_type.items() if ids},
+            "by_slug": list(self._by_slug.items()),
+            "data_index": [
+                [node_type.value, key, [[value, ids] for value, ids in postings.items()]]
+                for (node_type, key), postings in self._data_index.items()
+            ],
+        }
+
+    @classmethod
+    def from_export(cls, state: Dict[str, Any]) -> "GraphStore":
+        """Восстановить граф из export() без повторного add_node/add_edge и сборки CSR."""
+        store = cls()
+        store._ids = list(state["ids"])
+        store._index = {node_id: i for i, node_id in enumerate(store._ids)}
+        store._nodes = [
+            None if row is None else GraphNode(store._ids[i], NodeType(row[0]), row[1], row[2], row[3])
+            for i, row in enumerate(state["nodes"])
+        ]
+        store._rank = list(state["rank"])
+        store._n_nodes = sum(1 for n in store._nodes if n is not None)
+        store._src, store._dst, store._etype = state["src"], state["dst"], state["etype"]
+        store._erank = array("q", range(len(store._src)))
+        store._edge_data = {i: data for i, data in state["edge_data"]}
+        for type_value, ids in state["by_type"].items():
+            store._by_type[NodeType(type_value)] = list(ids)
+        store._by_slug = {slug: idx for slug, idx in state["by_slug"]}
+        for type_value, key, postings in state["data_index"]:
+            spec = (NodeType(type_value), key)
+            if spec in store._data_index:
+                store._data_index[spec] = {value: list(ids) for value, ids in postings}
+        if set(store._data_index) != {(NodeType(t), k) for t, k, _ in state["data_index"]}:
+            # набор DATA_INDEXES изменился — пересобрать индексы по узлам
+            store._data_index = {spec: {} for spec in DATA_INDEXES}
+            for node_type, ids in store._by_type.items():
+                for idx in ids:
+                    store._index_data(idx, store._nodes[idx], add=True)
+        store._out, store._in = state["out"], state["in"]
+        return store
 
     def stats(self) -> Dict[str, Any]:
         """Статистика графа."""
         return {
-            "nodes": len(self._nodes),
-            "edges": len(self._edges),
+            "nodes": self._n_nodes,
+            "edges": len(self._src) - len(self._dead),
             "nodes_by_type": {t.name: len(ids) for t, ids in self._by_type.items() if ids},
         }
 
 
-# === Global singleton ===
+# === Global snapshot ===
+
 
-_GRAPH_STORE: GraphStore | None = None
+@dataclass(frozen=True)
+class GraphSnapshot:
+    """
+    Опубликованная пара GraphStore + EntityRegistry.
+
+    Перестроение графа собирает новую пару в стороне и публикует её одной
+    заменой ссылки — читатели никогда не видят полупостроенный граф.
+    views — материализованные ответы graph_query по этому графу
+    (см. query.materialize_views); пусто, если граф собран не билдером.
+    fragments — фрагменты экспорта по ключу сущности (builder.Fragment),
+    база для инкрементального обновления (graph/diff.py); пусто — следующий
+    инжест строит граф целиком.
+    """
+    store: GraphStore
+    registry: Any  # rag.entities.EntityRegistry
+    version: int = 0
+    views: Mapping[Any, Any] = field(default_factory=lambda: MappingProxyType({}))
+    fragments: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+
+
+_CURRENT: GraphSnapshot | None = None
+_PUBLISH_LOCK = threading.Lock()
+# Снимок, закреплённый за текущим запросом (см. pinned_graph)
+_PINNED: ContextVar[GraphSnapshot | None] = ContextVar("graph_snapshot", default=None)
+
+
+def current_graph() -> GraphSnapshot:
+    """Снимок графа: закреплённый за запросом или последний опубликованный."""
+    pinned = _PINNED.get()
+    if pinned is not None:
+        return pinned
+    snapshot = _CURRENT
+    if snapshot is None:
+        from ..rag.entities import EntityRegistry
+
+        with _PUBLISH_LOCK:
+            if _CURRENT is None:
+                _publish(GraphStore(), EntityRegistry())
+            snapshot = _CURRENT
+    return snapshot
+
+
+def _publish(
+    store: GraphStore,
+    registry: Any,
+    views: Mapping[Any, Any] | None = None,
+    fragments: Mapping[str, Any] | None = None,
+) -> GraphSnapshot:
+    global _CURRENT
+    version = _CURRENT.version + 1 if _CURRENT is not None else 0
+    _CURRENT = GraphSnapshot(
+        store, registry, version, MappingProxyType(dict(views or {})), MappingProxyType(dict(fragments or {}))
+    )
+    return _CURRENT
+
+
+def publish_graph(
+    store: GraphStore,
+    registry: Any,
+    views: Mapping[Any, Any] | None = None,
+    fragments: Mapping[str, Any] | None = None,
+) -> GraphSnapshot:
+    """Атомарно опубликовать новую пару граф + реестр (с представлениями и фрагментами)."""
+    with _PUBLISH_LOCK:
+        return _publish(store, registry, views, fragments)
+
+
+@contextmanager
+def pinned_graph(snapshot: GraphSnapshot | None = None) -> Iterator[GraphSnapshot]:
+    """Закрепить снимок графа (по умолчанию текущий) за контекстом запроса."""
+    token = _PINNED.set(snapshot or current_graph())
+    try:
+        yield _PINNED.get()
+    finally:
+        try:
+            _PINNED.reset(token)
+        except ValueError:
+            # генератор закрыт из другого контекста (обрыв стрима)
+            _PINNED.set(None)
 
 
 def get_graph_store() -> GraphStore:
-    """Получить глобальное хранилище графа."""
-    global _GRAPH_STORE
-    if _GRAPH_STORE is None:
-        _GRAPH_STORE = GraphStore()
-    return _GRAPH_STORE
+    """Получить хранилище графа (из текущего снимка)."""
+    return current_graph().store
 
 
 def reset_graph_store() -> GraphStore:
-    """Сбросить и вернуть новое хранилище."""
-    global _GRAPH_STORE
-    _GRAPH_STORE = GraphStore()
-    return _GRAPH_STORE
+    """Опубликовать и вернуть новое пустое хранилище (реестр сохраняется)."""
+    registry = current_graph().registry
+    store = GraphStore()
+    publish_graph(store, registry)
+    return store
@@ -1,58 +1,343 @@
+"""
+BM25 - in-memory лексический индекс для гибридного поиска.
+
+Собственная реализация Okapi BM25 на inverted index (postings lists):
+добавление/удаление документов обновляет postings, длины документов и
+document frequency инкрементально — за O(токенов изменённых документов),
+без переиндексации всего корпуса. Формула и параметры совпадают с
+rank_bm25.BM25Okapi (k1=1.5, b=0.75, epsilon=0.25).
+
+Индекс, восстановленный из бинарного снапшота (см. persistence.py),
+читает postings прямо из mmap (_Segment) и переносит их в память
+только для терминов, затронутых изменениями; тексты документов снапшота
+тоже читаются из mmap, в памяти — только тексты добавленных после него.
+"""
 from __future__ import annotations
-from typing import List, Dict, Tuple
+from typing import Any, List, Dict, Sequence, Set, Tuple
+import heapq
+import math
 import re
-from collections import defaultdict
-
-try:
-    from rank_bm25 import BM25Okapi
-except Exception:
-    BM25Okapi = None
+import threading
+from collections import Counter, defaultdict
 
 _TOKEN_RE = re.compile(r"[a-zA-Zа-яА-Я0-9+#\-]{2,}", re.UNICODE)
 
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
 
 def _tokenize(text: str) -> List[str]:
     return [t.lower() for t in _TOKEN_RE.findall(text or "")]
 
 
+class _Segment:
+    """
+    Read-only postings и forward index из снапшота.
+
+    Массивы — memoryview поверх mmap файла: postings термина
+    декодируются по запросу, без загрузки всего индекса в память.
+    """
+
+    def __init__(
+        self,
+        term_names: List[str],
+        post_offsets: Sequence[int],
+        post_docs: Sequence[int],
+        post_tfs: Sequence[int],
+        fwd_offsets: Sequence[int],
+        fwd_terms: Sequence[int],
+        fwd_tfs: Sequence[int],
+        buffer: Any = None,
+        text_offsets: Sequence[int] | None = None,
+        text_blob: Any = None,
+    ) -> None:
+        self.term_names = term_names
+        # term -> idx; термины, перенесённые в память индекса, удаляются отсюда
+        self.terms: Dict[str, int] = {t: i for i, t in enumerate(term_names)}
+        self.post_offsets = post_offsets
+        self.post_docs = post_docs
+        self.post_tfs = post_tfs
+        self.fwd_offsets = fwd_offsets
+        self.fwd_terms = fwd_terms
+        self.fwd_tfs = fwd_tfs
+        self.n_docs = len(fwd_offsets) - 1
+        # тексты документов (utf-8); None — снапшот первой версии, без текстов
+        self.text_offsets = text_offsets
+        self.text_blob = text_blob
+        self._buffer = buffer  # держим mmap открытым, пока жив сегмент
+
+    def df(self, idx: int) -> int:
+        return self.post_offsets[idx + 1] - self.post_offsets[idx]
+
+    def posting(self, idx: int) -> Dict[int, int]:
+        lo, hi = self.post_offsets[idx], self.post_offsets[idx + 1]
+        return dict(zip(self.post_docs[lo:hi], self.post_tfs[lo:hi]))
+
+    def doc_terms(self, slot: int) -> List[str]:
+        lo, hi = self.fwd_offsets[slot], self.fwd_offsets[slot + 1]
+        return [self.term_names[i] for i in self.fwd_terms[lo:hi]]
+
+    def text(self, slot: int) -> str:
+        if self.text_offsets is None:
+            return ""
+        lo, hi = self.text_offsets[slot], self.text_offsets[slot + 1]
+        return bytes(self.text_blob[lo:hi]).decode("utf-8")
+
+
 class _CollectionIndex:
+    """
+    Инвертированный индекс одной коллекции.
+
+    Документы адресуются внутренними int-слотами; освободившиеся при
+    удалении слоты переиспользуются. Средний IDF (нужен для epsilon-floor
+    отрицательных IDF, как в BM25Okapi) пересчитывается лениво — один раз
+    после изменения индекса, при первом поиске.
+    """
+
     def __init__(self) -> None:
-        self.docs: Dict[str, str] = {}
-        self.doc_ids: List[str] = []
-        self.corpus: List[List[str]] = []
-        self.bm25 = None
-
-    def _rebuild(self):
-        if not BM25Okapi:
-            self.bm25 = None
+        self._slot_by_id: Dict[str, int] = {}
+        self._ids: List[str | None] = []
+        self._lengths: List[int] = []
+        self._tfs: List[Dict[str, int] | None] = []
+        # None — текст документа снапшота (читается из _base)
+        self._texts: List[str | None] = []
+        self._free: List[int] = []
+        # term -> {slot: tf}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_len = 0
+        self._avg_idf: float | None = None
+        self._base: _Segment | None = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_segment(cls, ids: List[str], lengths: List[int], segment: _Segment) -> "_CollectionIndex":
+        """Индекс поверх снапшота: слоты документов совпадают с порядком ids."""
+        index = cls()
+        index._ids = list(ids)
+        index._lengths = list(lengths)
+        index._tfs = [None] * len(ids)
+        index._texts = [None] * len(ids)
+        index._slot_by_id = {did: slot for slot, did in enumerate(ids)}
+        index._total_len = sum(index._lengths)
+        index._base = segment
+        return index
+
+    def __len__(self) -> int:
+        return len(self._slot_by_id)
+
+    def _posting(self, term: str) -> Dict[int, int] | None:
+        """Postings термина для чтения (из памяти или из снапшота)."""
+        posting = self._postings.get(term)
+        if posting is None and self._base is not None:
+            idx = self._base.terms.get(term)
+            if idx is not None:
+                return self._base.posting(idx)
+        return posting
+
+    def _posting_for_update(self, term: str) -> Dict[int, int]:
+        """Postings термина для изменения: переносит их из снапшота в память."""
+        posting = self._postings.get(term)
+        if posting is None:
+            posting = {}
+            if self._base is not None:
+                idx = self._base.terms.pop(term, None)
+                if idx is not None:
+                    posting = self._base.posting(idx)
+            self._postings[term] = posting
+        return posting
+
+    def _doc_terms(self, slot: int) -> List[str]:
+        tfs = self._tfs[slot]
+        if tfs is not None:
+            return list(tfs)
+        if self._base is not None and slot < self._base.n_docs:
+            return self._base.doc_terms(slot)
+        return []
+
+    def _remove(self, did: str) -> None:
+        slot = self._slot_by_id.pop(did, None)
+        if slot is None:
             return
-        self.doc_ids = list(self.docs.keys())
-        self.corpus = [_tokenize(self.docs[did]) for did in self.doc_ids]
-        self.bm25 = BM25Okapi(self.corpus) if self.corpus else None
+        for term in self._doc_terms(slot):
+            posting = self._posting_for_update(term)
+            posting.pop(slot, None)
+            if not posting:
+                del self._postings[term]
+        self._total_len -= self._lengths[slot]
+        self._ids[slot] = None
+        self._lengths[slot] = 0
+        self._tfs[slot] = {}
+        self._texts[slot] = ""
+        self._free.append(slot)
+
+    def _insert(self, did: str, txt: str) -> None:
+        tokens = _tokenize(txt)
+        tfs = dict(Counter(tokens))
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = did
+            self._lengths[slot] = len(tokens)
+            self._tfs[slot] = tfs
+            self._texts[slot] = txt
+        else:
+            slot = len(self._ids)
+            self._ids.append(did)
+            self._lengths.append(len(tokens))
+            self._tfs.append(tfs)
+            self._texts.append(txt)
+        self._slot_by_id[did] = slot
+        self._total_len += len(tokens)
+        for term, tf in tfs.items():
+            self._posting_for_update(term)[slot] = tf
 
     def add_many(self, items: List[Tuple[str, str]]):
-        for did, txt in items:
-            self.docs[did] = txt or ""
-        self._rebuild()
+        with self._lock:
+            for did, txt in items:
+                self._remove(did)
+                self._insert(did, txt or "")
+            self._avg_idf = None
 
     def delete_many(self, ids: List[str]):
-        for did in ids:
-            self.docs.pop(did, None)
-        self._rebuild()
+        with self._lock:
+            for did in ids:
+                self._remove(did)
+            self._avg_idf = None
 
-    def search(self, query: str, k: int = 50) -> List[Tuple[str, float]]:
-        if not self.bm25:
-            return []
+    def _idf(self, df: int, n_docs: int) -> float:
+        return math.log(n_docs - df + 0.5) - math.log(df + 0.5)
+
+    def _average_idf(self, n_docs: int) -> float:
+        if self._avg_idf is None:
+            dfs = [len(p) for p in self._postings.values()]
+            if self._base is not None:
+                dfs.extend(self._base.df(idx) for idx in self._base.terms.values())
+            total = sum(self._idf(df, n_docs) for df in dfs)
+            self._avg_idf = total / len(dfs) if dfs else 0.0
+        return self._avg_idf
+
+    def _term_idf(self, posting: Dict[int, int], n_docs: int) -> float:
+        idf = self._idf(len(posting), n_docs)
+        if idf < 0:
+            return EPSILON * self._average_idf(n_docs)
+        return idf
+
+    def search(self, query: str, k: int = 50, allowed_ids: Set[str] | None = None) -> List[Tuple[str, float]]:
+        """
+        Top-k по BM25 с обходом только postings терминов запроса.
+
+        Термины обрабатываются по убыванию верхней границы вклада
+        (idf * (k1 + 1)). Как только k-й лучший накопленный скор не меньше
+        суммы границ оставшихся терминов, новые документы в top-k попасть
+        уже не могут (MaxScore) — дальше обновляются только кандидаты,
+        уже находящиеся в аккумуляторе. Документы без совпадений не
+        возвращаются.
+
+        allowed_ids ограничивает кандидатов (фильтры по метаданным); IDF и
+        avgdl по-прежнему считаются по всей коллекции, поэтому скоры совпадают
+        с поиском без ограничения.
+        """
         tokens = _tokenize(query)
-        if not tokens:
+        if not tokens or k <= 0:
             return []
-        scores = self.bm25.get_scores(tokens)
-        pairs = list(zip(self.doc_ids, [float(s) for s in scores]))
-        pairs.sort(key=lambda x: x[1], reverse=True)
-        return pairs[:k]
+        with self._lock:
+            n_docs = len(self._slot_by_id)
+            if not n_docs:
+                return []
+            avgdl = self._total_len / n_docs
+            lengths = self._lengths
+            allowed = None
+            if allowed_ids is not None:
+                allowed = {self._slot_by_id[did] for did in allowed_ids if did in self._slot_by_id}
+                if not allowed:
+                    return []
+
+            terms: List[Tuple[float, float, Dict[int, int]]] = []
+            for term, qtf in Counter(tokens).items():
+                posting = self._posting(term)
+                if not posting:
+                    continue
+                weight = qtf * self._term_idf(posting, n_docs)
+                terms.append((weight * (K1 + 1), weight, posting))
+            if not terms:
+                return []
+
+            prune = all(ub > 0 for ub, _, _ in terms)
+            terms.sort(key=lambda t: t[0], reverse=True)
+            remaining = [0.0] * (len(terms) + 1)
+            for i in range(len(terms) - 1, -1, -1):
+                remaining[i] = remaining[i + 1] + terms[i][0]
+
+            acc: Dict[int, float] = {}
+            for i, (_ub, weight, posting) in enumerate(terms):
+                only_existing = (
+                    prune
+                    and len(acc) >= k
+                    and heapq.nlargest(k, acc.values())[-1] >= remaining[i]
+                )
+                if only_existing:
+                    if len(acc) < len(posting):
+                        items = [(slot, posting[slot]) for slot in acc if slot in posting]
+                    else:
+                        items = [(slot, tf) for slot, tf in posting.items() if slot in acc]
+                elif allowed is None:
+                    items = posting.items()
+                elif len(allowed) < len(posting):
+                    items = [(slot, posting[slot]) for slot in allowed if slot in posting]
+                else:
+                    items = [(slot, tf) for slot, tf in posting.items() if slot in allowed]
+                for slot, tf in items:
+                    norm = K1 * (1 - B + B * lengths[slot] / avgdl)
+                    acc[slot] = acc.get(slot, 0.0) + weight * (tf * (K1 + 1) / (tf + norm))
+
+            top = heapq.nlargest(k, acc.items(), key=lambda x: x[1])
+            ids = self._ids
+            return [(ids[slot], score) for slot, score in top]
+
+    def _text(self, slot: int) -> str:
+        text = self._texts[slot]
+        if text is not None:
+            return text
+        return self._base.text(slot) if self._base is not None else ""
+
+    def doc_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._slot_by_id)
 
     def snapshot(self) -> Dict[str, str]:
-        return dict(self.docs)
+        with self._lock:
+            return {did: self._text(slot) for did, slot in self._slot_by_id.items()}
+
+    def export(self) -> Tuple[List[str], List[int], List[str], List[str], List[Dict[int, int]]]:
+        """
+        Компактное состояние для снапшота.
+
+        Returns:
+            (ids, lengths, texts, terms, postings): живые документы с
+            перенумерованными слотами, их тексты, отсортированный словарь и
+            postings {slot: tf} по терминам.
+        """
+        with self._lock:
+            live = [slot for slot, did in enumerate(self._ids) if did is not None]
+            ids = [self._ids[slot] for slot in live]
+            lengths = [self._lengths[slot] for slot in live]
+            texts = [self._text(slot) for slot in live]
+            terms = set(self._postings)
+            if self._base is not None:
+                terms.update(self._base.terms)
+            terms_sorted: List[str] = []
+            postings: List[Dict[int, int]] = []
+            compact = len(live) == len(self._ids)
+            remap = None if compact else {slot: i for i, slot in enumerate(live)}
+            for term in sorted(terms):
+                posting = self._posting(term)
+                if not posting:
+                    continue
+                if remap is not None:
+                    posting = {remap[slot]: tf for slot, tf in posting.items()}
+                terms_sorted.append(term)
+                postings.append(posting)
+            return ids, lengths, texts, terms_sorted, postings
 
 
 _REGISTRY: Dict[str, _CollectionIndex] = defaultdict(_CollectionIndex)
@@ -66,8 +351,8 @@ def delete_ids(collection: str, ids: List[str]):
     _REGISTRY[collection].delete_many(ids)
 
 
-def search(collection: str, query: str, k: int = 50) -> List[Tuple[str, float]]:
-    return _REGISTRY[collection].search(query, k=k)
+def search(collection: str, query: str, k: int = 50, allowed_ids: Set[str] | None = None) -> List[Tuple[str, float]]:
+    return _REGISTRY[collection].search(query, k=k, allowed_ids=allowed_ids)
 
 
 def reset(collection: str):
@@ -76,3 +361,16 @@ def reset(collection: str):
 
 def snapshot(collection: str) -> Dict[str, str]:
     return _REGISTRY[collection].snapshot()
+
+
+def doc_ids(collection: str) -> List[str]:
+    """ID документов коллекции (без чтения текстов)."""
+    return _REGISTRY[collection].doc_ids()
+
+
+def get_index(collection: str) -> _CollectionIndex | None:
+    return _REGISTRY.get(collection)
+
+
+def install(collection: str, index: _CollectionIndex):
+    _REGISTRY[collection] = index
@@ -0,0 +1,328 @@
+"""
+EntityIndex - inverted index "токен сущности -> doc_id" для entity-фильтра.
+
+Токены — lowercase slug и name сущностей EntityRegistry (ровно то, чем
+_apply_entity_filter сравнивает документы). Документ попадает в postings
+токена, если токен совпадает с одним из ENTITY_MATCH_KEYS метаданных или с
+текстом по тем же правилам, что и построчная проверка (token_matches).
+Постинги строятся при инжесте и на warm start (для всех сущностей
+реестра, после загрузки графа); токены, которых ещё нет в индексе,
+досчитываются при первом обращении: значения метаданных хранятся в индексе,
+тексты документов читаются из Chroma (источник истины) одним проходом вне
+блокировки индекса. Если тексты недоступны, matching() возвращает None и
+фильтр проверяет документы построчно.
+
+Индекс используется, только когда план поиска содержит сущности
+(QueryPlan.entities с политикой STRICT/BOOST); portfolio_search пока
+строит план без сущностей.
+
+Снапшот: `<index_data_dir>/entities/<collection>.json` — doc_id, content_hash
+и значения метаданных; тексты и postings не сохраняются.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Set, Tuple
+
+from ..utils.fs import atomic_write_bytes
+
+log = logging.getLogger("uvicorn.error")
+
+FORMAT_VERSION = 2
+
+# Сколько документов читать из Chroma за один запрос при досчёте postings
+TEXT_FETCH_BATCH = 500
+
+# Сколько раз ensure_tokens перечитывает тексты, если документы меняются во время чтения
+ENSURE_ATTEMPTS = 3
+
+_LOAD_LOCK = threading.Lock()
+
+ENTITY_MATCH_KEYS = (
+    "slug",
+    "project_slug",
+    "company_slug",
+    "name",
+    "title",
+    "ref_id",
+    "technologies",
+    "technologies_csv",
+    "tags",
+    "tags_csv",
+    "project_names",
+    "project_names_csv",
+)
+
+
+def _token_match(text: str, token: str) -> bool:
+    token = (token or "").strip().lower()
+    if not token:
+        return False
+    tl = (text or "").lower()
+    if not tl:
+        return False
+    if len(token) <= 3 and token.isalnum():
+        return re.search(rf"(?<![\w-]){re.escape(token)}(?![\w-])", tl) is not None
+    return token in tl
+
+
+def metadata_values(metadata: Mapping[str, Any] | None) -> List[str]:
+    """Lowercase-значения ENTITY_MATCH_KEYS метаданных документа."""
+    out: List[str] = []
+
+    def _add(val: Any) -> None:
+        if val is None:
+            return
+        if isinstance(val, (list, tuple, set)):
+            for v in val:
+                _add(v)
+            return
+        out.append((val if isinstance(val, str) else str(val)).lower())
+
+    md = metadata or {}
+    for key in ENTITY_MATCH_KEYS:
+        _add(md.get(key))
+    return out
+
+
+def match_values(metadata: Mapping[str, Any] | None, text: str | None) -> List[str]:
+    """Lowercase-значения, по которым документ сопоставляется с сущностями."""
+    return metadata_values(metadata) + [(text or "").lower()]
+
+
+def token_matches(values: Iterable[str], token: str) -> bool:
+    """Совпадает ли токен сущности (lowercase slug/name) хотя бы с одним значением."""
+    return any(val == token or _token_match(val, token) for val in values)
+
+
+TextSource = Callable[[List[str]], Mapping[str, str]]
+
+
+class EntityIndex:
+    """
+    Postings токенов сущностей одной коллекции.
+
+    texts: doc_id -> текст документа; нужен, чтобы досчитать postings новых
+    токенов для документов, проиндексированных без текста (после снапшота).
+    """
+
+    def __init__(self, texts: TextSource | None = None) -> None:
+        # doc_id -> (content_hash, значения метаданных)
+        self._docs: Dict[str, Tuple[str | None, List[str]]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._texts = texts
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add_documents(self, items: Iterable[Tuple[str, str, Mapping[str, Any] | None]]) -> None:
+        """items: (doc_id, text, metadata) — как они лежат в Chroma."""
+        with self._lock:
+            for did, text, md in items:
+                self._remove(did)
+                meta = metadata_values(md)
+                self._docs[did] = ((md or {}).get("content_hash"), meta)
+                values = meta + [(text or "").lower()]
+                for token, posting in self._postings.items():
+                    if token_matches(values, token):
+                        posting.add(did)
+
+    def _remove(self, did: str) -> None:
+        if self._docs.pop(did, None) is None:
+            return
+        for posting in self._postings.values():
+            posting.discard(did)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for did in ids:
+                self._remove(did)
+
+    def ensure_tokens(self, tokens: Iterable[str]) -> bool:
+        """
+        Построить postings для токенов, которых ещё нет в индексе.
+
+        Тексты документов читаются один раз на вызов и вне блокировки индекса
+        (поиск и инжест не ждут Chroma); документы, добавленные или
+        изменённые за время чтения (другой content_hash), дочитываются —
+        не больше ENSURE_ATTEMPTS чтений.
+
+        Returns:
+            False, если тексты документов получить не удалось (postings не построены)
+        """
+        tokens = list(dict.fromkeys(tokens))
+        # doc_id -> (content_hash на момент чтения, lowercase-текст)
+        texts: Dict[str, Tuple[str | None, str]] = {}
+        for _ in range(ENSURE_ATTEMPTS):
+            with self._lock:
+                missing = [t for t in tokens if t not in self._postings]
+                if not missing:
+                    return True
+                stale = {
+                    did: content_hash
+                    for did, (content_hash, _) in self._docs.items()
+                    if did not in texts or texts[did][0] != content_hash
+                }
+                if not stale:
+                    for token in missing:
+                        self._postings[token] = {
+                            did
+                            for did, (_, meta) in self._docs.items()
+                            if token_matches(meta + [texts[did][1]], token)
+                        }
+                    return True
+            if self._texts is None:
+                return False
+            try:
+                fetched = self._texts(list(stale))
+            except Exception:
+                log.warning("Entity index: fetching document texts failed", exc_info=True)
+                return False
+            for did, content_hash in stale.items():
+                texts[did] = (content_hash, (fetched.get(did) or "").lower())
+        log.warning("Entity index: documents kept changing while postings were built")
+        return False
+
+    def is_current(self, did: str | None, content_hash: str | None) -> bool:
+        """Документ проиндексирован в той же версии (по content_hash)."""
+        if did is None or content_hash is None:
+            return False
+        entry = self._docs.get(did)
+        return entry is not None and entry[0] == content_hash
+
+    def matching(self, tokens: Iterable[str]) -> Set[str] | None:
+        """doc_id, совпадающие хотя бы с одним из токенов; None — postings построить не удалось."""
+        tokens = list(tokens)
+        if not self.ensure_tokens(tokens):
+            return None
+        with self._lock:
+            out: Set[str] = set()
+            for token in tokens:
+                out |= self._postings[token]
+            return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": FORMAT_VERSION,
+                "docs": {did: [h, meta] for did, (h, meta) in self._docs.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any], texts: TextSource | None = None) -> "EntityIndex":
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported entity index version {data.get('version')}")
+        index = cls(texts)
+        index._docs = {did: (h, list(meta)) for did, (h, meta) in data["docs"].items()}
+        return index
+
+
+def _chroma_texts(collection: str) -> TextSource:
+    """Источник текстов документов коллекции из Chroma."""
+
+    def fetch(ids: List[str]) -> Dict[str, str]:
+        from ..deps import chroma_client
+
+        coll = chroma_client().get_collection(collection)
+        out: Dict[str, str] = {}
+        for i in range(0, len(ids), TEXT_FETCH_BATCH):
+            data = coll.get(ids=ids[i : i + TEXT_FETCH_BATCH], include=["documents"])
+            out.update(zip((str(d) for d in data.get("ids") or []), data.get("documents") or []))
+        return out
+
+    return fetch
+
+
+_REGISTRY: Dict[str, EntityIndex] = {}
+
+
+def _index(collection: str) -> EntityIndex:
+    index = _REGISTRY.get(collection)
+    if index is None:
+        index = _REGISTRY[collection] = EntityIndex(_chroma_texts(collection))
+    return index
+
+
+def add_documents(collection: str, ids: List[str], texts: List[str], metadatas: List[Mapping[str, Any] | None]):
+    _index(collection).add_documents(zip(ids, texts, metadatas))
+
+
+def delete_ids(collection: str, ids: List[str]):
+    _index(collection).delete(ids)
+
+
+def reset(collection: str):
+    _REGISTRY.pop(collection, None)
+
+
+def get_index(collection: str) -> EntityIndex | None:
+    return _REGISTRY.get(collection)
+
+
+def ensure_tokens_all(tokens: Iterable[str]) -> bool:
+    """Построить postings токенов во всех индексах процесса (warm start)."""
+    tokens = list(tokens)
+    built = False
+    for index in list(_REGISTRY.values()):
+        built = index.ensure_tokens(tokens) or built
+    return built
+
+
+def _data_dir() -> Path:
+    from ..settings import get_settings
+
+    return Path(get_settings().index_data_dir)
+
+
+def _state_path(collection: str, data_dir: str | Path | None = None) -> Path:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    return (base / "entities" / f"{collection}.json").resolve()
+
+
+def entities_try_load(collection: str, data_dir: str | Path | None = None) -> bool:
+    """Восстановить EntityIndex коллекции из снапшота (если в памяти пусто)."""
+    with _LOAD_LOCK:
+        current = _REGISTRY.get(collection)
+        if current is not None and len(current):
+            return False
+        path = _state_path(collection, data_dir)
+        if not path.exists():
+            return False
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            _REGISTRY[collection] = EntityIndex.from_dict(data, _chroma_texts(collection))
+            return True
+        except Exception:
+            log.warning("Entity index restore failed", exc_info=True)
+            return False
+
+
+def entities_snapshot_collections(data_dir: str | Path | None = None) -> List[str]:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    folder = base / "entities"
+    if not folder.is_dir():
+        return []
+    return sorted(p.stem for p in folder.glob("*.json"))
+
+
+def entities_try_save(collection: str, data_dir: str | Path | None = None):
+    index = _REGISTRY.get(collection)
+    if index is None:
+        return
+    try:
+        data = json.dumps(index.to_dict(), ensure_ascii=False).encode("utf-8")
+        atomic_write_bytes(_state_path(collection, data_dir), data)
+    except Exception:
+        log.warning("Entity index save failed", exc_info=True)
+
+
+def entities_try_delete(collection: str, data_dir: str | Path | None = None):
+    try:
+        _state_path(collection, data_dir).unlink(missing_ok=True)
+    except Exception:
+        log.warning("Entity index snapshot delete failed", exc_info=True)
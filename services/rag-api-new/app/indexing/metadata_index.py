@@ -0,0 +1,205 @@
+"""
+MetadataIndex - postings "значение поля метаданных -> doc_id" для фильтров поиска.
+
+Поля (FIELDS) — те, по которым работают фильтры планировщика (см.
+app/rag/filters.py): сырые type/category и производные значения
+tech_category/company/project/tags, вычисляемые ровно так, как их
+сравнивает построчный фильтр. Предикат фильтра вычисляется один раз на
+уникальное значение поля, а не на документ, — отсюда множество допустимых
+doc_id для BM25 и where-выражение для dense-поиска.
+
+Снапшот: `<index_data_dir>/metadata/<collection>.json`.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Set, Tuple
+
+from ..utils.fs import atomic_write_bytes
+
+log = logging.getLogger("uvicorn.error")
+
+FORMAT_VERSION = 1
+
+_LOAD_LOCK = threading.Lock()
+
+
+def _tech_category(md: Mapping[str, Any]) -> str | None:
+    # None — документ не технология, фильтр по категории его не касается
+    if md.get("type", "") != "technology":
+        return None
+    return str(md.get("category") or "").lower()
+
+
+def _tags(md: Mapping[str, Any]) -> Tuple[str, ...]:
+    tags = md.get("tags", [])
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",")]
+    return tuple(sorted({str(t).lower() for t in tags}))
+
+
+FIELDS: Dict[str, Callable[[Mapping[str, Any]], Any]] = {
+    "type": lambda md: md.get("type"),
+    "category": lambda md: md.get("category"),
+    "tech_category": _tech_category,
+    "company": lambda md: str(md.get("company_slug") or md.get("company_name") or "").lower(),
+    "project": lambda md: str(md.get("project_slug") or md.get("slug") or md.get("name") or "").lower(),
+    "tags": _tags,
+}
+
+
+def field_values(metadata: Mapping[str, Any] | None) -> Dict[str, Any]:
+    """Значения всех FIELDS документа."""
+    md = metadata or {}
+    return {name: fn(md) for name, fn in FIELDS.items()}
+
+
+class MetadataIndex:
+    """Postings значений FIELDS одной коллекции."""
+
+    def __init__(self) -> None:
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        # field -> value -> doc_ids
+        self._postings: Dict[str, Dict[Any, Set[str]]] = {name: {} for name in FIELDS}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _insert(self, did: str, values: Dict[str, Any]) -> None:
+        self._docs[did] = values
+        for name, value in values.items():
+            self._postings[name].setdefault(value, set()).add(did)
+
+    def _remove(self, did: str) -> None:
+        values = self._docs.pop(did, None)
+        if values is None:
+            return
+        for name, value in values.items():
+            posting = self._postings[name].get(value)
+            if posting is not None:
+                posting.discard(did)
+                if not posting:
+                    del self._postings[name][value]
+
+    def add_documents(self, items: Iterable[Tuple[str, Mapping[str, Any] | None]]) -> None:
+        """items: (doc_id, metadata) — как они лежат в Chroma."""
+        with self._lock:
+            for did, md in items:
+                self._remove(did)
+                self._insert(did, field_values(md))
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for did in ids:
+                self._remove(did)
+
+    def values(self, field: str) -> List[Any]:
+        """Уникальные значения поля."""
+        with self._lock:
+            return list(self._postings[field])
+
+    def ids_where(self, field: str, predicate: Callable[[Any], bool]) -> Set[str]:
+        """doc_id, у которых значение поля удовлетворяет предикату."""
+        with self._lock:
+            out: Set[str] = set()
+            for value, posting in self._postings[field].items():
+                if predicate(value):
+                    out |= posting
+            return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": FORMAT_VERSION,
+                "fields": list(FIELDS),
+                "docs": {did: [values[name] for name in FIELDS] for did, values in self._docs.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "MetadataIndex":
+        if data.get("version") != FORMAT_VERSION or data.get("fields") != list(FIELDS):
+            raise ValueError(f"Unsupported metadata index version {data.get('version')}")
+        index = cls()
+        for did, row in data["docs"].items():
+            values = dict(zip(FIELDS, row))
+            values["tags"] = tuple(values["tags"])
+            index._insert(did, values)
+        return index
+
+
+_REGISTRY: Dict[str, MetadataIndex] = defaultdict(MetadataIndex)
+
+
+def add_documents(collection: str, ids: List[str], metadatas: List[Mapping[str, Any] | None]):
+    _REGISTRY[collection].add_documents(zip(ids, metadatas))
+
+
+def delete_ids(collection: str, ids: List[str]):
+    _REGISTRY[collection].delete(ids)
+
+
+def reset(collection: str):
+    _REGISTRY.pop(collection, None)
+
+
+def get_index(collection: str) -> MetadataIndex | None:
+    return _REGISTRY.get(collection)
+
+
+def _data_dir() -> Path:
+    from ..settings import get_settings
+
+    return Path(get_settings().index_data_dir)
+
+
+def _state_path(collection: str, data_dir: str | Path | None = None) -> Path:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    return (base / "metadata" / f"{collection}.json").resolve()
+
+
+def metadata_try_load(collection: str, data_dir: str | Path | None = None) -> bool:
+    """Восстановить MetadataIndex коллекции из снапшота (если в памяти пусто)."""
+    with _LOAD_LOCK:
+        current = _REGISTRY.get(collection)
+        if current is not None and len(current):
+            return False
+        path = _state_path(collection, data_dir)
+        if not path.exists():
+            return False
+        try:
+            _REGISTRY[collection] = MetadataIndex.from_dict(json.loads(path.read_text(encoding="utf-8")))
+            return True
+        except Exception:
+            log.warning("Metadata index restore failed", exc_info=True)
+            return False
+
+
+def metadata_snapshot_collections(data_dir: str | Path | None = None) -> List[str]:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    folder = base / "metadata"
+    if not folder.is_dir():
+        return []
+    return sorted(p.stem for p in folder.glob("*.json"))
+
+
+def metadata_try_save(collection: str, data_dir: str | Path | None = None):
+    index = _REGISTRY.get(collection)
+    if index is None:
+        return
+    try:
+        data = json.dumps(index.to_dict(), ensure_ascii=False).encode("utf-8")
+        atomic_write_bytes(_state_path(collection, data_dir), data)
+    except Exception:
+        log.warning("Metadata index save failed", exc_info=True)
+
+
+def metadata_try_delete(collection: str, data_dir: str | Path | None = None):
+    try:
+        _state_path(collection, data_dir).unlink(missing_ok=True)
+    except Exception:
+        log.warning("Metadata index snapshot delete failed", exc_info=True)
@@ -1,38 +1,248 @@
+"""
+Persistence - бинарные снапшоты BM25-индекса.
+
+Формат файла `<index_data_dir>/bm25/<collection>.bin` (little-endian):
+
+    header   magic, version, n_docs, n_terms, n_postings, body_len, crc32(body)
+    body     doc_lengths   u32[n_docs]
+             doc_id_off    u32[n_docs + 1]   + doc_id_blob  (utf-8, выровнен до 4)
+             term_off      u32[n_terms + 1]  + term_blob    (utf-8, выровнен до 4)
+             post_off      u32[n_terms + 1]
+             post_docs     u32[n_postings]
+             post_tfs      u32[n_postings]
+             fwd_off       u32[n_docs + 1]
+             fwd_terms     u32[n_postings]
+             fwd_tfs       u32[n_postings]
+             text_off      u32[n_docs + 1]   + text_blob    (utf-8; с версии 2)
+
+Загрузка идёт через mmap без повторной токенизации: декодируются только
+таблица doc_id и словарь, postings и тексты документов (bm25.snapshot)
+читаются из mmap по запросу. Снапшоты версии 1 (без текстов) читаются:
+поиск по ним работает, тексты их документов пустые до переиндексации.
+Запись атомарная: временный файл в той же директории + os.replace.
+"""
 from __future__ import annotations
-from typing import Any
-import os, pickle, logging
+
+import logging
+import mmap
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from pathlib import Path
+from typing import List, Sequence
+
 from . import bm25
+from ..utils.fs import atomic_write_bytes
 
 log = logging.getLogger("uvicorn.error")
 
+MAGIC = b"BM25IDX\0"
+FORMAT_VERSION = 2
+_READABLE_VERSIONS = (1, 2)
+_HEADER = struct.Struct("<8sIIIQQI")
+
+# warm start и ingest могут одновременно пытаться восстановить коллекцию
+_LOAD_LOCK = threading.Lock()
+
+
+def _data_dir() -> Path:
+    from ..settings import get_settings
+
+    return Path(get_settings().index_data_dir)
+
+
+def _bm25_state_path(collection: str, data_dir: str | Path | None = None) -> Path:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    return (base / "bm25" / f"{collection}.bin").resolve()
+
+
+def _u32(values: Sequence[int]) -> bytes:
+    arr = array("I", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _blob(strings: List[str]) -> tuple[bytes, bytes]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for e in encoded:
+        offsets.append(offsets[-1] + len(e))
+    data = b"".join(encoded)
+    data += b"\0" * (-len(data) % 4)
+    return _u32(offsets), data
+
+
+def encode_index(index: "bm25._CollectionIndex") -> bytes:
+    """Сериализовать индекс коллекции в бинарный снапшот."""
+    ids, lengths, texts, terms, postings = index.export()
+
+    post_off = [0]
+    post_docs = array("I")
+    post_tfs = array("I")
+    fwd_len = [0] * len(ids)
+    for posting in postings:
+        post_docs.extend(posting.keys())
+        post_tfs.extend(posting.values())
+        post_off.append(len(post_docs))
+        for slot in posting:
+            fwd_len[slot] += 1
 
-def _bm25_state_path(collection: str) -> str | None:
-    # Храним рядом с данными (по умолчанию — просто файл в рабочей директории)
-    fname = f".bm25.{collection}.pkl"
-    return os.path.abspath(fname)
+    # Forward index (doc -> термины) раскладываем по тем же postings
+    fwd_off = [0]
+    for n in fwd_len:
+        fwd_off.append(fwd_off[-1] + n)
+    cursor = fwd_off[:-1]
+    fwd_terms = array("I", bytes(4 * len(post_docs)))
+    fwd_tfs = array("I", bytes(4 * len(post_docs)))
+    for term_idx, posting in enumerate(postings):
+        for slot, tf in posting.items():
+            pos = cursor[slot]
+            fwd_terms[pos] = term_idx
+            fwd_tfs[pos] = tf
+            cursor[slot] = pos + 1
 
+    id_off, id_blob = _blob(ids)
+    term_off, term_blob = _blob(terms)
+    encoded = [t.encode("utf-8") for t in texts]
+    text_off = [0]
+    for e in encoded:
+        text_off.append(text_off[-1] + len(e))
+    body = b"".join([
+        _u32(lengths),
+        id_off, id_blob,
+        term_off, term_blob,
+        _u32(post_off), _u32(post_docs), _u32(post_tfs),
+        _u32(fwd_off), _u32(fwd_terms), _u32(fwd_tfs),
+        _u32(text_off), *encoded,
+    ])
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(ids), len(terms), len(post_docs), len(body), zlib.crc32(body)
+    )
+    return header + body
 
-def bm25_try_load(collection: str):
-    path = _bm25_state_path(collection)
-    if not path or not os.path.exists(path):
+
+class _Reader:
+    def __init__(self, buf, offset: int) -> None:
+        self.view = memoryview(buf)
+        self.pos = offset
+
+    def u32(self, n: int) -> Sequence[int]:
+        chunk = self.view[self.pos:self.pos + 4 * n]
+        self.pos += 4 * n
+        if sys.byteorder == "big":
+            arr = array("I", chunk.tobytes())
+            arr.byteswap()
+            return arr
+        return chunk.cast("I")
+
+    def strings(self, n: int) -> List[str]:
+        offsets = self.u32(n + 1)
+        size = offsets[n]
+        data = self.view[self.pos:self.pos + size]
+        self.pos += size + (-size % 4)
+        raw = bytes(data)
+        return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n)]
+
+
+def decode_index(buf) -> "bm25._CollectionIndex":
+    """
+    Восстановить индекс из снапшота (bytes или mmap).
+
+    Raises:
+        ValueError: неверный magic/версия или не сошлась контрольная сумма.
+    """
+    if len(buf) < _HEADER.size:
+        raise ValueError("BM25 snapshot is truncated")
+    magic, version, n_docs, n_terms, n_postings, body_len, crc = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a BM25 snapshot")
+    if version not in _READABLE_VERSIONS:
+        raise ValueError(f"Unsupported BM25 snapshot version {version}")
+    if len(buf) != _HEADER.size + body_len:
+        raise ValueError("BM25 snapshot is truncated")
+    if zlib.crc32(memoryview(buf)[_HEADER.size:]) != crc:
+        raise ValueError("BM25 snapshot checksum mismatch")
+
+    r = _Reader(buf, _HEADER.size)
+    lengths = list(r.u32(n_docs))
+    ids = r.strings(n_docs)
+    terms = r.strings(n_terms)
+    post_offsets = r.u32(n_terms + 1)
+    post_docs = r.u32(n_postings)
+    post_tfs = r.u32(n_postings)
+    fwd_offsets = r.u32(n_docs + 1)
+    fwd_terms = r.u32(n_postings)
+    fwd_tfs = r.u32(n_postings)
+    text_offsets = text_blob = None
+    if version >= 2:
+        text_offsets = r.u32(n_docs + 1)
+        text_blob = r.view[r.pos:]
+    segment = bm25._Segment(
+        term_names=terms,
+        post_offsets=post_offsets,
+        post_docs=post_docs,
+        post_tfs=post_tfs,
+        fwd_offsets=fwd_offsets,
+        fwd_terms=fwd_terms,
+        fwd_tfs=fwd_tfs,
+        buffer=buf,
+        text_offsets=text_offsets,
+        text_blob=text_blob,
+    )
+    return bm25._CollectionIndex.from_segment(ids, lengths, segment)
+
+
+def bm25_try_load(collection: str, data_dir: str | Path | None = None) -> bool:
+    """
+    Восстановить BM25-индекс коллекции из снапшота.
+
+    Ничего не делает, если индекс уже есть в памяти или файла нет.
+    """
+    with _LOAD_LOCK:
+        current = bm25.get_index(collection)
+        if current is not None and len(current):
+            return False
+        path = _bm25_state_path(collection, data_dir)
+        if not path.exists():
+            return False
+        try:
+            with open(path, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            index = decode_index(buf)
+            bm25.install(collection, index)
+            log.info(f"BM25 restored for {collection}: {len(index)} docs")
+            return True
+        except Exception:
+            log.warning("BM25 restore failed", exc_info=True)
+            return False
+
+
+def bm25_snapshot_collections(data_dir: str | Path | None = None) -> list[str]:
+    """Коллекции, для которых на диске есть снапшот BM25."""
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    folder = base / "bm25"
+    if not folder.is_dir():
+        return []
+    return sorted(p.stem for p in folder.glob("*.bin"))
+
+
+def bm25_try_save(collection: str, data_dir: str | Path | None = None):
+    path = _bm25_state_path(collection, data_dir)
+    index = bm25.get_index(collection)
+    if index is None:
         return
     try:
-        with open(path, "rb") as f:
-            docs = pickle.load(f)  # dict[id] = text
-        ids = list(docs.keys())
-        texts = [docs[i] for i in ids]
-        bm25.add_texts(collection, ids, texts)
-        log.info(f"BM25 restored for {collection}: {len(ids)} docs")
+        atomic_write_bytes(path, encode_index(index))
     except Exception:
-        log.warning("BM25 restore failed", exc_info=True)
+        log.warning("BM25 save failed", exc_info=True)
 
 
-def bm25_try_save(collection: str, full_docs: dict[str, str]):
-    path = _bm25_state_path(collection)
-    if not path:
-        return
+def bm25_try_delete(collection: str, data_dir: str | Path | None = None):
+    path = _bm25_state_path(collection, data_dir)
     try:
-        with open(path, "wb") as f:
-            pickle.dump(full_docs, f)
+        path.unlink(missing_ok=True)
     except Exception:
-        log.warning("BM25 save failed", exc_info=True)
+        log.warning("BM25 snapshot delete failed", exc_info=True)
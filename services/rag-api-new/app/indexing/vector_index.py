@@ -0,0 +1,270 @@
+"""
+VectorIndex - in-process копия dense-индекса коллекции Chroma.
+
+Векторы лежат в одном непрерывном float32-массиве (n, dim), рядом —
+выровненные по строкам ids, тексты и метаданные. Top-k считается одним
+matmul по L2-расстоянию (как в Chroma с пространством по умолчанию):
+||x - q||^2 = ||x||^2 - 2 x·q + ||q||^2. Метаданные фильтруются до
+ранжирования маской по колонкам (`$in`, `$eq`, `$and`, `$or`).
+
+Chroma остаётся источником истины: индекс заполняется при инжесте
+(эмбеддинги читаются обратно из Chroma) и из локального снапшота.
+"""
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from ..rag.types import Doc
+
+_MIN_CAPACITY = 64
+
+
+class UnsupportedFilter(ValueError):
+    """Фильтр нельзя выполнить локально — нужен запрос в Chroma."""
+
+
+class VectorIndex:
+    """
+    Плотная матрица эмбеддингов одной коллекции.
+
+    Удаление переносит последнюю строку на место удалённой, так что
+    живые векторы всегда занимают префикс матрицы [:n].
+    """
+
+    def __init__(self, dim: int | None = None) -> None:
+        self.dim = dim
+        self._matrix: np.ndarray | None = None
+        self._sq_norms: np.ndarray | None = None
+        self._n = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _reserve(self, n: int) -> None:
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if n <= capacity:
+            return
+        new_capacity = max(_MIN_CAPACITY, capacity * 2, n)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        sq_norms = np.zeros(new_capacity, dtype=np.float32)
+        if self._matrix is not None:
+            matrix[: self._n] = self._matrix[: self._n]
+            sq_norms[: self._n] = self._sq_norms[: self._n]
+        self._matrix, self._sq_norms = matrix, sq_norms
+
+    def _delete_row(self, did: str) -> None:
+        row = self._row_by_id.pop(did, None)
+        if row is None:
+            return
+        last = self._n - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._sq_norms[row] = self._sq_norms[last]
+            self._ids[row] = self._ids[last]
+            self._texts[row] = self._texts[last]
+            self._metas[row] = self._metas[last]
+            self._row_by_id[self._ids[row]] = row
+        self._ids.pop()
+        self._texts.pop()
+        self._metas.pop()
+        self._n = last
+
+    def upsert(
+        self,
+        ids: List[str],
+        vectors: Any,
+        texts: List[str],
+        metadatas: List[Dict[str, Any] | None],
+    ) -> None:
+        vecs = np.asarray(vectors, dtype=np.float32)
+        if not ids:
+            return
+        if vecs.ndim != 2 or vecs.shape[0] != len(ids):
+            raise ValueError("vectors must be a (len(ids), dim) matrix")
+        with self._lock:
+            if self.dim is None:
+                self.dim = vecs.shape[1]
+            elif vecs.shape[1] != self.dim:
+                raise ValueError(f"vector dim {vecs.shape[1]} != index dim {self.dim}")
+            for did in ids:
+                self._delete_row(did)
+            self._reserve(self._n + len(ids))
+            start = self._n
+            self._matrix[start : start + len(ids)] = vecs
+            self._sq_norms[start : start + len(ids)] = np.einsum("ij,ij->i", vecs, vecs)
+            for i, did in enumerate(ids):
+                self._row_by_id[did] = start + i
+            self._ids.extend(ids)
+            self._texts.extend(t or "" for t in texts)
+            self._metas.extend(dict(md or {}) for md in metadatas)
+            self._n += len(ids)
+            self._columns = {}
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            for did in ids:
+                self._delete_row(did)
+            self._columns = {}
+
+    def _column(self, key: str) -> np.ndarray:
+        col = self._columns.get(key)
+        if col is None:
+            col = np.empty(self._n, dtype=object)
+            col[:] = [md.get(key) for md in self._metas]
+            self._columns[key] = col
+        return col
+
+    def _mask(self, where: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(self._n, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._mask(sub)
+                continue
+            if key == "$or":
+                either = np.zeros(self._n, dtype=bool)
+                for sub in cond:
+                    either |= self._mask(sub)
+                mask &= either
+                continue
+            if key.startswith("$"):
+                raise UnsupportedFilter(key)
+            col = self._column(key)
+            if isinstance(cond, dict):
+                if set(cond) == {"$in"}:
+                    allowed = set(cond["$in"])
+                    mask &= np.fromiter((v in allowed for v in col), dtype=bool, count=self._n)
+                elif set(cond) == {"$eq"}:
+                    mask &= col == cond["$eq"]
+                else:
+                    raise UnsupportedFilter(str(cond))
+            else:
+                mask &= col == cond
+        return mask
+
+    def search(self, vector: Any, k: int, where: Dict[str, Any] | None = None) -> List[Tuple[Doc, float]]:
+        """
+        Top-k ближайших по L2 с предварительной фильтрацией по метаданным.
+
+        Raises:
+            UnsupportedFilter: оператор фильтра не поддерживается локально.
+        """
+        q = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if not self._n or k <= 0:
+                return []
+            if q.shape != (self.dim,):
+                raise ValueError(f"query dim {q.shape} != index dim {self.dim}")
+            rows = None
+            if where:
+                rows = np.flatnonzero(self._mask(where))
+                if not rows.size:
+                    return []
+                matrix, sq_norms = self._matrix[rows], self._sq_norms[rows]
+            else:
+                matrix, sq_norms = self._matrix[: self._n], self._sq_norms[: self._n]
+            dist = sq_norms - 2.0 * (matrix @ q) + float(q @ q)
+            k = min(k, dist.shape[0])
+            top = np.argpartition(dist, k - 1)[:k] if k < dist.shape[0] else np.arange(dist.shape[0])
+            top = top[np.argsort(dist[top], kind="stable")]
+            out = []
+            for i in top:
+                row = int(rows[i]) if rows is not None else int(i)
+                out.append((Doc(self._texts[row], dict(self._metas[row])), float(dist[i])))
+            return out
+
+    def get(self, ids: List[str]) -> Dict[str, List[Any]]:
+        """Документы по id в формате Chroma collection.get (отсутствующие пропускаются)."""
+        with self._lock:
+            rows = [self._row_by_id[did] for did in ids if did in self._row_by_id]
+            return {
+                "ids": [self._ids[r] for r in rows],
+                "documents": [self._texts[r] for r in rows],
+                "metadatas": [dict(self._metas[r]) for r in rows],
+            }
+
+    def export(self) -> Tuple[np.ndarray, List[str], List[str], List[Dict[str, Any]]]:
+        with self._lock:
+            matrix = self._matrix[: self._n].copy() if self._matrix is not None else np.zeros((0, self.dim or 0), np.float32)
+            return matrix, list(self._ids), list(self._texts), [dict(md) for md in self._metas]
+
+
+class LocalVectorStore:
+    """
+    Обёртка над Chroma-vectorstore, отвечающая на dense-запросы из VectorIndex.
+
+    Пока локальный индекс пуст или фильтр не поддерживается, запрос уходит
+    в Chroma; остальные методы (add_texts, delete, ...) проксируются как есть.
+    """
+
+    def __init__(self, vs, collection: str) -> None:
+        self._vs = vs
+        self.collection = collection
+        # fetch_by_ids должен идти через get(), а не напрямую в коллекцию Chroma
+        self._collection = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._vs, name)
+
+    @property
+    def embeddings(self):
+        return self._vs.embeddings
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Dict[str, Any] | None = None, **kwargs):
+        index = get_index(self.collection)
+        if index is not None and len(index):
+            try:
+                return [doc for doc, _ in index.search(embedding, k, where=filter)]
+            except UnsupportedFilter:
+                pass
+        kw = {"filter": filter} if filter else {}
+        return self._vs.similarity_search_by_vector(embedding, k=k, **kw, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Dict[str, Any] | None = None, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter, **kwargs)
+
+    def get(self, ids: List[str] | None = None, include: List[str] | None = None, **kwargs) -> Dict[str, List[Any]]:
+        index = get_index(self.collection)
+        if ids is None or index is None:
+            return self._vs.get(ids=ids, include=include, **kwargs)
+        data = index.get(ids)
+        found = set(data["ids"])
+        missing = [did for did in ids if did not in found]
+        if missing:
+            rest = self._vs.get(ids=missing, include=["documents", "metadatas"])
+            for key in ("ids", "documents", "metadatas"):
+                data[key].extend(rest.get(key) or [])
+        return data
+
+
+_REGISTRY: Dict[str, VectorIndex] = defaultdict(VectorIndex)
+
+
+def upsert(collection: str, ids: List[str], vectors: Any, texts: List[str], metadatas: List[Dict[str, Any] | None]):
+    _REGISTRY[collection].upsert(ids, vectors, texts, metadatas)
+
+
+def delete_ids(collection: str, ids: List[str]):
+    _REGISTRY[collection].delete(ids)
+
+
+def reset(collection: str):
+    _REGISTRY.pop(collection, None)
+
+
+def get_index(collection: str) -> VectorIndex | None:
+    return _REGISTRY.get(collection)
+
+
+def install(collection: str, index: VectorIndex):
+    _REGISTRY[collection] = index
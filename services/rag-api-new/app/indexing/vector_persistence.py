@@ -0,0 +1,165 @@
+"""
+Persistence - снапшоты in-process векторного индекса (vector_index.py).
+
+Файл `<index_data_dir>/vectors/<collection>.npz`: матрица float32, JSON
+с ids/текстами/метаданными (records) и блок meta — версия формата и
+crc32(matrix + records). Если снапшота нет или он повреждён (checksum не
+сходится), индекс можно заполнить напрямую из Chroma (vectors_sync_from_chroma).
+"""
+from __future__ import annotations
+
+import io
+import json
+import logging
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+
+from . import vector_index
+from ..utils.fs import atomic_write_bytes
+
+log = logging.getLogger("uvicorn.error")
+
+FORMAT_VERSION = 2
+
+_LOAD_LOCK = threading.Lock()
+
+
+def _data_dir() -> Path:
+    from ..settings import get_settings
+
+    return Path(get_settings().index_data_dir)
+
+
+def _vectors_state_path(collection: str, data_dir: str | Path | None = None) -> Path:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    return (base / "vectors" / f"{collection}.npz").resolve()
+
+
+def _checksum(matrix: np.ndarray, records: bytes) -> int:
+    return zlib.crc32(records, zlib.crc32(np.ascontiguousarray(matrix, dtype=np.float32).tobytes()))
+
+
+def encode_vectors(index: vector_index.VectorIndex) -> bytes:
+    matrix, ids, texts, metas = index.export()
+    records = json.dumps({"ids": ids, "texts": texts, "metadatas": metas}, ensure_ascii=False).encode("utf-8")
+    meta = json.dumps({"version": FORMAT_VERSION, "crc32": _checksum(matrix, records)}).encode("utf-8")
+    buf = io.BytesIO()
+    np.savez(
+        buf,
+        matrix=matrix,
+        records=np.frombuffer(records, dtype=np.uint8),
+        meta=np.frombuffer(meta, dtype=np.uint8),
+    )
+    return buf.getvalue()
+
+
+def decode_vectors(data: Any) -> vector_index.VectorIndex:
+    """
+    Raises:
+        ValueError: неподдерживаемая версия, checksum не сходится или
+            рассогласованные массивы.
+    """
+    with np.load(data if not isinstance(data, bytes) else io.BytesIO(data), allow_pickle=False) as npz:
+        meta = json.loads(npz["meta"].tobytes().decode("utf-8"))
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector snapshot version {meta.get('version')}")
+        matrix = npz["matrix"]
+        records = npz["records"].tobytes()
+    if _checksum(matrix, records) != meta.get("crc32"):
+        raise ValueError("Vector snapshot checksum mismatch")
+    body = json.loads(records.decode("utf-8"))
+    ids = body["ids"]
+    if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+        raise ValueError("Vector snapshot is inconsistent")
+    index = vector_index.VectorIndex(dim=matrix.shape[1] if len(ids) else None)
+    index.upsert(ids, matrix, body["texts"], body["metadatas"])
+    return index
+
+
+def vectors_try_load(collection: str, data_dir: str | Path | None = None, vs=None) -> bool:
+    """
+    Восстановить векторный индекс коллекции из снапшота (если в памяти пусто).
+
+    Если снапшот не читается (checksum, версия, формат) и передан vs
+    (Chroma-коллекции), индекс заполняется из Chroma и снапшот перезаписывается.
+    """
+    with _LOAD_LOCK:
+        current = vector_index.get_index(collection)
+        if current is not None and len(current):
+            return False
+        path = _vectors_state_path(collection, data_dir)
+        if not path.exists():
+            return False
+        try:
+            index = decode_vectors(path)
+            vector_index.install(collection, index)
+            log.info(f"Vector index restored for {collection}: {len(index)} docs")
+            return True
+        except Exception:
+            log.warning("Vector index restore failed", exc_info=True)
+        if vs is None:
+            return False
+        try:
+            synced = vectors_sync_from_chroma(collection, vs)
+        except Exception:
+            log.warning("Vector index sync after a failed restore failed", exc_info=True)
+            return False
+        log.info(f"Vector index for {collection} rebuilt from Chroma: {synced} docs")
+        vectors_try_save(collection, data_dir)
+        return synced > 0
+
+
+def vectors_sync_from_chroma(collection: str, vs, ids: List[str] | None = None) -> int:
+    """
+    Скопировать эмбеддинги из Chroma в локальный индекс.
+
+    ids=None — вся коллекция (индекс пересобирается), иначе только указанные документы.
+    """
+    coll = getattr(vs, "_collection", None)
+    if coll is None:
+        return 0
+    data = coll.get(ids=ids, include=["embeddings", "documents", "metadatas"]) if ids is not None \
+        else coll.get(include=["embeddings", "documents", "metadatas"])
+    got_ids = [str(i) for i in data.get("ids") or []]
+    if ids is None:
+        vector_index.reset(collection)
+    if got_ids:
+        vector_index.upsert(
+            collection,
+            got_ids,
+            np.asarray(data.get("embeddings"), dtype=np.float32),
+            list(data.get("documents") or [""] * len(got_ids)),
+            list(data.get("metadatas") or [{}] * len(got_ids)),
+        )
+    return len(got_ids)
+
+
+def vectors_snapshot_collections(data_dir: str | Path | None = None) -> list[str]:
+    base = Path(data_dir) if data_dir is not None else _data_dir()
+    folder = base / "vectors"
+    if not folder.is_dir():
+        return []
+    return sorted(p.stem for p in folder.glob("*.npz"))
+
+
+def vectors_try_save(collection: str, data_dir: str | Path | None = None):
+    path = _vectors_state_path(collection, data_dir)
+    index = vector_index.get_index(collection)
+    if index is None:
+        return
+    try:
+        atomic_write_bytes(path, encode_vectors(index))
+    except Exception:
+        log.warning("Vector index save failed", exc_info=True)
+
+
+def vectors_try_delete(collection: str, data_dir: str | Path | None = None):
+    path = _vectors_state_path(collection, data_dir)
+    try:
+        path.unlink(missing_ok=True)
+    except Exception:
+        log.warning("Vector snapshot delete failed", exc_info=True)
@@ -0,0 +1,25 @@
+"""
+Версия состояния поисковых данных процесса.
+
+Монотонный счётчик: увеличивается при каждом изменении, от которого
+зависит выдача поиска (upsert_documents, clear_collection, перестроение
+графа). Входит в ключ кэша результатов поиска — после изменения старые
+записи перестают совпадать и вытесняются по LRU/TTL.
+"""
+from __future__ import annotations
+
+import threading
+
+_LOCK = threading.Lock()
+_VERSION = 0
+
+
+def index_version() -> int:
+    return _VERSION
+
+
+def bump_index_version() -> int:
+    global _VERSION
+    with _LOCK:
+        _VERSION += 1
+        return _VERSION
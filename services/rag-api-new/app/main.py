@@ -1,10 +1,15 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.deps import settings
+from app.rag.scoring_pool import shutdown_scoring_pools
 from app.routers import admin, chat, ingest, ingest_batch
+from app.warmup import get_warmup_state, warm_start
 
 logging.basicConfig(
     level=getattr(logging, settings().log_level.upper(), logging.INFO),
@@ -12,7 +17,17 @@ logging.basicConfig(
 )
 
 
-app = FastAPI(title="RAG API (new)", docs_url="/api/swagger")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Индексы грузятся в фоне: /healthz отвечает сразу, /readyz — после загрузки
+    warmup = asyncio.create_task(asyncio.to_thread(warm_start))
+    yield
+    if not warmup.done():
+        warmup.cancel()
+    shutdown_scoring_pools()
+
+
+app = FastAPI(title="RAG API (new)", docs_url="/api/swagger", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +51,12 @@ def healthz():
     }
 
 
+@app.get("/readyz")
+def readyz():
+    state = get_warmup_state()
+    return JSONResponse(status_code=200 if state.ready else 503, content=state.to_dict())
+
+
 @app.get("/meta")
 def meta():
     s = settings()
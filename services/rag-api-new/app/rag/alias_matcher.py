@@ -0,0 +1,158 @@
+"""
+AliasMatcher - поиск алиасов EntityRegistry в тексте без перебора алиасов.
+
+Компилируется из алиасов реестра (в порядке словаря alias -> entity) и
+отвечает на частичные совпадения по правилам EntityRegistry.find_entity:
+алиас и ключ не короче MIN_PARTIAL, алиас — подстрока ключа или ключ —
+подстрока алиаса; из подходящих берётся первый алиас в порядке реестра
+(наименьший ранг).
+
+- "алиас в ключе" — автомат Ахо-Корасик по алиасам: все вхождения за один
+  проход по тексту;
+- "ключ в алиасе" — триграммный индекс алиасов: кандидаты из самого
+  короткого постинга триграмм ключа, проверка подстрокой.
+
+scan() прогоняет автомат один раз по токенам вопроса и даёт ответы сразу
+для всех слов и биграмм (extract_entities). Если ни точного, ни частичного
+совпадения нет, fuzzy() ищет алиас с опечатками (rag/fuzzy.py).
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+from .fuzzy import FuzzyIndex
+
+MIN_PARTIAL = 3
+
+_NO_MATCH = 1 << 62
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class AliasMatcher:
+    """Автомат Ахо-Корасик и триграммный индекс по алиасам (ранг = позиция в aliases)."""
+
+    def __init__(self, aliases: Sequence[str]) -> None:
+        self.aliases: List[str] = list(aliases)
+        # бор: переходы, суффиксные ссылки, (длина, ранг) алиаса в узле
+        # и ссылка на ближайший по суффиксным ссылкам узел с алиасом
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._term: List[Tuple[int, int] | None] = [None]
+        self._dict: List[int] = [0]
+        # триграмма -> ранги алиасов (по возрастанию)
+        self._grams: Dict[str, List[int]] = {}
+
+        for rank, alias in enumerate(self.aliases):
+            if len(alias) < MIN_PARTIAL:
+                continue
+            self._insert(alias, rank)
+            for gram in _trigrams(alias):
+                self._grams.setdefault(gram, []).append(rank)
+        self._link()
+        self._fuzzy = FuzzyIndex(self.aliases)
+
+    def _insert(self, alias: str, rank: int) -> None:
+        state = 0
+        for ch in alias:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._term.append(None)
+                self._dict.append(0)
+            state = nxt
+        self._term[state] = (len(alias), rank)
+
+    def _link(self) -> None:
+        """Суффиксные и словарные ссылки (обход бора в ширину)."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = fail
+                self._dict[nxt] = fail if self._term[fail] is not None else self._dict[fail]
+                queue.append(nxt)
+
+    def _occurrences(self, text: str):
+        """(позиция последнего символа, длина, ранг) всех вхождений алиасов в text."""
+        goto, fail, term, dict_link = self._goto, self._fail, self._term, self._dict
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            out = state if term[state] is not None else dict_link[state]
+            while out:
+                length, rank = term[out]
+                yield pos, length, rank
+                out = dict_link[out]
+
+    def _containing(self, key: str) -> int:
+        """Наименьший ранг алиаса, содержащего key."""
+        postings = []
+        for gram in _trigrams(key):
+            posting = self._grams.get(gram)
+            if posting is None:
+                return _NO_MATCH
+            postings.append(posting)
+        for rank in min(postings, key=len):
+            if key in self.aliases[rank]:
+                return rank
+        return _NO_MATCH
+
+    def partial(self, key: str) -> int | None:
+        """Ранг алиаса для частичного совпадения с key (как цикл find_entity) или None."""
+        if len(key) < MIN_PARTIAL:
+            return None
+        rank = min((r for _pos, _len, r in self._occurrences(key)), default=_NO_MATCH)
+        rank = min(rank, self._containing(key))
+        return rank if rank != _NO_MATCH else None
+
+    def scan(self, words: Sequence[str]) -> Tuple[List[int | None], List[int | None]]:
+        """
+        Частичные совпадения для каждого слова и каждой биграммы "w[i] w[i+1]".
+
+        Returns:
+            (ранги по словам, ранги по биграммам) — как partial() для каждого ключа
+        """
+        text = " ".join(words)
+        word_at: List[int] = []
+        for i, word in enumerate(words):
+            word_at.extend([i] * len(word))
+            word_at.append(-1)
+
+        inside = [_NO_MATCH] * len(words)          # вхождения внутри слова i
+        across = [_NO_MATCH] * max(len(words) - 1, 0)  # через пробел между i и i+1
+        for pos, length, rank in self._occurrences(text):
+            first, last = word_at[pos + 1 - length], word_at[pos]
+            if first < 0 or last < 0:
+                continue
+            if first == last:
+                inside[first] = min(inside[first], rank)
+            elif last == first + 1:
+                across[first] = min(across[first], rank)
+
+        def _rank(key: str, contained: int) -> int | None:
+            if len(key) < MIN_PARTIAL:
+                return None
+            rank = min(contained, self._containing(key))
+            return rank if rank != _NO_MATCH else None
+
+        word_ranks = [_rank(word, inside[i]) for i, word in enumerate(words)]
+        bigram_ranks = [
+            _rank(f"{words[i]} {words[i + 1]}", min(inside[i], inside[i + 1], across[i]))
+            for i in range(len(words) - 1)
+        ]
+        return word_ranks, bigram_ranks
+
+    def fuzzy(self, key: str) -> Tuple[int, int] | None:
+        """(ранг, расстояние) ближайшего алиаса с опечатками/транслитерацией или None."""
+        return self._fuzzy.lookup(key)
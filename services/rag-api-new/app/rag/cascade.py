@@ -0,0 +1,113 @@
+"""
+Cascade reranking - дешёвый первый этап перед cross-encoder.
+
+Первый этап ранжирует всех кандидатов HybridRetriever по уже посчитанным
+признакам: RRF-скор, BM25-скор, ранг в dense-выдаче (или в выдаче
+expand_by_project) и вес типа документа (evidence._type_weight). В
+cross-encoder уходит только shortlist; опционально shortlist обрезается
+раньше на большом разрыве скоров первого этапа.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Mapping
+
+from .evidence import _type_weight
+from .rank import rerank
+from .types import Doc, ReRanker, ScoredDoc
+from .utils import doc_id_of
+
+RRF_K = 60
+W_RRF = 1.0
+W_BM25 = 0.5
+W_DENSE = 0.5
+EXPANDED_PENALTY = 0.8
+
+
+def first_stage_score(doc: Doc, features: Mapping[str, float] | None) -> float:
+    """
+    Скор первого этапа: нормированный RRF + BM25 + обратный ранг dense, умноженные на вес типа.
+
+    RRF нормирован к 1 для документа, первого в обоих списках. Для документов из
+    expand_by_project используется ранг в расширяющем поиске со штрафом, как в rank.adjust_score.
+    """
+    f = features or {}
+    md = doc.metadata or {}
+    score = W_RRF * f.get("rrf", 0.0) * (RRF_K + 1) / 2
+    score += W_BM25 * f.get("bm25_norm", 0.0)
+    if "dense_rank" in f:
+        score += W_DENSE * (RRF_K + 1) / (RRF_K + 1 + f["dense_rank"])
+    elif "expand_rank" in f:
+        score += W_DENSE * (RRF_K + 1) / (RRF_K + 1 + f["expand_rank"])
+    if md.get("expanded"):
+        score *= EXPANDED_PENALTY
+    return score * _type_weight(md)
+
+
+def shortlist(
+    docs: List[Doc],
+    features: Mapping[str, Mapping[str, float]],
+    size: int,
+    min_size: int = 0,
+    gap_ratio: float = 0.0,
+) -> List[Doc]:
+    """
+    Top-size кандидатов по скору первого этапа.
+
+    gap_ratio > 0 включает адаптивную отсечку: после min_size документов
+    список обрывается на первом скоре, меньшем gap_ratio * предыдущий.
+    """
+    scored = sorted(
+        ((first_stage_score(d, features.get(doc_id_of(d) or "")), i, d) for i, d in enumerate(docs)),
+        key=lambda x: (-x[0], x[1]),
+    )
+    out: List[Doc] = []
+    prev: float | None = None
+    for score, _, d in scored[: max(size, min_size)]:
+        if gap_ratio > 0 and prev is not None and len(out) >= min_size and prev > 0 and score < gap_ratio * prev:
+            break
+        out.append(d)
+        prev = score
+    return out
+
+
+def cascade_rerank(
+    rr: ReRanker,
+    question: str,
+    docs: List[Doc],
+    features: Mapping[str, Mapping[str, float]],
+    size: int,
+    min_size: int = 0,
+    gap_ratio: float = 0.0,
+) -> List[ScoredDoc]:
+    """Cross-encoder только по shortlist первого этапа."""
+    if len(docs) <= max(size, min_size) and gap_ratio <= 0:
+        return rerank(rr, question, docs)
+    return rerank(rr, question, shortlist(docs, features, size, min_size=min_size, gap_ratio=gap_ratio))
+
+
+def recall_at_k(reference: List[ScoredDoc], got: List[ScoredDoc], k: int) -> float:
+    """Доля top-k полного реранка, попавшая в top-k каскада."""
+    ref = {id(sd.doc) for sd in reference[:k]}
+    if not ref:
+        return 1.0
+    return len(ref & {id(sd.doc) for sd in got[:k]}) / len(ref)
+
+
+def feature_map(
+    dense_ids: List[str],
+    bm25_hits: List[tuple[str, float]],
+    rrf: Dict[str, float],
+    expanded_ids: List[str] | None = None,
+) -> Dict[str, Dict[str, float]]:
+    """Признаки первого этапа по doc_id из результатов legs HybridRetriever."""
+    out: Dict[str, Dict[str, float]] = {}
+    for did, score in rrf.items():
+        out.setdefault(did, {})["rrf"] = score
+    top_bm = max((s for _, s in bm25_hits), default=0.0)
+    for did, s in bm25_hits:
+        out.setdefault(did, {})["bm25_norm"] = s / top_bm if top_bm > 0 else 0.0
+    for rank, did in enumerate(dense_ids):
+        out.setdefault(did, {}).setdefault("dense_rank", float(rank))
+    for rank, did in enumerate(expanded_ids or []):
+        out.setdefault(did, {}).setdefault("expand_rank", float(rank))
+    return out
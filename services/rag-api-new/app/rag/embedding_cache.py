@@ -0,0 +1,46 @@
+"""
+Кэш эмбеддингов запросов перед deps.embeddings().
+
+Один вопрос эмбеддится несколько раз за запрос (dense-поиск, расширение
+по проектам, self-check critic) и повторяется между запросами. Ключ —
+(модель, нормализованный текст); эмбеддинги документов при инжесте не кэшируются.
+"""
+from __future__ import annotations
+
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from ..utils.cache import TTLCache, register_cache_stats
+from .nlp import normalize_query
+
+
+class CachedEmbeddings(Embeddings):
+    """Обёртка над Embeddings с LRU+TTL кэшем embed_query."""
+
+    def __init__(self, base: Embeddings, model: str, maxsize: int = 1024, ttl_s: float | None = 3600.0):
+        self.base = base
+        self.model = model
+        self.cache: TTLCache[List[float]] = TTLCache(maxsize=maxsize, ttl_s=ttl_s)
+        register_cache_stats("embeddings", self.cache.stats)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        normalized = normalize_query(text)
+        key = (self.model, normalized)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.base.embed_query(normalized)
+            self.cache.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        normalized = normalize_query(text)
+        key = (self.model, normalized)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = await self.base.aembed_query(normalized)
+            self.cache.set(key, vector)
+        return vector
@@ -3,12 +3,16 @@ EntityRegistry - реестр сущностей портфолио.
 
 Обеспечивает маппинг алиасов (названий) на канонические slug'и.
 Используется для извлечения сущностей из вопросов пользователя.
+Частичные и нечёткие совпадения ищутся скомпилированным AliasMatcher
+(rag/alias_matcher.py), а не перебором алиасов.
 """
 from __future__ import annotations
 
 import re
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
 
+from .alias_matcher import AliasMatcher
+from .fuzzy import fuzzy_confidence
 from .search_types import Entity, EntityType
 
 
@@ -27,6 +31,20 @@ class EntityRegistry:
         self._aliases: Dict[str, Tuple[EntityType, str, str]] = {}
         # type -> list of slugs
         self._by_type: Dict[EntityType, List[str]] = {t: [] for t in EntityType}
+        # alias -> все регистрации, претендующие на него (в порядке регистрации);
+        # при unregister алиас переходит к предыдущей
+        self._claims: Dict[str, List[Tuple[EntityType, str, str]]] = {}
+        # автомат по алиасам; собирается заново после изменения алиасов
+        self._matcher: AliasMatcher | None = None
+
+    @staticmethod
+    def _alias_keys(slug: str, name: str, aliases: List[str] | None) -> List[str]:
+        keys = [slug.lower()]
+        for alias in [name] + list(aliases or []):
+            key = alias.lower().strip()
+            if key:
+                keys.append(key)
+        return keys
 
     def register(
         self,
@@ -46,29 +64,145 @@ class EntityRegistry:
         """
         canonical = (entity_type, slug, name)
 
-        # Регистрация по slug
-        self._aliases[slug.lower()] = canonical
-
-        # Регистрация по имени
-        name_key = name.lower().strip()
-        if name_key:
-            self._aliases[name_key] = canonical
-
-        # Регистрация дополнительных алиасов
-        for alias in aliases or []:
-            alias_key = alias.lower().strip()
-            if alias_key:
-                self._aliases[alias_key] = canonical
+        # slug, имя и дополнительные алиасы
+        for key in self._alias_keys(slug, name, aliases):
+            self._aliases[key] = canonical
+            self._claims.setdefault(key, []).append(canonical)
+        self._matcher = None
 
         # Отслеживание по типу
         if slug not in self._by_type[entity_type]:
             self._by_type[entity_type].append(slug)
 
+    def _drop_claims(self, canonical: Tuple[EntityType, str, str], keys: List[str]) -> Dict[str, int]:
+        """Снять претензии canonical на keys; вернуть позиции снятых (по ключу — первую)."""
+        positions: Dict[str, int] = {}
+        for key in keys:
+            claims = self._claims.get(key)
+            if not claims or canonical not in claims:
+                continue
+            pos = len(claims) - 1 - claims[::-1].index(canonical)
+            del claims[pos]
+            positions[key] = min(pos, positions.get(key, pos))
+        return positions
+
+    def _resolve(self, keys: List[str]) -> None:
+        """Алиас принадлежит последней зарегистрированной претендующей сущности."""
+        for key in keys:
+            claims = self._claims.get(key)
+            if claims:
+                self._aliases[key] = claims[-1]
+            else:
+                self._claims.pop(key, None)
+                self._aliases.pop(key, None)
+        self._matcher = None
+
+    def _drop_slug_if_unclaimed(self, entity_type: EntityType, slug: str) -> None:
+        claims = self._claims.get(slug.lower(), [])
+        if not any(c[0] == entity_type and c[1] == slug for c in claims) and slug in self._by_type[entity_type]:
+            self._by_type[entity_type].remove(slug)
+
+    def unregister(
+        self,
+        entity_type: EntityType,
+        slug: str,
+        name: str,
+        aliases: List[str] | None = None,
+    ) -> None:
+        """Отменить register с теми же аргументами (инкрементальное обновление графа)."""
+        keys = self._alias_keys(slug, name, aliases)
+        self._drop_claims((entity_type, slug, name), keys)
+        self._resolve(keys)
+        self._drop_slug_if_unclaimed(entity_type, slug)
+
+    def replace(
+        self,
+        old: Tuple[EntityType, str, str, List[str]],
+        new: Tuple[EntityType, str, str, List[str]],
+    ) -> None:
+        """
+        Заменить регистрацию old на new на её месте среди претендентов на общие
+        алиасы — как если бы new была зарегистрирована вместо old.
+        """
+        old_type, old_slug, old_name, old_aliases = old
+        new_type, new_slug, new_name, new_aliases = new
+        old_keys = self._alias_keys(old_slug, old_name, old_aliases)
+        new_keys = self._alias_keys(new_slug, new_name, new_aliases)
+        positions = self._drop_claims((old_type, old_slug, old_name), old_keys)
+
+        canonical = (new_type, new_slug, new_name)
+        for key in new_keys:
+            claims = self._claims.setdefault(key, [])
+            pos = positions.get(key)
+            if pos is None:
+                claims.append(canonical)
+            else:
+                claims.insert(pos, canonical)
+                positions[key] = pos + 1
+        self._resolve(old_keys + new_keys)
+
+        slugs = self._by_type[new_type]
+        if new_slug not in slugs:
+            if new_type == old_type and old_slug in slugs:
+                slugs.insert(slugs.index(old_slug), new_slug)
+            else:
+                slugs.append(new_slug)
+        self._drop_slug_if_unclaimed(old_type, old_slug)
+
+    def reorder(self, registrations: Sequence[Tuple[EntityType, str, str, List[str]]]) -> None:
+        """
+        Упорядочить алиасы, претендентов и slug'и по registrations — как если
+        бы они были зарегистрированы в этом порядке (инкрементальное
+        обновление графа).
+        """
+        rank: Dict[Tuple[EntityType, str, str], int] = {}
+        slug_rank: Dict[Tuple[EntityType, str], int] = {}
+        key_rank: Dict[str, Tuple[int, int]] = {}
+        for pos, (entity_type, slug, name, aliases) in enumerate(registrations):
+            rank.setdefault((entity_type, slug, name), pos)
+            slug_rank.setdefault((entity_type, slug), pos)
+            for i, key in enumerate(self._alias_keys(slug, name, aliases)):
+                key_rank.setdefault(key, (pos, i))
+        last = len(registrations)
+
+        for claims in self._claims.values():
+            claims.sort(key=lambda c: rank.get(c, last))
+        ordered = sorted(self._claims, key=lambda k: key_rank.get(k, (last, 0)))
+        self._aliases = {key: self._claims[key][-1] for key in ordered}
+        for entity_type, slugs in self._by_type.items():
+            slugs.sort(key=lambda slug: slug_rank.get((entity_type, slug), last))
+        self._matcher = None
+
+    def alias_matcher(self) -> AliasMatcher:
+        """Автомат по текущим алиасам (компилируется при первом обращении после изменений)."""
+        matcher = self._matcher
+        if matcher is None:
+            matcher = self._matcher = AliasMatcher(list(self._aliases))
+        return matcher
+
+    def _entity(self, key: str, rank: int | None) -> Entity | None:
+        if key in self._aliases:
+            etype, slug, name = self._aliases[key]
+            return Entity(type=etype, slug=slug, name=name, confidence=1.0)
+        matcher = self.alias_matcher()
+        confidence = 0.7
+        if rank is None:
+            hit = matcher.fuzzy(key)
+            if hit is None:
+                return None
+            rank, distance = hit
+            confidence = fuzzy_confidence(distance, len(key))
+        etype, slug, name = self._aliases[matcher.aliases[rank]]
+        return Entity(type=etype, slug=slug, name=name, confidence=confidence)
+
     def find_entity(self, text: str) -> Entity | None:
         """
         Найти сущность по тексту.
 
-        Сначала ищет точное совпадение, затем частичное.
+        Сначала ищет точное совпадение, затем частичное: алиас содержит
+        ключ или ключ содержит алиас (оба не короче 3 символов), первый
+        такой алиас в порядке реестра; затем нечёткое — опечатки и
+        транслитерация (rag/fuzzy.py, confidence < 0.7 и убывает с числом правок).
 
         Args:
             text: Текст для поиска (название, slug, алиас)
@@ -79,27 +213,16 @@ class EntityRegistry:
         key = text.lower().strip()
         if not key:
             return None
-
-        # Точное совпадение
         if key in self._aliases:
-            etype, slug, name = self._aliases[key]
-            return Entity(type=etype, slug=slug, name=name, confidence=1.0)
-
-        # Частичное совпадение (alias содержит key или key содержит alias)
-        for alias, (etype, slug, name) in self._aliases.items():
-            # Пропускаем слишком короткие алиасы для частичного поиска
-            if len(alias) < 3 or len(key) < 3:
-                continue
-            if key in alias or alias in key:
-                return Entity(type=etype, slug=slug, name=name, confidence=0.7)
-
-        return None
+            return self._entity(key, None)
+        return self._entity(key, self.alias_matcher().partial(key))
 
     def extract_entities(self, question: str) -> List[Entity]:
         """
         Извлечь все упомянутые сущности из вопроса.
 
-        Токенизирует вопрос и проверяет каждое слово/фразу.
+        Токенизирует вопрос и проверяет каждое слово и биграмму по правилам
+        find_entity; вхождения алиасов ищутся одним проходом автомата.
 
         Args:
             question: Вопрос пользователя
@@ -113,25 +236,34 @@ class EntityRegistry:
         # Извлекаем слова и n-граммы
         words = re.findall(r"[a-zA-Zа-яА-ЯёЁ0-9\-\.]+", question.lower())
 
+        word_ranks, bigram_ranks = self.alias_matcher().scan(words)
+
         # Проверяем отдельные слова
-        for word in words:
+        for word, rank in zip(words, word_ranks):
             if len(word) < 2:
                 continue
-            entity = self.find_entity(word)
+            entity = self._entity(word, rank)
             if entity and entity.slug not in seen_slugs:
                 found.append(entity)
                 seen_slugs.add(entity.slug)
 
         # Проверяем биграммы (два соседних слова)
-        for i in range(len(words) - 1):
-            bigram = f"{words[i]} {words[i + 1]}"
-            entity = self.find_entity(bigram)
+        for i, rank in enumerate(bigram_ranks):
+            entity = self._entity(f"{words[i]} {words[i + 1]}", rank)
             if entity and entity.slug not in seen_slugs:
                 found.append(entity)
                 seen_slugs.add(entity.slug)
 
         return found
 
+    def match_tokens(self) -> set[str]:
+        """Lowercase slug и name всех сущностей — токены для EntityIndex."""
+        tokens: set[str] = set()
+        for _etype, slug, name in self._aliases.values():
+            tokens.add(slug.lower())
+            tokens.add(name.lower())
+        return tokens
+
     def list_by_type(self, entity_type: EntityType) -> List[str]:
         """Получить список slug'ов по типу сущности."""
         return list(self._by_type.get(entity_type, []))
@@ -140,27 +272,54 @@ class EntityRegistry:
         """Очистить реестр."""
         self._aliases.clear()
         self._by_type = {t: [] for t in EntityType}
+        self._claims.clear()
+        self._matcher = None
+
+    def copy(self) -> "EntityRegistry":
+        """Копия для инкрементального обновления (опубликованный реестр не меняется)."""
+        registry = EntityRegistry()
+        registry._aliases = dict(self._aliases)
+        registry._by_type = {t: list(slugs) for t, slugs in self._by_type.items()}
+        registry._claims = {key: list(claims) for key, claims in self._claims.items()}
+        registry._matcher = self._matcher
+        return registry
 
     def stats(self) -> Dict[str, int]:
         """Статистика по типам сущностей."""
         return {t.value: len(slugs) for t, slugs in self._by_type.items()}
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "aliases": [[alias, etype.value, slug, name] for alias, (etype, slug, name) in self._aliases.items()],
+            "by_type": {t.value: slugs for t, slugs in self._by_type.items()},
+        }
 
-# === Global singleton ===
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "EntityRegistry":
+        registry = cls()
+        registry._aliases = {alias: (EntityType(etype), slug, name) for alias, etype, slug, name in data["aliases"]}
+        registry._claims = {alias: [canonical] for alias, canonical in registry._aliases.items()}
+        for etype, slugs in data["by_type"].items():
+            registry._by_type[EntityType(etype)] = list(slugs)
+        return registry
 
-_REGISTRY: EntityRegistry | None = None
+
+# === Global singleton ===
+# Реестр публикуется вместе с графом (graph/store.py:GraphSnapshot).
 
 
 def get_entity_registry() -> EntityRegistry:
-    """Получить глобальный реестр сущностей."""
-    global _REGISTRY
-    if _REGISTRY is None:
-        _REGISTRY = EntityRegistry()
-    return _REGISTRY
+    """Получить реестр сущностей (из текущего снимка графа)."""
+    from ..graph.store import current_graph
+
+    return current_graph().registry
 
 
 def reset_entity_registry() -> EntityRegistry:
-    """Сбросить и вернуть новый реестр."""
-    global _REGISTRY
-    _REGISTRY = EntityRegistry()
-    return _REGISTRY
+    """Опубликовать и вернуть новый пустой реестр (граф сохраняется)."""
+    from ..graph.store import current_graph, publish_graph
+
+    registry = EntityRegistry()
+    current = current_graph()
+    publish_graph(current.store, registry, current.views)
+    return registry
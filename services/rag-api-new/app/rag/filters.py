@@ -0,0 +1,114 @@
+"""
+Компилятор фильтров планировщика (tech_category, company/project, tags_any).
+
+compile_filters превращает словарь filters в CompiledFilters:
+- where — выражение для dense-поиска (Chroma / LocalVectorStore) там, где
+  семантика точная: tech_category сводится к $in по значениям type и
+  category, известным MetadataIndex;
+- candidate_ids — допустимые doc_id для BM25 по MetadataIndex (для всех
+  фильтров, включая подстрочные company/project);
+- matches — построчная проверка с прежней семантикой; применяется к
+  итоговым кандидатам (документы расширения по проектам, fetch по id).
+
+Индекс используется, только если он согласован с BM25 (то же число
+документов); иначе остаётся только построчная проверка.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Set, Tuple
+
+from ..indexing import bm25, metadata_index
+from ..indexing.metadata_index import FIELDS, MetadataIndex
+
+Clause = Tuple[str, Callable[[Any], bool]]
+
+
+@dataclass
+class CompiledFilters:
+    clauses: List[Clause] = field(default_factory=list)
+    where: Dict[str, Any] | None = None
+    candidate_ids: Set[str] | None = None
+
+    def matches(self, metadata: Mapping[str, Any] | None) -> bool:
+        md = metadata or {}
+        return all(pred(FIELDS[name](md)) for name, pred in self.clauses)
+
+
+def _substring_either_way(wanted: str) -> Callable[[Any], bool]:
+    return lambda v: wanted in v or v in wanted
+
+
+def _clauses(filters: Mapping[str, Any]) -> List[Clause]:
+    clauses: List[Clause] = []
+    tech_category = filters.get("tech_category")
+    if tech_category:
+        tc = str(tech_category).lower()
+        clauses.append(("tech_category", lambda v: v is None or v == tc))
+    company = filters.get("company_slug") or filters.get("company_id")
+    if company:
+        clauses.append(("company", _substring_either_way(str(company).lower())))
+    project = filters.get("project_slug") or filters.get("project_id")
+    if project:
+        clauses.append(("project", _substring_either_way(str(project).lower())))
+    tags_any = filters.get("tags_any", [])
+    if tags_any:
+        wanted = {str(t).lower() for t in tags_any}
+        # документы без тегов не отсекаются
+        clauses.append(("tags", lambda v: not v or not wanted.isdisjoint(v)))
+    return clauses
+
+
+def _usable_index(collection: str | None) -> MetadataIndex | None:
+    if not collection:
+        return None
+    index = metadata_index.get_index(collection)
+    lexical = bm25.get_index(collection)
+    if index is None or not len(index) or lexical is None or len(lexical) != len(index):
+        return None
+    return index
+
+
+def _tech_category_where(index: MetadataIndex, tech_category: str) -> Dict[str, Any] | None:
+    """type != technology OR category == tech_category, выраженное через $in."""
+    types = index.values("type")
+    if None in types:
+        # у части документов нет type — в Chroma это не выразить без $exists
+        return None
+    branches: List[Dict[str, Any]] = []
+    other_types = [t for t in types if t != "technology"]
+    if other_types:
+        branches.append({"type": {"$in": other_types}})
+    categories = [c for c in index.values("category") if c is not None and str(c).lower() == tech_category]
+    if categories:
+        branches.append({"category": {"$in": categories}})
+    if not branches:
+        return None
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def and_where(*parts: Dict[str, Any] | None) -> Dict[str, Any] | None:
+    """Объединить where-выражения через $and (пустые пропускаются)."""
+    present = [p for p in parts if p]
+    if not present:
+        return None
+    return present[0] if len(present) == 1 else {"$and": present}
+
+
+def compile_filters(filters: Mapping[str, Any] | None, collection: str | None = None) -> CompiledFilters:
+    """Скомпилировать filters для коллекции (см. docstring модуля)."""
+    compiled = CompiledFilters(clauses=_clauses(filters or {}))
+    index = _usable_index(collection) if compiled.clauses else None
+    if index is None:
+        return compiled
+
+    candidates: Set[str] | None = None
+    for name, pred in compiled.clauses:
+        ids = index.ids_where(name, pred)
+        candidates = ids if candidates is None else candidates & ids
+    compiled.candidate_ids = candidates
+
+    tech_category = (filters or {}).get("tech_category")
+    if tech_category:
+        compiled.where = _tech_category_where(index, str(tech_category).lower())
+    return compiled
@@ -0,0 +1,167 @@
+"""
+FuzzyIndex - поиск алиасов с опечатками и в кириллической транслитерации.
+
+Алиасы и ключ приводятся fold(): lowercase, кириллица -> латиница так, как
+пишут названия технологий ("постгрес" -> "postgres", "джанго" -> "django").
+Совпадение после fold() — расстояние 0; иначе кандидаты берутся из
+триграммного индекса (строка с границами "^...$", постинги разбиты по первой
+букве) и проверяются расстоянием Дамерау-Левенштейна (OSA: вставка,
+удаление, замена, перестановка соседних символов) с порогом
+max_distance(len(key)).
+
+Правка затрагивает не больше четырёх триграмм, поэтому у алиаса на
+расстоянии d от ключа общих триграмм не меньше len(grams(key)) - 4d —
+остальные кандидаты не проверяются; из прошедших проверяются не больше
+MAX_CANDIDATES с наибольшим числом общих триграмм (задержка не растёт с
+размером реестра). Первая буква должна совпадать: опечатки
+в ней редки, а без этого правила короткие слова вопроса ложно совпадают
+с алиасами.
+
+Транслитерированный ключ часто — начало алиаса ("постгрес" -> "postgres",
+алиас "postgresql"): такой алиас тоже кандидат, расстояние — число
+недописанных символов (не больше max_distance(len(key)) + 1: обрезанное
+название вероятнее опечатки на ту же длину). Кандидаты —
+самый короткий постинг триграмм ключа без конечной "...$", проверка
+startswith().
+"""
+from __future__ import annotations
+
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+# уверенность совпадения после транслитерации; с каждой правкой меньше
+FUZZY_CONFIDENCE = 0.6
+
+# сколько кандидатов (по числу общих триграмм) проверяется расстоянием
+MAX_CANDIDATES = 16
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+
+def fold(text: str) -> str:
+    """Ключ для нечёткого сравнения: lowercase и транслитерация кириллицы."""
+    return text.lower().strip().translate(_TRANSLIT)
+
+
+def max_distance(length: int) -> int:
+    """Допустимое число правок для ключа длины length (-1 — ключ слишком короткий)."""
+    if length < 3:
+        return -1
+    if length < 5:
+        return 0
+    return 1 if length < 9 else 2
+
+
+def fuzzy_confidence(distance: int, length: int) -> float:
+    return round(FUZZY_CONFIDENCE * (1 - distance / max(length, 1)), 2)
+
+
+def _grams(text: str) -> set[str]:
+    padded = f"^{text}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def osa_distance(a: str, b: str, bound: int) -> int:
+    """Расстояние OSA между a и b; bound + 1, если оно больше bound."""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > bound:
+            return bound + 1
+        prev2, prev = prev, cur
+    return min(prev[-1], bound + 1)
+
+
+class FuzzyIndex:
+    """Триграммный индекс fold() алиасов (ранг = позиция в aliases)."""
+
+    def __init__(self, aliases: Sequence[str]) -> None:
+        # уникальные fold(alias) и наименьший ранг алиаса с таким fold
+        self._keys: List[str] = []
+        self._ranks: List[int] = []
+        self._by_key: Dict[str, int] = {}
+        # первая буква + триграмма -> номера ключей
+        self._grams: Dict[str, List[int]] = {}
+
+        for rank, alias in enumerate(aliases):
+            key = fold(alias)
+            if len(key) < 3 or key in self._by_key:
+                continue
+            idx = self._by_key[key] = len(self._keys)
+            self._keys.append(key)
+            self._ranks.append(rank)
+            for gram in _grams(key):
+                self._grams.setdefault(key[0] + gram, []).append(idx)
+
+    def lookup(self, text: str) -> Tuple[int, int] | None:
+        """
+        Ближайший алиас в пределах max_distance (алиас, начинающийся с ключа, — на символ больше).
+
+        Returns:
+            (ранг алиаса, расстояние) — при равном расстоянии первый в порядке
+            реестра; None, если подходящего нет
+        """
+        key = fold(text)
+        bound = max_distance(len(key))
+        if bound < 0:
+            return None
+        idx = self._by_key.get(key)
+        if idx is not None:
+            return self._ranks[idx], 0
+        if bound == 0:
+            return None
+
+        grams = _grams(key)
+        best: Tuple[int, int] | None = self._prefixed(key, grams, bound + 1)
+        if best is not None:
+            bound = min(bound, best[0])
+        need = len(grams) - 4 * bound
+        counts: Counter[int] = Counter()
+        for gram in grams:
+            counts.update(self._grams.get(key[0] + gram, ()))
+
+        # по убыванию общих триграмм; найденное совпадение сужает порог
+        for idx, shared in counts.most_common(MAX_CANDIDATES):
+            if shared < need:
+                break
+            candidate = self._keys[idx]
+            if abs(len(candidate) - len(key)) > bound:
+                continue
+            distance = osa_distance(key, candidate, bound)
+            if distance <= bound and (best is None or (distance, self._ranks[idx]) < best):
+                best = (distance, self._ranks[idx])
+                bound, need = distance, len(grams) - 4 * distance
+        return None if best is None else (best[1], best[0])
+
+    def _prefixed(self, key: str, grams: set[str], limit: int) -> Tuple[int, int] | None:
+        """(недописано символов, ранг) ближайшего алиаса, начинающегося с key."""
+        postings = []
+        for gram in grams:
+            if gram.endswith("$"):
+                continue
+            posting = self._grams.get(key[0] + gram)
+            if posting is None:
+                return None
+            postings.append(posting)
+        best: Tuple[int, int] | None = None
+        for idx in min(postings, key=len):
+            candidate = self._keys[idx]
+            tail = len(candidate) - len(key)
+            if 0 < tail <= limit and candidate.startswith(key):
+                if best is None or (tail, self._ranks[idx]) < best:
+                    best = (tail, self._ranks[idx])
+        return best
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import re
+import unicodedata
 
 _STOP = {
     "и","а","но","или","что","где","когда","как","какой","какая","какие","про",
@@ -9,6 +10,12 @@ _STOP = {
     "не","да","ну","ок","ты","вы","мы","он","она","они","его","ее","их",
 }
 _WORD = re.compile(r"[a-zA-Zа-яА-Я0-9+#\-\.]{2,}")
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(q: str) -> str:
+    """Нормализация вопроса для ключей кэшей: NFC, схлопнутые пробелы."""
+    return _WS.sub(" ", unicodedata.normalize("NFC", q or "")).strip()
 
 
 def keywords(q: str) -> list[str]:
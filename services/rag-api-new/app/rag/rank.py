@@ -14,8 +14,11 @@ def adjust_score(doc: Doc, score: float) -> float:
 def rerank(rr: ReRanker, question: str, docs: list[Doc]) -> list[ScoredDoc]:
     if not docs:
         return []
-    pairs = [[question, d.page_content] for d in docs]
-    scores = rr.predict(pairs)
+    score_docs = getattr(rr, "score_docs", None)
+    if score_docs is not None:
+        scores = score_docs(question, docs)
+    else:
+        scores = rr.predict([[question, d.page_content] for d in docs])
     take = min(len(docs), len(scores))
     scored = [ScoredDoc(docs[i], adjust_score(docs[i], float(scores[i]))) for i in range(take)]
     scored.sort(key=lambda x: x.score, reverse=True)
@@ -0,0 +1,245 @@
+"""
+Бэкенды cross-encoder reranker'а.
+
+- "torch": sentence_transformers.CrossEncoder (fp32), документ обрезается до max_tokens.
+- "onnx-int8": та же модель, экспортированная в ONNX и динамически
+  квантованная в int8 (onnxruntime.quantization). Экспорт выполняется один
+  раз (ensure_int8: под файловой блокировкой, во временную директорию с
+  атомарной заменой) и кэшируется в `<index_data_dir>/models/<model>/`;
+  там же сохраняется отчёт о ранговой корреляции с fp32-моделью. При пуле
+  процессов экспорт делает серверный процесс до запуска воркеров.
+
+Оба бэкенда реализуют протокол ReRanker (predict(pairs) -> scores) и дают
+скоры в одной шкале (sigmoid логита), поэтому пороги min_score не меняются.
+Пары сортируются по длине и считаются батчами близкой длины (меньше паддинга).
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx-int8")
+
+# Пары для оценки корреляции int8 с fp32 при экспорте
+_CALIBRATION_QUERIES = [
+    "Какие проекты с RAG и LangChain?",
+    "Опыт работы с PostgreSQL",
+    "Где использовался FastAPI?",
+    "Расскажи про работу в брокерской компании",
+]
+_CALIBRATION_DOCS = [
+    "AI-Portfolio: RAG ассистент на FastAPI, LangChain и ChromaDB с гибридным поиском.",
+    "ReAct-Agent на LangGraph с памятью и инструментами.",
+    "Торговый терминал для брокера на C# и PostgreSQL, высоконагруженный backend.",
+    "Python — основной язык, FastAPI и asyncio для сервисов.",
+    "PostgreSQL: индексы, репликация, оптимизация запросов.",
+    "ALOR Broker: разработка backend на Python и C#.",
+    "Frontend на Next.js и TypeScript, дизайн-система.",
+    "Docker, docker compose и CI/CD на GitHub Actions.",
+]
+
+
+def length_buckets(lengths: Sequence[int], batch_size: int) -> List[List[int]]:
+    """Индексы, сгруппированные в батчи по возрастанию длины."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def _ranks(values: Sequence[float]) -> List[float]:
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for t in range(i, j + 1):
+            ranks[order[t]] = (i + j) / 2.0
+        i = j + 1
+    return ranks
+
+
+def spearman(a: Sequence[float], b: Sequence[float]) -> float:
+    """Ранговая корреляция Спирмена (с учётом связей)."""
+    if len(a) != len(b) or len(a) < 2:
+        return 1.0
+    ra, rb = _ranks(a), _ranks(b)
+    ma, mb = sum(ra) / len(ra), sum(rb) / len(rb)
+    cov = sum((x - ma) * (y - mb) for x, y in zip(ra, rb))
+    va = math.sqrt(sum((x - ma) ** 2 for x in ra))
+    vb = math.sqrt(sum((y - mb) ** 2 for y in rb))
+    if va == 0 or vb == 0:
+        return 1.0
+    return cov / (va * vb)
+
+
+def _sigmoid(x: float) -> float:
+    return 1.0 / (1.0 + math.exp(-x)) if x >= 0 else math.exp(x) / (1.0 + math.exp(x))
+
+
+class OnnxInt8CrossEncoder:
+    """Cross-encoder на onnxruntime с int8-весами."""
+
+    def __init__(self, model_name: str, cache_dir: str | Path, max_tokens: int = 384, batch_size: int = 32):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("reranker_backend=onnx-int8 requires the 'onnx' extra (onnxruntime)") from e
+
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.dir = ensure_int8(model_name, cache_dir)
+        int8_path = self.dir / "model.int8.onnx"
+        self.tokenizer = AutoTokenizer.from_pretrained(self.dir)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(int8_path), opts, providers=["CPUExecutionProvider"])
+        self._inputs = [i.name for i in self.session.get_inputs()]
+
+    def _encode(self, pairs: List[List[str]]) -> Dict[str, Any]:
+        enc = self.tokenizer(
+            [q for q, _ in pairs],
+            [d for _, d in pairs],
+            truncation="only_second",
+            max_length=self.max_tokens,
+            padding=True,
+            return_tensors="np",
+        )
+        return {name: enc[name].astype("int64") for name in self._inputs if name in enc}
+
+    def predict(self, pairs: List[List[str]], **_: Any) -> List[float]:
+        if not pairs:
+            return []
+        lengths = [len(q) + len(d) for q, d in pairs]
+        scores = [0.0] * len(pairs)
+        for batch in length_buckets(lengths, self.batch_size):
+            logits = self.session.run(None, self._encode([pairs[i] for i in batch]))[0]
+            for i, row in zip(batch, logits):
+                scores[i] = _sigmoid(float(row[0]))
+        return scores
+
+
+def int8_dir(model_name: str, cache_dir: str | Path) -> Path:
+    return Path(cache_dir) / model_name.replace("/", "__")
+
+
+def _complete(model_dir: Path) -> bool:
+    # report.json пишется последним, директория появляется целиком (os.replace)
+    return (model_dir / "model.int8.onnx").exists() and (model_dir / "report.json").exists()
+
+
+def ensure_int8(model_name: str, cache_dir: str | Path) -> Path:
+    """
+    Директория с int8-моделью; экспортирует её, если готовой ещё нет.
+
+    Процессы (воркеры пула, реплики сервера) экспортируют по очереди под
+    fcntl-блокировкой; экспорт идёт во временную директорию, которая
+    атомарно заменяет целевую, — незавершённый экспорт не виден.
+    """
+    model_dir = int8_dir(model_name, cache_dir)
+    if _complete(model_dir):
+        return model_dir
+    model_dir.parent.mkdir(parents=True, exist_ok=True)
+    with open(model_dir.parent / f".{model_dir.name}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _complete(model_dir):
+            return model_dir
+        tmp = Path(tempfile.mkdtemp(prefix=f".{model_dir.name}.", dir=model_dir.parent))
+        try:
+            export_int8(model_name, tmp)
+            # остатки прерванного экспорта прежних версий
+            shutil.rmtree(model_dir, ignore_errors=True)
+            os.replace(tmp, model_dir)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+    return model_dir
+
+
+def export_int8(model_name: str, out_dir: str | Path) -> Dict[str, Any]:
+    """
+    Экспорт HF-модели в ONNX, динамическая int8-квантизация и отчёт о корреляции с fp32.
+
+    Returns:
+        Отчёт (он же пишется в report.json): spearman по калибровочным запросам.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(out)
+
+    dummy = tokenizer(["q"], ["d"], return_tensors="pt")
+    names = list(dummy.keys())
+
+    class _Logits(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *args):
+            return self.inner(**dict(zip(names, args))).logits
+
+    fp32_path = out / "model.fp32.onnx"
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["logits"] = {0: "batch"}
+    torch.onnx.export(
+        _Logits(model),
+        tuple(dummy[n] for n in names),
+        str(fp32_path),
+        input_names=names,
+        output_names=["logits"],
+        dynamic_axes=axes,
+        opset_version=17,
+        # TorchScript-экспортёр: dynamo-экспортёр (по умолчанию в torch>=2.9) требует onnxscript
+        dynamo=False,
+    )
+    int8_path = out / "model.int8.onnx"
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    fp32_path.unlink(missing_ok=True)
+
+    # корреляция int8 с fp32 на калибровочных парах
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(str(int8_path), providers=["CPUExecutionProvider"])
+    correlations = []
+    for q in _CALIBRATION_QUERIES:
+        enc = tokenizer([q] * len(_CALIBRATION_DOCS), _CALIBRATION_DOCS, padding=True, return_tensors="pt")
+        with torch.no_grad():
+            ref = model(**enc).logits[:, 0].tolist()
+        got = session.run(None, {n: enc[n].numpy() for n in names})[0][:, 0].tolist()
+        correlations.append(spearman(ref, got))
+    report = {
+        "model": model_name,
+        "spearman_mean": sum(correlations) / len(correlations),
+        "spearman_min": min(correlations),
+    }
+    (out / "report.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    logger.info("Reranker %s exported to int8 ONNX: %s", model_name, report)
+    return report
+
+
+def load_reranker_backend(backend: str, model_name: str, max_tokens: int, cache_dir: str | Path, device: str = "cpu"):
+    """Создать cross-encoder выбранного бэкенда."""
+    if backend == "onnx-int8":
+        return OnnxInt8CrossEncoder(model_name, cache_dir=cache_dir, max_tokens=max_tokens)
+    if backend != "torch":
+        raise ValueError(f"Unknown reranker backend {backend!r}; expected one of {BACKENDS}")
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(model_name, device=device, max_length=max_tokens, trust_remote_code=True)
@@ -0,0 +1,154 @@
+"""
+Micro-batching для cross-encoder между конкурентными запросами.
+
+Вызовы predict из разных потоков складываются в очередь; выделенный
+worker забирает всё, что уже ждёт в очереди, сортирует пары по длине,
+чтобы соседние мини-батчи CrossEncoder паддились минимально, выполняет
+один predict и раздаёт результаты по future вызывающих.
+
+Окно (window_ms или max_pairs пар) открывается только при конкуренции —
+когда кроме первого вызова в очереди уже кто-то есть. Одиночный вызов
+уходит в predict сразу и не платит за ожидание.
+"""
+from __future__ import annotations
+
+import collections
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Tuple
+
+from ..utils.cache import register_cache_stats
+from .types import ReRanker
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatchReranker:
+    """ReRanker-обёртка: объединяет пары конкурентных вызовов в один батч."""
+
+    def __init__(self, base: ReRanker, window_ms: float = 5.0, max_pairs: int = 128, history: int = 1024):
+        self.base = base
+        self.window_s = window_ms / 1000.0
+        self.max_pairs = max_pairs
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._batches = 0
+        self._immediate = 0
+        self._pairs = 0
+        self._batch_sizes: Deque[int] = collections.deque(maxlen=history)
+        self._waits_ms: Deque[float] = collections.deque(maxlen=history)
+        register_cache_stats("reranker_batcher", self.stats)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                self._worker.start()
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        if not pairs:
+            return []
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((list(pairs), fut, time.perf_counter()))
+        return fut.result()
+
+    def close(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(_STOP)
+            self._worker.join()
+
+    def _collect(self, first: Tuple[List[List[str]], Future, float]) -> Tuple[list, bool]:
+        items = [first]
+        n = len(first[0])
+        while n < self.max_pairs:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+            n += len(item[0])
+        if len(items) == 1:
+            # конкурентов нет — не ждём окно
+            return items, False
+
+        deadline = time.perf_counter() + self.window_s
+        while n < self.max_pairs:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+            n += len(item[0])
+        return items, False
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            items, stop = self._collect(first)
+            self._execute(items)
+            if stop:
+                return
+
+    def _execute(self, items: List[Tuple[List[List[str]], Future, float]]) -> None:
+        started = time.perf_counter()
+        flat: List[Tuple[int, int, List[str]]] = []
+        for owner, (pairs, _, _) in enumerate(items):
+            for pos, pair in enumerate(pairs):
+                flat.append((owner, pos, pair))
+        # бакетирование по длине: соседние пары близкой длины -> меньше паддинга
+        flat.sort(key=lambda x: len(x[2][0]) + len(x[2][1]))
+        try:
+            scores = self.base.predict([pair for _, _, pair in flat])
+        except BaseException as e:
+            for _, fut, _ in items:
+                fut.set_exception(e)
+            return
+        results: List[List[float]] = [[0.0] * len(pairs) for pairs, _, _ in items]
+        for (owner, pos, _), s in zip(flat, scores):
+            results[owner][pos] = float(s)
+        for (_, fut, _), res in zip(items, results):
+            fut.set_result(res)
+        with self._metrics_lock:
+            self._batches += 1
+            self._immediate += len(items) == 1
+            self._pairs += len(flat)
+            self._batch_sizes.append(len(flat))
+            self._waits_ms.extend((started - enqueued) * 1000 for _, _, enqueued in items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            waits = sorted(self._waits_ms)
+            sizes = list(self._batch_sizes)
+
+            def _pct(p: float) -> float:
+                return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "immediate_batches": self._immediate,
+                "pairs": self._pairs,
+                "avg_batch_pairs": sum(sizes) / len(sizes) if sizes else 0.0,
+                "max_batch_pairs": max(sizes, default=0),
+                "wait_ms_p50": _pct(0.5),
+                "wait_ms_p99": _pct(0.99),
+            }
@@ -0,0 +1,75 @@
+"""
+Кэш скоров cross-encoder reranker'а.
+
+Ключ — (модель, нормализованный вопрос, content_hash чанка). content_hash
+ставится при инжесте (utils.metadata.make_doc) и меняется вместе с текстом,
+поэтому изменённый документ автоматически получает новый ключ, а старая
+запись вытесняется по LRU/TTL. Для документов без content_hash ключом
+служит sha1 текста. В predict уходят только промахи, и вопрос в них тот же
+нормализованный, что и в ключе: скор из кэша всегда посчитан моделью на
+том же входе.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from typing import Any, Dict, List
+
+from ..utils.cache import TTLCache, register_cache_stats
+from .nlp import normalize_query
+from .types import Doc, ReRanker
+
+
+def _doc_key(doc: Doc) -> str:
+    h = (doc.metadata or {}).get("content_hash")
+    if h:
+        return str(h)
+    return "sha1:" + hashlib.sha1((doc.page_content or "").encode("utf-8")).hexdigest()
+
+
+class CachedReranker:
+    """
+    Обёртка над ReRanker (CrossEncoder) с кэшем скоров по документам.
+
+    Экономия времени оценивается по среднему времени predict на пару.
+    """
+
+    def __init__(self, base: ReRanker, model: str, maxsize: int = 8192, ttl_s: float | None = 6 * 3600.0):
+        self.base = base
+        self.model = model
+        self.cache: TTLCache[float] = TTLCache(maxsize=maxsize, ttl_s=ttl_s)
+        self._lock = threading.Lock()
+        self._predict_pairs = 0
+        self._predict_s = 0.0
+        register_cache_stats("reranker", self.stats)
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        started = time.perf_counter()
+        scores = [float(s) for s in self.base.predict(pairs)]
+        with self._lock:
+            self._predict_pairs += len(pairs)
+            self._predict_s += time.perf_counter() - started
+        return scores
+
+    def score_docs(self, question: str, docs: List[Doc]) -> List[float]:
+        """Скоры (question, doc) для всех docs; predict вызывается только для промахов."""
+        q = normalize_query(question)
+        keys = [(self.model, q, _doc_key(d)) for d in docs]
+        scores: List[float | None] = [self.cache.get(key) for key in keys]
+        miss = [i for i, s in enumerate(scores) if s is None]
+        if miss:
+            predicted = self.predict([[q, docs[i].page_content] for i in miss])
+            for i, s in zip(miss, predicted):
+                scores[i] = s
+                self.cache.set(keys[i], s)
+        return [float(s) for s in scores if s is not None]
+
+    def stats(self) -> Dict[str, Any]:
+        out = self.cache.stats()
+        with self._lock:
+            per_pair_ms = self._predict_s * 1000 / self._predict_pairs if self._predict_pairs else 0.0
+            out["predict_pairs"] = self._predict_pairs
+            out["predict_ms_per_pair"] = per_pair_ms
+            out["saved_ms"] = out["hits"] * per_pair_ms
+        return out
@@ -1,9 +1,19 @@
 from __future__ import annotations
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List, Tuple
+from .cascade import feature_map
+from .filters import and_where
 from .types import Doc, Retriever
 from .utils import doc_id_of
 from ..indexing import bm25
 
+logger = logging.getLogger(__name__)
+
+# Общий пул для параллельных этапов retrieval (dense / BM25 / fetch / expand)
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
 
 def fetch_by_ids(vs, ids: list[str], question: str) -> list[Doc]:
     if not ids:
@@ -34,24 +44,44 @@ def fetch_by_ids(vs, ids: list[str], question: str) -> list[Doc]:
     return [d for d in out if d]
 
 
+def embed_question(vs, question: str) -> list[float] | None:
+    """Эмбеддинг вопроса через embedding_function стора (кэшируется, см. embedding_cache)."""
+    emb = getattr(vs, "embeddings", None)
+    if emb is None or not hasattr(vs, "similarity_search_by_vector"):
+        return None
+    return emb.embed_query(question)
+
+
+def dense_search(vs, question: str, k: int, where: dict | None = None, vector: list[float] | None = None) -> list:
+    """Dense-поиск; с готовым vector — без повторного эмбеддинга вопроса."""
+    kwargs = {"filter": where} if where else {}
+    if vector is not None:
+        return vs.similarity_search_by_vector(vector, k=k, **kwargs)
+    return vs.similarity_search(question, k=k, **kwargs)
+
+
 class DenseRetriever(Retriever):
     def __init__(self, vs, where: dict | None = None):
         self.vs = vs
         self.where = where
 
     def retrieve(self, question: str, k: int) -> list[Doc]:
-        docs = self.vs.similarity_search(question, k=k, filter=self.where) if self.where else \
-               self.vs.similarity_search(question, k=k)
+        docs = dense_search(self.vs, question, k, where=self.where, vector=embed_question(self.vs, question))
         return [Doc(d.page_content, d.metadata or {}) for d in docs]
 
 
-def rrf_merge(dense: List[Tuple[str, float]], bm25_hits: List[Tuple[str, float]], k: int = 60) -> List[str]:
+def rrf_scores(dense: List[Tuple[str, float]], bm25_hits: List[Tuple[str, float]]) -> dict[str, float]:
     K = 60
     scores: dict[str, float] = {}
     for i, (did, _) in enumerate(dense):
         scores[did] = scores.get(did, 0.0) + 1.0 / (K + i + 1)
     for i, (did, _) in enumerate(bm25_hits):
         scores[did] = scores.get(did, 0.0) + 1.0 / (K + i + 1)
+    return scores
+
+
+def rrf_merge(dense: List[Tuple[str, float]], bm25_hits: List[Tuple[str, float]], k: int = 60) -> List[str]:
+    scores = rrf_scores(dense, bm25_hits)
     return [did for did, _ in sorted(scores.items(), key=lambda kv: kv[1], reverse=True)][:k]
 
 
@@ -73,25 +103,32 @@ def mmr_order(docs: list[Doc], question: str, k: int, diversity: float = 0.3) ->
     return out
 
 
-def expand_by_project(vs, question: str, base_docs: list[Doc], k_related: int = 48) -> list[Doc]:
+def _project_ids(docs: list[Doc]) -> list[int]:
     proj_ids: list[int] = []
     seen = set()
-    for d in base_docs:
+    for d in docs:
         pid = (d.metadata or {}).get("project_id")
         if isinstance(pid, int) and pid not in seen:
             seen.add(pid)
             proj_ids.append(pid)
-    if not proj_ids:
-        return list(base_docs)
+    return proj_ids
+
+
+def _related_by_projects(
+    vs, question: str, proj_ids: list[int], k_related: int, vector: list[float] | None = None
+) -> list[Doc] | None:
+    """Документы проектов proj_ids; None — если поиск упал."""
     try:
-        related = vs.similarity_search(
+        related = dense_search(
+            vs,
             question,
-            k=k_related,
-            filter={"type": {"$in": ["project", "experience_project"]}, "project_id": {"$in": proj_ids}},
+            k_related,
+            where={"type": {"$in": ["project", "experience_project"]}, "project_id": {"$in": proj_ids}},
+            vector=vector,
         )
     except Exception:
-        return list(base_docs)
-    out = list(base_docs)
+        return None
+    out: list[Doc] = []
     for d in related:
         md = d.metadata or {}
         md["expanded"] = True
@@ -99,14 +136,36 @@ def expand_by_project(vs, question: str, base_docs: list[Doc], k_related: int =
     return out
 
 
+def expand_by_project(
+    vs, question: str, base_docs: list[Doc], k_related: int = 48, vector: list[float] | None = None
+) -> list[Doc]:
+    proj_ids = _project_ids(base_docs)
+    if not proj_ids:
+        return list(base_docs)
+    related = _related_by_projects(vs, question, proj_ids, k_related, vector=vector)
+    if related is None:
+        return list(base_docs)
+    return list(base_docs) + related
+
+
 class HybridRetriever:
     """
     Объединяет dense и BM25 через RRF, подтягивает пропущенные документы по id, далее MMR и expand_by_project.
+
+    Dense и BM25 выполняются параллельно в общем пуле потоков. Параллельно
+    с дозапросом пропущенных id запускается expand_by_project по проектам
+    dense-кандидатов; результат используется, только если итоговый набор
+    проектов после MMR совпал, иначе расширение повторяется — выдача
+    идентична последовательному варианту. Вопрос эмбеддится один раз, dense и
+    расширение ищут по готовому вектору. Время каждого этапа — в last_timings (мс),
+    признаки первого этапа каскадного реранка по doc_id — в last_features.
     """
 
     def __init__(self, vs, collection: str):
         self.vs = vs
         self.collection = collection
+        self.last_timings: dict[str, float] = {}
+        self.last_features: dict[str, dict[str, float]] = {}
 
     def _filter_types(self, docs: list[Doc], allowed: set[str] | None) -> list[Doc]:
         if not allowed:
@@ -118,6 +177,17 @@ class HybridRetriever:
                 out.append(d)
         return out
 
+    def _timed(self, leg: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.last_timings[leg] = (time.perf_counter() - started) * 1000
+
+    def _dense_leg(self, question: str, k: int, where: dict | None) -> tuple[list[float] | None, list]:
+        vector = self._timed("embed", embed_question, self.vs, question)
+        return vector, self._timed("dense", dense_search, self.vs, question, k, where=where, vector=vector)
+
     def retrieve(
         self,
         question: str,
@@ -125,29 +195,78 @@ class HybridRetriever:
         k_bm: int,
         k_final: int,
         allowed_types: set[str] | None = None,
+        where: dict | None = None,
+        candidate_ids: set[str] | None = None,
+    ) -> list[Doc]:
+        """
+        where — дополнительное выражение для dense-поиска, candidate_ids —
+        допустимые doc_id для BM25 (см. rag/filters.py).
+        """
+        self.last_timings = {}
+        self.last_features = {}
+        started = time.perf_counter()
+        try:
+            return self._retrieve(question, k_dense, k_bm, k_final, allowed_types, where, candidate_ids)
+        finally:
+            self.last_timings["total"] = (time.perf_counter() - started) * 1000
+            logger.info("HybridRetriever timings (ms): %s", {k: round(v, 1) for k, v in self.last_timings.items()})
+
+    def _retrieve(
+        self,
+        question: str,
+        k_dense: int,
+        k_bm: int,
+        k_final: int,
+        allowed_types: set[str] | None,
+        filter_where: dict | None,
+        candidate_ids: set[str] | None,
     ) -> list[Doc]:
-        where = {"type": {"$in": list(allowed_types)}} if allowed_types else None
-        dense_docs = self.vs.similarity_search(question, k=k_dense, filter=where) if where else \
-                     self.vs.similarity_search(question, k=k_dense)
+        where = and_where({"type": {"$in": list(allowed_types)}} if allowed_types else None, filter_where)
+        dense_fut = _POOL.submit(self._dense_leg, question, k_dense, where)
+        bm_fut = _POOL.submit(
+            self._timed, "bm25", bm25.search, self.collection, question, k=k_bm, allowed_ids=candidate_ids
+        )
+        vector, dense_docs = dense_fut.result()
+        bm_hits = bm_fut.result() or []
+
         dense_pairs = []
         for i, d in enumerate(dense_docs):
             did = doc_id_of(d) or f"doc:{i}"
             dense_pairs.append((did, 1.0))
 
-        bm_hits = bm25.search(self.collection, question, k=k_bm) or []
-
         if not dense_pairs and not bm_hits:
             return []
 
-        merged_ids = rrf_merge(dense_pairs, bm_hits, k=max(60, k_final * 6))
+        k_related = max(48, k_final * 6)
+        rrf = rrf_scores(dense_pairs, bm_hits)
+        merged_ids = [did for did, _ in sorted(rrf.items(), key=lambda kv: kv[1], reverse=True)][:max(60, k_final * 6)]
+        dense_ids = [did for did, _ in dense_pairs]
+        self.last_features = feature_map(dense_ids, bm_hits, rrf)
         by_id_dense = {doc_id_of(d): d for d in dense_docs if doc_id_of(d)}
         candidates = [by_id_dense[i] for i in merged_ids if i in by_id_dense]
         miss = [i for i in merged_ids if i not in by_id_dense]
+
+        # Спекулятивное расширение по проектам dense-кандидатов, пока идёт fetch_by_ids
+        early_proj_ids = _project_ids(self._filter_types(candidates, allowed_types))
+        expand_fut = None
+        if miss and early_proj_ids:
+            expand_fut = _POOL.submit(
+                self._timed, "expand", _related_by_projects, self.vs, question, early_proj_ids, k_related, vector
+            )
         if miss:
-            candidates += fetch_by_ids(self.vs, miss, question)
+            candidates += self._timed("fetch", fetch_by_ids, self.vs, miss, question)
 
         docs = [Doc(d.page_content, d.metadata or {}) for d in candidates]
         docs = self._filter_types(docs, allowed_types)
         docs = mmr_order(docs, question, k=max(k_final * 2, k_final))
-        docs = expand_by_project(self.vs, question, docs, k_related=max(48, k_final * 6))
-        return docs
+
+        proj_ids = _project_ids(docs)
+        if not proj_ids:
+            return list(docs)
+        related = expand_fut.result() if expand_fut is not None and proj_ids == early_proj_ids else None
+        if related is None:
+            related = self._timed("expand", _related_by_projects, self.vs, question, proj_ids, k_related, vector)
+        if related is None:
+            return list(docs)
+        self.last_features = feature_map(dense_ids, bm_hits, rrf, [doc_id_of(d) or "" for d in related])
+        return list(docs) + related
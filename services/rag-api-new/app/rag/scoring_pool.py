@@ -0,0 +1,134 @@
+"""
+Scoring pool - cross-encoder в отдельных процессах.
+
+CPU-bound predict не держит GIL серверного процесса: модель загружается
+один раз на воркер (initializer ProcessPoolExecutor), обратно
+возвращается список скоров. Пары до SHARED_MIN_BYTES уходят в воркер
+байтами через очередь пула; крупнее — через multiprocessing.shared_memory
+(в очередь уходит только имя блока). Блок создаёт и удаляет родитель;
+spawn-воркеры используют resource_tracker родителя, поэтому подключение
+к блоку в воркере не передаёт ему владение.
+
+Есть синхронный predict (протокол ReRanker) и asyncio-API apredict:
+корутина ждёт future воркера, не занимая поток event loop.
+
+Пул включается только настройкой reranker_process_workers > 0; по
+умолчанию predict выполняется в серверном процессе. В пул уходит только
+predict cross-encoder'а: BM25 и токенизация остаются в серверном процессе.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# пары меньшего размера (JSON, байт) передаются без shared memory
+SHARED_MIN_BYTES = 256 * 1024
+
+# Состояние процесса-воркера
+_MODEL: Any = None
+
+_POOLS: List["ProcessReranker"] = []
+_POOLS_LOCK = threading.Lock()
+
+
+def _init_worker(factory: Callable[..., Any], args: tuple) -> None:
+    global _MODEL
+    _MODEL = factory(*args)
+
+
+def _read_shared(name: str, size: int) -> bytes:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+
+
+def _predict_bytes(data: bytes) -> List[float]:
+    pairs = json.loads(data.decode("utf-8"))
+    return [float(s) for s in _MODEL.predict(pairs)]
+
+
+def _predict_shared(name: str, size: int) -> List[float]:
+    return _predict_bytes(_read_shared(name, size))
+
+
+def _ping() -> bool:
+    return _MODEL is not None
+
+
+class ProcessReranker:
+    """
+    ReRanker, выполняющий predict в пуле процессов.
+
+    factory(*args) вызывается в каждом воркере и должна вернуть объект с
+    predict(pairs); она должна быть picklable (функция уровня модуля).
+    """
+
+    def __init__(self, factory: Callable[..., Any], args: tuple = (), workers: int = 1):
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(factory, args),
+        )
+        with _POOLS_LOCK:
+            _POOLS.append(self)
+
+    def warmup(self) -> Future:
+        """Запустить загрузку модели в воркере, не дожидаясь первого запроса."""
+        return self._executor.submit(_ping)
+
+    def _submit(self, pairs: List[List[str]]) -> Future:
+        data = json.dumps(pairs, ensure_ascii=False).encode("utf-8")
+        if len(data) < SHARED_MIN_BYTES:
+            return self._executor.submit(_predict_bytes, data)
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        shm.buf[: len(data)] = data
+        try:
+            fut = self._executor.submit(_predict_shared, shm.name, len(data))
+        except BaseException:
+            _release(shm)
+            raise
+        fut.add_done_callback(lambda _f: _release(shm))
+        return fut
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        if not pairs:
+            return []
+        return self._submit(pairs).result()
+
+    async def apredict(self, pairs: List[List[str]]) -> List[float]:
+        if not pairs:
+            return []
+        return await asyncio.wrap_future(self._submit(pairs))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _release(shm: shared_memory.SharedMemory) -> None:
+    try:
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def shutdown_scoring_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS)
+        _POOLS.clear()
+    for pool in pools:
+        try:
+            pool.shutdown()
+        except Exception:
+            logger.warning("Scoring pool shutdown failed", exc_info=True)
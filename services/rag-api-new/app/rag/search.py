@@ -6,18 +6,22 @@ Portfolio Search - оркестратор поиска.
 """
 from __future__ import annotations
 
-import re
 import logging
-from dataclasses import asdict
+from dataclasses import asdict, replace
 from typing import Any, List
 
-from ..deps import settings, vectorstore, reranker
+from ..deps import settings, search_vectorstore, reranker
 from ..graph.query import graph_query
+from ..indexing import entity_index
+from ..indexing.entity_index import match_values, token_matches
 from .search_types import SearchResult, Intent, EntityPolicy, Entity, EntityType, QueryPlan
 from .retrieval import HybridRetriever
-from .rank import rerank
+from .search_cache import get_search_cache, search_cache_key
+from .cascade import cascade_rerank
+from .filters import CompiledFilters, compile_filters
 from .evidence import select_evidence, pack_context
 from .types import ScoredDoc, SourceInfo, Doc
+from .utils import doc_id_of
 
 logger = logging.getLogger(__name__)
 
@@ -41,85 +45,44 @@ def _build_sources(evidence: List[ScoredDoc]) -> List[dict[str, Any]]:
     return srcs
 
 
-def _apply_entity_filter(docs: List[Doc], entities: List[Entity], policy: EntityPolicy) -> List[Doc]:
+def _apply_entity_filter(
+    docs: List[Doc],
+    entities: List[Entity],
+    policy: EntityPolicy,
+    collection: str | None = None,
+) -> List[Doc]:
     """
     Применить фильтрацию по сущностям.
 
     - STRICT: оставить только документы с указанными сущностями
     - BOOST: переместить документы с сущностями в начало
     - NONE: без изменений
+
+    Совпадение берётся из EntityIndex коллекции (множества doc_id по токенам
+    сущностей); документы, которых нет в индексе или чей content_hash
+    изменился, проверяются построчно по тем же правилам, как и все документы,
+    если postings построить не удалось (Chroma недоступна).
     """
     if policy == EntityPolicy.NONE or not entities:
         return docs
 
-    entity_slugs = {e.slug.lower() for e in entities}
-    entity_names = {e.name.lower() for e in entities}
-
-    def _token_match(text: str, token: str) -> bool:
-        token = (token or "").strip().lower()
-        if not token:
-            return False
-        tl = (text or "").lower()
-        if not tl:
-            return False
-        if len(token) <= 3 and token.isalnum():
-            return re.search(rf"(?<![\\w-]){re.escape(token)}(?![\\w-])", tl) is not None
-        return token in tl
-
-    def _value_matches(val: Any) -> bool:
-        if val is None:
-            return False
-        if isinstance(val, (list, tuple, set)):
-            return any(_value_matches(v) for v in val)
-        if not isinstance(val, str):
-            val = str(val)
-        val_lower = val.lower()
-        if val_lower in entity_slugs or val_lower in entity_names:
-            return True
-        for tok in entity_slugs:
-            if _token_match(val_lower, tok):
-                return True
-        for tok in entity_names:
-            if _token_match(val_lower, tok):
-                return True
-        return False
-
-    def matches_entity(doc: Doc) -> bool:
-        md = doc.metadata or {}
-        for key in ["slug", "project_slug", "company_slug", "name", "title", "ref_id"]:
-            val = md.get(key)
-            if isinstance(val, str):
-                val_lower = val.lower()
-                if val_lower in entity_slugs or val_lower in entity_names:
-                    return True
-                # Частичное совпадение
-                for slug in entity_slugs:
-                    if slug in val_lower or val_lower in slug:
-                        return True
-        return False
+    tokens = {e.slug.lower() for e in entities} | {e.name.lower() for e in entities}
+    index = entity_index.get_index(collection) if collection else None
+    indexed_ids = index.matching(tokens) if index is not None and len(index) else None
 
     def matches_entity_ext(doc: Doc) -> bool:
         md = doc.metadata or {}
-        for key in [
-            "slug",
-            "project_slug",
-            "company_slug",
-            "name",
-            "title",
-            "ref_id",
-            "technologies",
-            "technologies_csv",
-            "tags",
-            "tags_csv",
-            "project_names",
-            "project_names_csv",
-        ]:
-            if _value_matches(md.get(key)):
-                return True
-        return _value_matches(doc.page_content or "")
+        if indexed_ids is not None:
+            did = doc_id_of(doc)
+            if index.is_current(did, md.get("content_hash")):
+                return did in indexed_ids
+        values = match_values(md, doc.page_content)
+        return any(token_matches(values, t) for t in tokens)
+
+    matched = [matches_entity_ext(d) for d in docs]
 
     if policy == EntityPolicy.STRICT:
-        filtered = [d for d in docs if matches_entity_ext(d)]
+        filtered = [d for d, m in zip(docs, matched) if m]
         # Если STRICT вернул пусто, возвращаем исходные (fallback)
         if filtered:
             return filtered
@@ -132,14 +95,14 @@ def _apply_entity_filter(docs: List[Doc], entities: List[Entity], policy: Entity
         return docs
 
     # BOOST: matching первыми
-    matching = [d for d in docs if matches_entity_ext(d)]
-    non_matching = [d for d in docs if not matches_entity_ext(d)]
+    matching = [d for d, m in zip(docs, matched) if m]
+    non_matching = [d for d, m in zip(docs, matched) if not m]
     return matching + non_matching
 
 
 def _apply_metadata_filters(
     scored: List[ScoredDoc],
-    filters: dict[str, Any],
+    filters: dict[str, Any] | CompiledFilters,
 ) -> List[ScoredDoc]:
     """
     Apply metadata-based filters to scored documents.
@@ -152,61 +115,15 @@ def _apply_metadata_filters(
 
     Args:
         scored: List of scored documents
-        filters: Filter dictionary
+        filters: Filter dictionary or filters already compiled by compile_filters
 
     Returns:
         Filtered list of scored documents
     """
     if not filters:
         return scored
-
-    tech_category = filters.get("tech_category")
-    company_slug = filters.get("company_slug") or filters.get("company_id")
-    project_slug = filters.get("project_slug") or filters.get("project_id")
-    tags_any = filters.get("tags_any", [])
-
-    def _matches(sd: ScoredDoc) -> bool:
-        md = sd.doc.metadata or {}
-
-        # Filter by tech_category
-        if tech_category:
-            doc_category = (md.get("category") or "").lower()
-            if doc_category != tech_category.lower():
-                # Also check if it's a technology document
-                doc_type = md.get("type", "")
-                if doc_type != "technology":
-                    return True  # Allow non-technology docs through
-                return False
-
-        # Filter by company
-        if company_slug:
-            slug_lower = company_slug.lower()
-            doc_company = (md.get("company_slug") or md.get("company_name") or "").lower()
-            if slug_lower not in doc_company and doc_company not in slug_lower:
-                return False
-
-        # Filter by project
-        if project_slug:
-            slug_lower = project_slug.lower()
-            doc_project = (md.get("project_slug") or md.get("slug") or md.get("name") or "").lower()
-            if slug_lower not in doc_project and doc_project not in slug_lower:
-                return False
-
-        # Filter by tags (OR logic)
-        if tags_any:
-            doc_tags = md.get("tags", [])
-            if isinstance(doc_tags, str):
-                doc_tags = [t.strip() for t in doc_tags.split(",")]
-            doc_tags_lower = {t.lower() for t in doc_tags}
-            tags_lower = {t.lower() for t in tags_any}
-            if not doc_tags_lower.intersection(tags_lower):
-                # No matching tags, but allow if no tags specified in doc
-                if doc_tags:
-                    return False
-
-        return True
-
-    return [sd for sd in scored if _matches(sd)]
+    compiled = filters if isinstance(filters, CompiledFilters) else compile_filters(filters)
+    return [sd for sd in scored if compiled.matches(sd.doc.metadata)]
 
 
 def portfolio_search(
@@ -241,9 +158,30 @@ def portfolio_search(
 
     Returns:
         SearchResult с найденными фактами или evidence
+
+    Результат кэшируется (search_cache.py): повтор вопроса при тех же
+    параметрах и версии индексов не выполняет поиск заново.
     """
+    coll = collection or settings().chroma_collection
+    cache = get_search_cache()
+    key = search_cache_key(question, k, coll, allowed_types, filters, min_score)
+    cached = cache.get(key)
+    if cached is not None:
+        return replace(cached, query=question)
+    result = _portfolio_search(question, k, coll, allowed_types, filters, min_score)
+    cache.set(key, result)
+    return result
+
+
+def _portfolio_search(
+    question: str,
+    k: int,
+    coll: str,
+    allowed_types: set[str] | list[str] | None,
+    filters: dict[str, Any] | None,
+    min_score: float | None,
+) -> SearchResult:
     cfg = settings()
-    coll = collection or cfg.chroma_collection
 
     # === Create search plan with default parameters ===
     # Параметры поиска определяет Planner LLM, здесь используем значения по умолчанию
@@ -294,9 +232,12 @@ def portfolio_search(
             )
 
     # === Fallback to Hybrid Retrieval ===
-    vs = vectorstore(coll)
+    vs = search_vectorstore(coll)
     rr = reranker()
 
+    # Фильтры: where для dense и допустимые doc_id для BM25 (по MetadataIndex)
+    compiled = compile_filters(filters, coll) if filters else None
+
     hybrid = HybridRetriever(vs, collection=coll)
     candidates = hybrid.retrieve(
         question,
@@ -304,6 +245,8 @@ def portfolio_search(
         k_bm=plan.k_bm,
         k_final=plan.k_final,
         allowed_types=plan.allowed_types,
+        where=compiled.where if compiled else None,
+        candidate_ids=compiled.candidate_ids if compiled else None,
     )
 
     if not candidates:
@@ -320,14 +263,23 @@ def portfolio_search(
         )
 
     # === Apply Entity Filter ===
-    candidates = _apply_entity_filter(candidates, plan.entities, plan.entity_policy)
-
-    # === Rerank ===
-    scored: List[ScoredDoc] = rerank(rr, question, candidates)
+    candidates = _apply_entity_filter(candidates, plan.entities, plan.entity_policy, collection=coll)
 
     # === Apply additional filters ===
-    if filters:
-        scored = _apply_metadata_filters(scored, filters)
+    # Построчная проверка — для документов, прошедших мимо индекса (расширение по проектам, fetch по id)
+    if compiled:
+        candidates = [d for d in candidates if compiled.matches(d.metadata)]
+
+    # === Cascade rerank: shortlist по дешёвым признакам, затем cross-encoder ===
+    scored: List[ScoredDoc] = cascade_rerank(
+        rr,
+        question,
+        candidates,
+        hybrid.last_features,
+        size=cfg.rerank_shortlist,
+        min_size=max(cfg.rerank_shortlist_min, k, 8),
+        gap_ratio=cfg.rerank_gap_ratio,
+    )
 
     # === Apply min_score threshold ===
     if min_score is not None and min_score > 0.0:
@@ -0,0 +1,63 @@
+"""
+Кэш результатов portfolio_search.
+
+При неизменных индексах поиск детерминирован, поэтому SearchResult
+кэшируется по (нормализованный вопрос, k, allowed_types, filters,
+min_score, коллекция, index_version). index_version увеличивается при
+инжесте, очистке коллекции и перестроении графа (indexing/version.py).
+"""
+from __future__ import annotations
+
+from typing import Any, Hashable
+
+from ..indexing.version import index_version
+from ..utils.cache import TTLCache, register_cache_stats
+from .nlp import normalize_query
+from .search_types import SearchResult
+
+_CACHE: TTLCache[SearchResult] | None = None
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted((_freeze(v) for v in value), key=repr))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def search_cache_key(
+    question: str,
+    k: int,
+    collection: str,
+    allowed_types: Any = None,
+    filters: dict[str, Any] | None = None,
+    min_score: float | None = None,
+) -> tuple:
+    return (
+        normalize_query(question),
+        k,
+        _freeze(set(allowed_types)) if allowed_types else None,
+        _freeze(filters) if filters else None,
+        min_score,
+        collection,
+        index_version(),
+    )
+
+
+def get_search_cache() -> TTLCache[SearchResult]:
+    global _CACHE
+    if _CACHE is None:
+        from ..settings import get_settings
+
+        s = get_settings()
+        _CACHE = TTLCache(maxsize=s.search_cache_size, ttl_s=s.search_cache_ttl_s)
+        register_cache_stats("search_results", _CACHE.stats)
+    return _CACHE
+
+
+def reset_search_cache() -> None:
+    global _CACHE
+    _CACHE = None
@@ -66,12 +66,14 @@ class QueryPlan:
     style_hint: str | None = None
 
 
-@dataclass
+@dataclass(frozen=True)
 class GraphQueryResult:
     """
     Результат запроса к графу знаний.
 
     Содержит структурированные факты (items) и метаинформацию.
+    Результаты из материализованных представлений графа разделяются
+    между запросами — items/sources не изменять.
     """
     items: list[dict[str, Any]]
     found: bool
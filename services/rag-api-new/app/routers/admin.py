@@ -5,7 +5,11 @@ import logging
 from fastapi import APIRouter
 
 from app.deps import chroma_client, settings, vectorstore
-from app.indexing import bm25
+from app.indexing import bm25, entity_index, metadata_index, vector_index
+from app.indexing.persistence import bm25_try_delete
+from app.indexing.vector_persistence import vectors_try_delete
+from app.indexing.version import bump_index_version
+from app.utils.cache import cache_stats
 from app.schemas.admin import ClearResult, StatsResult, GraphStats
 
 router = APIRouter(prefix="/api/v1", tags=["admin"])
@@ -27,6 +31,14 @@ def clear_collection():
             bm25.reset(collection_name)
         except Exception:
             logger.warning("BM25 reset failed", exc_info=True)
+        bm25_try_delete(collection_name)
+        vector_index.reset(collection_name)
+        vectors_try_delete(collection_name)
+        entity_index.reset(collection_name)
+        entity_index.entities_try_delete(collection_name)
+        metadata_index.reset(collection_name)
+        metadata_index.metadata_try_delete(collection_name)
+        bump_index_version()
 
     vectorstore(collection_name)
     return ClearResult(ok=True, collection=collection_name, recreated=True)
@@ -64,4 +76,5 @@ def collection_stats():
         total=total,
         by_type=by_type,
         graph_stats=graph_stats,
+        cache_stats=cache_stats(),
     )
@@ -11,6 +11,7 @@ from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage
 
 from app.deps import agent_app, settings
+from app.graph.store import pinned_graph
 from app.schemas.chat import ChatRequest
 from app.utils.logging_utils import compact_json, truncate_text
 
@@ -146,49 +147,51 @@ async def chat_stream(req: ChatRequest):
             ensure_ascii=False,
         ) + "\n"
         try:
-            async for event in _iterate_agent_events(agent, state, config):
-                kind = event.get("event")
-
-                if kind == "on_chat_model_stream":
-                    chunk = (event.get("data") or {}).get("chunk")
-                    content = _extract_text(chunk)
-                    if hasattr(chunk, "usage_metadata") and getattr(chunk, "usage_metadata", None):
-                        usage = getattr(chunk, "usage_metadata", None)
-                    if content:
-                        sent_delta = True
-                        final_text += content
-                        yield json.dumps({"type": "delta", "content": content}, ensure_ascii=False) + "\n"
-
-                elif kind in ("on_chat_model_end", "on_chain_end"):
-                    data = event.get("data") or {}
-                    output = data.get("output") if isinstance(data, dict) else None
-                    text = _extract_text(output or data)
-                    if text and not sent_delta:
-                        final_text = text
-
-                elif kind == "on_tool_start":
-                    tool_name = event.get("name") or (event.get("data") or {}).get("name") or "tool"
-                    data = event.get("data") or {}
-                    tool_input = data.get("input") or data.get("inputs") or data.get("tool_input")
-                    logger.info(
-                        "tool_start message_id=%s thread_id=%s tool=%s input=%s",
-                        message_id,
-                        thread_id,
-                        tool_name,
-                        compact_json(tool_input, limit=2000),
-                    )
-                    yield json.dumps({"type": "tool_start", "tool": tool_name}, ensure_ascii=False) + "\n"
-
-                elif kind == "on_tool_end":
-                    data = event.get("data") or {}
-                    tool_output = data.get("output") or data.get("result")
-                    logger.info(
-                        "tool_end message_id=%s thread_id=%s output_preview=%r",
-                        message_id,
-                        thread_id,
-                        truncate_text(tool_output, limit=800),
-                    )
-                    yield json.dumps({"type": "tool_end"}, ensure_ascii=False) + "\n"
+            # весь ответ агента читает один снимок графа и EntityRegistry
+            with pinned_graph():
+                async for event in _iterate_agent_events(agent, state, config):
+                    kind = event.get("event")
+
+                    if kind == "on_chat_model_stream":
+                        chunk = (event.get("data") or {}).get("chunk")
+                        content = _extract_text(chunk)
+                        if hasattr(chunk, "usage_metadata") and getattr(chunk, "usage_metadata", None):
+                            usage = getattr(chunk, "usage_metadata", None)
+                        if content:
+                            sent_delta = True
+                            final_text += content
+                            yield json.dumps({"type": "delta", "content": content}, ensure_ascii=False) + "\n"
+
+                    elif kind in ("on_chat_model_end", "on_chain_end"):
+                        data = event.get("data") or {}
+                        output = data.get("output") if isinstance(data, dict) else None
+                        text = _extract_text(output or data)
+                        if text and not sent_delta:
+                            final_text = text
+
+                    elif kind == "on_tool_start":
+                        tool_name = event.get("name") or (event.get("data") or {}).get("name") or "tool"
+                        data = event.get("data") or {}
+                        tool_input = data.get("input") or data.get("inputs") or data.get("tool_input")
+                        logger.info(
+                            "tool_start message_id=%s thread_id=%s tool=%s input=%s",
+                            message_id,
+                            thread_id,
+                            tool_name,
+                            compact_json(tool_input, limit=2000),
+                        )
+                        yield json.dumps({"type": "tool_start", "tool": tool_name}, ensure_ascii=False) + "\n"
+
+                    elif kind == "on_tool_end":
+                        data = event.get("data") or {}
+                        tool_output = data.get("output") or data.get("result")
+                        logger.info(
+                            "tool_end message_id=%s thread_id=%s output_preview=%r",
+                            message_id,
+                            thread_id,
+                            truncate_text(tool_output, limit=800),
+                        )
+                        yield json.dumps({"type": "tool_end"}, ensure_ascii=False) + "\n"
 
         except Exception as exc:
             logger.exception("Agent streaming failed")
@@ -7,8 +7,10 @@ from typing import Any, Iterable
 from fastapi import APIRouter, HTTPException
 
 from app.deps import settings, vectorstore
-from app.indexing import bm25
+from app.indexing import bm25, entity_index, metadata_index, vector_index
 from app.indexing.persistence import bm25_try_load, bm25_try_save
+from app.indexing.vector_persistence import vectors_sync_from_chroma, vectors_try_load, vectors_try_save
+from app.indexing.version import bump_index_version
 from app.schemas.ingest import IngestItem, IngestRequest, IngestResult
 
 logger = logging.getLogger(__name__)
@@ -52,6 +54,13 @@ def upsert_documents(collection: str, items: list[IngestItem]) -> IngestResult:
     ids_all = [it.id for it in items]
 
     bm25_try_load(collection)
+    entity_index.entities_try_load(collection)
+    metadata_index.metadata_try_load(collection)
+    local_vectors = settings().vector_backend == "local"
+    if local_vectors:
+        vectors_try_load(collection, vs=vs)
+    # пустой локальный индекс заполняем целиком из Chroma после апсерта, иначе — по батчам
+    vectors_full_sync = local_vectors and not len(vector_index.get_index(collection) or ())
 
     try:
         if ids_all:
@@ -62,6 +71,10 @@ def upsert_documents(collection: str, items: list[IngestItem]) -> IngestResult:
         bm25.delete_ids(collection, ids_all)
     except Exception:
         logger.warning("bm25 delete_ids failed", exc_info=True)
+    if local_vectors:
+        vector_index.delete_ids(collection, ids_all)
+    entity_index.delete_ids(collection, ids_all)
+    metadata_index.delete_ids(collection, ids_all)
 
     upserted = 0
     for batch in _batched(items, max_batch):
@@ -82,12 +95,26 @@ def upsert_documents(collection: str, items: list[IngestItem]) -> IngestResult:
             bm25.add_texts(collection, ids, texts)
         except Exception:
             logger.warning("bm25 add_texts failed", exc_info=True)
+        entity_index.add_documents(collection, ids, texts, metadatas)
+        metadata_index.add_documents(collection, ids, metadatas)
 
-    try:
-        snapshot = bm25.snapshot(collection)
-        bm25_try_save(collection, snapshot)
-    except Exception:
-        logger.warning("bm25 snapshot save failed", exc_info=True)
+        if local_vectors and not vectors_full_sync:
+            try:
+                vectors_sync_from_chroma(collection, vs, ids)
+            except Exception:
+                logger.warning("vector index sync failed", exc_info=True)
+
+    bm25_try_save(collection)
+    entity_index.entities_try_save(collection)
+    metadata_index.metadata_try_save(collection)
+    if local_vectors:
+        if vectors_full_sync:
+            try:
+                vectors_sync_from_chroma(collection, vs)
+            except Exception:
+                logger.warning("vector index sync failed", exc_info=True)
+        vectors_try_save(collection)
+    bump_index_version()
 
     return IngestResult(ok=True, upserted=upserted, collection=collection)
 
@@ -27,9 +27,20 @@ def ingest_batch(payload: ExportPayload):
 
     res = upsert_documents(coll, items)
 
-    # === Graph-RAG: построение графа знаний (always enabled) ===
-    from app.graph.builder import build_graph_from_export
-    store = build_graph_from_export(payload)
-    logger.info("Graph built: %s", store.stats())
+    # === Graph-RAG: обновление графа знаний (always enabled) ===
+    # дифф по сущностям к текущему графу; целиком — при первом инжесте
+    from app.graph.diff import upsert_graph_from_export
+    from app.graph.persistence import graph_try_save_export
+    diff = upsert_graph_from_export(payload)
+    if diff.changed:
+        graph_try_save_export(payload)
+
+    # postings EntityIndex для сущностей обновлённого реестра
+    from app.indexing import entity_index
+    from app.rag.entities import get_entity_registry
+    index = entity_index.get_index(coll)
+    if index is not None:
+        index.ensure_tokens(get_entity_registry().match_tokens())
+        entity_index.entities_try_save(coll)
 
     return IngestBatchResult(added=res.upserted, collection=res.collection)
@@ -23,3 +23,4 @@ class StatsResult(BaseModel):
     total: int
     by_type: dict[str, Any] | None = None
     graph_stats: GraphStats | None = None
+    cache_stats: dict[str, dict[str, Any]] | None = None
@@ -40,14 +40,35 @@ class Settings(BaseSettings):
     # Модели (алиасы, как в конфиге прокси)
     chat_model: str
     embedding_model: str = "embedding-default"
+    embedding_cache_size: int = 1024        # эмбеддинги запросов (LRU)
+    embedding_cache_ttl_s: float = 3600.0
 
     # Reranker
     reranker_model: str = "BAAI/bge-reranker-base"
+    reranker_backend: str = "torch"        # torch | onnx-int8 (экспорт в <index_data_dir>/models)
+    reranker_max_tokens: int = 384         # бюджет токенов на пару (вопрос + документ)
+    reranker_process_workers: int = 0      # opt-in: >0 — predict (и apredict) в пуле процессов, модель в каждом воркере;
+                                           # при 0 реранк держит GIL сервера; BM25 и токенизация всегда в процессе
+    reranker_cache_size: int = 8192        # скоры (вопрос, content_hash), LRU
+    reranker_batch_window_ms: float = 5.0  # micro-batching конкурентных запросов; 0 — выключено
+    reranker_batch_max_pairs: int = 128
+    rerank_shortlist: int = 24             # кандидатов в cross-encoder после первого этапа
+    rerank_shortlist_min: int = 8
+    rerank_gap_ratio: float = 0.0          # >0 — адаптивная отсечка shortlist по разрыву скоров
+
+    # Кэш результатов portfolio_search (ключ включает версию индексов)
+    search_cache_size: int = 512
+    search_cache_ttl_s: float = 600.0
 
     # Chroma
     chroma_host: str = "localhost"
     chroma_port: int = 8001
     chroma_collection: str = "portfolio_new"
+    # Dense-поиск: "chroma" или "local" (in-process копия коллекции, app/indexing/vector_index.py)
+    vector_backend: str = "chroma"
+
+    # Локальные снапшоты индексов (BM25 и т.п.)
+    index_data_dir: str = "data"
 
     # CORS
     frontend_origin: str | AnyUrl = "http://localhost:3001"
@@ -60,6 +81,14 @@ class Settings(BaseSettings):
     planner_temperature: float = 0.0      # Planner LLM (детерминированный)
     answer_temperature: float = 0.2       # Answer LLM (баланс креативности)
 
+    # Rule-based fast path перед Planner LLM (app/agent/planner/fast_path.py)
+    planner_fast_path: bool = True
+    planner_fast_path_threshold: float = 0.8  # минимальная уверенность плана без LLM
+
+    # Кэш планов Planner LLM (app/agent/planner/plan_cache.py); сбрасывается при смене версии индексов
+    planner_plan_cache_size: int = 512          # LRU; 0 — выключен
+    planner_plan_cache_similarity: float = 0.95  # минимальный косинус к вопросу из кэша
+
     @property
     def chroma_client_kwargs(self) -> dict:
         return {"host": self.chroma_host, "port": self.chroma_port}
@@ -0,0 +1,177 @@
+"""
+Warm start - восстановление поисковых индексов при старте приложения.
+
+Все индексы (BM25, индексы сущностей и метаданных, граф знаний +
+EntityRegistry, при vector_backend=local — векторный индекс) загружаются
+из локальных снапшотов параллельно, затем строятся postings индекса
+сущностей для всех сущностей реестра (тексты — из Chroma); для каждого
+шага фиксируется время загрузки и ошибка.
+Пока загрузка не завершена, /readyz отвечает 503.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict
+
+from .indexing.version import bump_index_version
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IndexLoadStatus:
+    """Результат загрузки одного индекса."""
+    loaded: bool = False
+    duration_ms: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class WarmupState:
+    """Состояние warm start для /readyz."""
+    ready: bool = False
+    started_at: float | None = None
+    duration_ms: float = 0.0
+    indexes: Dict[str, IndexLoadStatus] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Снимок для /readyz; indexes только заменяется целиком (см. warm_start)."""
+        return asdict(self)
+
+
+_STATE = WarmupState()
+_LOCK = threading.Lock()
+
+
+def get_warmup_state() -> WarmupState:
+    return _STATE
+
+
+def _load_bm25() -> bool:
+    from .indexing.persistence import bm25_snapshot_collections, bm25_try_load
+
+    loaded = False
+    for collection in bm25_snapshot_collections():
+        loaded = bm25_try_load(collection) or loaded
+    return loaded
+
+
+def _load_entities() -> bool:
+    from .indexing.entity_index import entities_snapshot_collections, entities_try_load
+
+    loaded = False
+    for collection in entities_snapshot_collections():
+        loaded = entities_try_load(collection) or loaded
+    return loaded
+
+
+def _load_metadata() -> bool:
+    from .indexing.metadata_index import metadata_snapshot_collections, metadata_try_load
+
+    loaded = False
+    for collection in metadata_snapshot_collections():
+        loaded = metadata_try_load(collection) or loaded
+    return loaded
+
+
+def _load_graph() -> bool:
+    from .graph.persistence import graph_try_load
+
+    return graph_try_load()
+
+
+def _load_vectors() -> bool:
+    from .deps import settings, vectorstore
+    from .indexing.vector_persistence import (
+        vectors_snapshot_collections,
+        vectors_sync_from_chroma,
+        vectors_try_load,
+    )
+
+    loaded = False
+    for collection in vectors_snapshot_collections():
+        # повреждённый снапшот — заполняем из Chroma
+        loaded = vectors_try_load(collection, vs=vectorstore(collection)) or loaded
+    if not loaded:
+        # снапшота ещё нет — копируем коллекцию из Chroma
+        loaded = vectors_sync_from_chroma(settings().chroma_collection, vectorstore()) > 0
+    return loaded
+
+
+def _load_entity_postings() -> bool:
+    from .indexing.entity_index import ensure_tokens_all
+    from .rag.entities import get_entity_registry
+
+    # токены — из реестра графа, поэтому после всех загрузчиков
+    return ensure_tokens_all(get_entity_registry().match_tokens())
+
+
+def _loaders() -> Dict[str, Callable[[], bool]]:
+    from .settings import get_settings
+
+    loaders = {
+        "bm25": _load_bm25,
+        "entities": _load_entities,
+        "metadata": _load_metadata,
+        "graph": _load_graph,
+    }
+    if get_settings().vector_backend == "local":
+        loaders["vectors"] = _load_vectors
+    return loaders
+
+
+def _post_loaders() -> Dict[str, Callable[[], bool]]:
+    """Загрузчики, которым нужны индексы из _loaders (выполняются после них)."""
+    return {"entity_postings": _load_entity_postings}
+
+
+def _timed(name: str, loader: Callable[[], bool]) -> IndexLoadStatus:
+    started = time.perf_counter()
+    status = IndexLoadStatus()
+    try:
+        status.loaded = bool(loader())
+    except Exception as e:
+        logger.warning("Warm start: %s failed", name, exc_info=True)
+        status.error = str(e)
+    status.duration_ms = (time.perf_counter() - started) * 1000
+    return status
+
+
+def warm_start() -> WarmupState:
+    """
+    Загрузить все индексы из снапшотов (параллельно) и отметить готовность.
+
+    Ошибки отдельных индексов не блокируют готовность: сервис остаётся
+    работоспособным, а индекс будет заполнен при следующем инжесте.
+    После загрузки версия индексов увеличивается (bump_index_version).
+    """
+    with _LOCK:
+        if _STATE.ready:
+            return _STATE
+        _STATE.started_at = time.time()
+        started = time.perf_counter()
+        loaders = _loaders()
+        with ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="warmup") as pool:
+            futures = {name: pool.submit(_timed, name, fn) for name, fn in loaders.items()}
+            for name, fut in futures.items():
+                # новый словарь вместо изменения на месте: /readyz читает
+                # indexes без _LOCK (to_dict) и не должен видеть его посреди записи
+                _STATE.indexes = {**_STATE.indexes, name: fut.result()}
+        for name, fn in _post_loaders().items():
+            _STATE.indexes = {**_STATE.indexes, name: _timed(name, fn)}
+        # загрузчики подменили индексы: кэши поиска и планов, заполненные
+        # во время warm start, перестают совпадать по версии
+        bump_index_version()
+        _STATE.duration_ms = (time.perf_counter() - started) * 1000
+        _STATE.ready = True
+
+    logger.info(
+        "Warm start complete in %.1f ms: %s",
+        _STATE.duration_ms,
+        {name: f"{st.duration_ms:.1f} ms, loaded={st.loaded}" for name, st in _STATE.indexes.items()},
+    )
+    return _STATE
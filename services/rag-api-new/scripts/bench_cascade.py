@@ -0,0 +1,89 @@
+"""
+Бенчмарк каскадного реранка: recall@k shortlist'а против полного cross-encoder.
+
+Fixture синтетический и детерминированный: на каждый запрос ~100 кандидатов
+(как после MMR + expand_by_project) с признаками первого этапа; "истинный"
+скор cross-encoder шумно коррелирует с ними (--noise).
+
+    python -m scripts.bench_cascade --queries 200 --k 8
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+from typing import Dict, List, Tuple
+
+from app.rag.cascade import cascade_rerank, feature_map, first_stage_score, recall_at_k
+from app.rag.rank import rerank
+from app.rag.retrieval import rrf_scores
+from app.rag.types import Doc
+
+TYPES = ["project", "experience_project", "technology", "experience", "profile", "publication"]
+
+
+class _OracleReranker:
+    """Детерминированный "cross-encoder": скор записан в начале текста документа."""
+
+    def __init__(self) -> None:
+        self.pairs = 0
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        self.pairs += len(pairs)
+        return [float(text.split("|", 1)[0]) for _, text in pairs]
+
+
+def make_fixture(rnd: random.Random, n_dense: int = 20, n_bm: int = 15, n_expanded: int = 60, noise: float = 0.35):
+    docs: List[Doc] = []
+    ids = [f"doc:{i}" for i in range(n_dense + n_bm + n_expanded)]
+    dense_ids = ids[:n_dense]
+    bm_ids = rnd.sample(ids[: n_dense + n_bm], n_bm)
+    bm_hits = [(did, 10.0 / (1 + i)) for i, did in enumerate(bm_ids)]
+    expanded_ids = ids[n_dense + n_bm:]
+    rrf = rrf_scores([(d, 1.0) for d in dense_ids], bm_hits)
+    features = feature_map(dense_ids, bm_hits, rrf, expanded_ids)
+    for did in ids:
+        md = {"doc_id": did, "type": rnd.choice(TYPES)}
+        if did in expanded_ids:
+            md["expanded"] = True
+        base = first_stage_score(Doc("", md), features.get(did))
+        truth = base + rnd.gauss(0.0, noise)
+        docs.append(Doc(f"{truth:.6f}|{did}", md))
+    rnd.shuffle(docs)
+    return docs, features
+
+
+def run(queries: int, k: int, sizes: List[int], gap_ratio: float, noise: float, seed: int) -> Dict[int, Tuple[float, float]]:
+    rnd = random.Random(seed)
+    fixtures = [make_fixture(rnd, noise=noise) for _ in range(queries)]
+    out: Dict[int, Tuple[float, float]] = {}
+    for size in sizes:
+        recalls = []
+        full_pairs = cascade_pairs = 0
+        for docs, features in fixtures:
+            full_rr, cascade_rr = _OracleReranker(), _OracleReranker()
+            reference = rerank(full_rr, "q", docs)
+            got = cascade_rerank(cascade_rr, "q", docs, features, size=size, min_size=k, gap_ratio=gap_ratio)
+            recalls.append(recall_at_k(reference, got, k))
+            full_pairs += full_rr.pairs
+            cascade_pairs += cascade_rr.pairs
+        out[size] = (statistics.fmean(recalls), full_pairs / max(1, cascade_pairs))
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 12, 16, 24, 32, 48])
+    parser.add_argument("--gap-ratio", type=float, default=0.0)
+    parser.add_argument("--noise", type=float, default=0.35)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size, (recall, reduction) in run(args.queries, args.k, args.sizes, args.gap_ratio, args.noise, args.seed).items():
+        print(f"shortlist={size:<3} recall@{args.k}={recall:.3f}  cross-encoder pairs x{reduction:.1f} fewer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Бенчмарк поиска сущностей EntityRegistry: hit-rate и задержка по уровням
+совпадения (точное / частичное / нечёткое) на фиксированном наборе вопросов.
+
+Реестр строится построителем графа (collect_fragments, алиасы
+_generate_aliases) из --export (по умолчанию export.json в корне репозитория),
+плюс --extra синтетических алиасов для проверки масштаба. Набор вопросов (FIXTURE)
+— написание как в запросах пользователей: опечатки, транслитерация,
+перестановки букв; ожидаемый slug или None для вопросов без сущности.
+
+    python -m scripts.bench_entity_lookup --extra 0 20000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+from app.graph.builder import apply_fragment, collect_fragments
+from app.graph.store import GraphStore
+from app.rag.entities import EntityRegistry
+from app.rag.search_types import Entity, EntityType
+from app.schemas.export import ExportPayload
+
+EXPORT = Path(__file__).resolve().parents[3] / "export.json"
+
+FIXTURE: List[Tuple[str, str | None]] = [
+    ("python", "python"),
+    ("Расскажи про FastAPI", "fastapi"),
+    ("опыт с постгрес", "postgresql"),
+    ("langchian", "langchain"),
+    ("что делал на лангчейн", "langchain"),
+    ("лангграф", "langgraph"),
+    ("докер", "docker"),
+    ("pyhton", "python"),
+    ("реакт", "react"),
+    ("редис", "redis"),
+    ("монго", "mongodb"),
+    ("кафка", "kafka"),
+    ("селери", "celery"),
+    ("гигачейн", "gigachain"),
+    ("fastapy", "fastapi"),
+    ("pydantik", "pydantic"),
+    ("chromdb", "chromadb"),
+    ("rabbitqm", "rabbitmq"),
+    ("sqlalchemi", "sqlalchemy"),
+    ("ALOR", "alor"),
+    ("алор брокер", "alor-broker"),
+    ("скио", "skio"),
+    ("хайперкипер", "hyperkeeper"),
+    ("портфолио", "ai-portfolio"),
+    ("ai-portfollio", "ai-portfolio"),
+    ("react agnet", "react-agent"),
+    ("контакты", None),
+    ("где сейчас работает", None),
+    ("какие проекты", None),
+    ("образование", None),
+    ("kubernetes", None),
+    ("django", None),
+]
+
+
+def _tier(entity: Entity | None) -> str:
+    if entity is None:
+        return "miss"
+    if entity.confidence >= 1.0:
+        return "exact"
+    return "partial" if entity.confidence >= 0.7 else "fuzzy"
+
+
+def _registry(export: Path, extra: int) -> EntityRegistry:
+    payload = ExportPayload.model_validate_json(export.read_text(encoding="utf-8"))
+    store, registry = GraphStore(), EntityRegistry()
+    for fragment in collect_fragments(payload):
+        apply_fragment(fragment, store, registry)
+    rnd = random.Random(0)
+    for i in range(extra):
+        name = "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(6, 12)))
+        registry.register(EntityType.TECHNOLOGY, f"{name}-{i}", name, [f"{name} {i}"])
+    return registry
+
+
+def bench(export: Path, extra: int, repeat: int) -> None:
+    registry = _registry(export, extra)
+    started = time.perf_counter()
+    registry.alias_matcher()
+    compile_ms = (time.perf_counter() - started) * 1000
+    print(f"\n== {len(registry._aliases)} aliases (extra={extra}), compile={compile_ms:.1f} ms ==")
+
+    tiers: Counter[str] = Counter()
+    correct = without_fuzzy = false_hits = 0
+    for text, expected in FIXTURE:
+        entities = registry.extract_entities(text)
+        entity = next((e for e in entities if e.slug == expected), entities[0] if entities else None)
+        tiers[_tier(entity)] += 1
+        if expected is not None and entity is not None and entity.slug == expected:
+            correct += 1
+            without_fuzzy += _tier(entity) != "fuzzy"
+        elif expected is None and entity is not None:
+            false_hits += 1
+        if entity is None or entity.slug != expected:
+            print(f"  {text!r:28} expected={expected!r:20} got={entity and (entity.slug, entity.confidence)}")
+    positives = sum(1 for _, expected in FIXTURE if expected is not None)
+    print(
+        f"hit-rate={correct}/{positives} ({correct / positives:.0%}), "
+        f"без нечёткого {without_fuzzy}/{positives}  false hits={false_hits}  tiers: {dict(tiers)}"
+    )
+
+    for label, fn in (
+        ("find_entity", lambda t: registry.find_entity(t)),
+        ("extract_entities", lambda t: registry.extract_entities(t)),
+    ):
+        times = []
+        for _ in range(repeat):
+            for text, _expected in FIXTURE:
+                started = time.perf_counter()
+                fn(text)
+                times.append((time.perf_counter() - started) * 1e6)
+        times.sort()
+        print(
+            f"{label:<17} p50={statistics.median(times):7.1f} us  "
+            f"p99={times[int(len(times) * 0.99)]:7.1f} us"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--export", type=Path, default=EXPORT)
+    parser.add_argument("--extra", type=int, nargs="+", default=[0, 20_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    for extra in args.extra:
+        bench(args.export, extra, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
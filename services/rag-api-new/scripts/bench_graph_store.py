@@ -0,0 +1,146 @@
+"""
+Бенчмарк GraphStore: CSR-представление против прежнего (dict + списки смежности).
+
+Синтетический граф: узлы четырёх типов, рёбра случайных типов, ~4 ребра на
+узел. Для каждого размера — память (tracemalloc) и время типизированных
+запросов get_outgoing_edges / get_incoming_edges / neighbors_of_type.
+
+    python -m scripts.bench_graph_store --edges 1000 100000 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from app.graph.schema import EdgeType, GraphEdge, GraphNode, NodeType
+from app.graph.store import GraphStore
+
+NODE_TYPES = [NodeType.PROJECT, NodeType.TECHNOLOGY, NodeType.COMPANY, NodeType.ACHIEVEMENT]
+EDGE_TYPES = list(EdgeType)
+
+
+# === Прежняя реализация (до CSR) — для сравнения ===
+
+@dataclass
+class _LegacyNode:
+    id: str
+    type: NodeType
+    name: str
+    slug: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _LegacyEdge:
+    source_id: str
+    target_id: str
+    type: EdgeType
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class _LegacyGraphStore:
+    def __init__(self):
+        self._nodes: Dict[str, _LegacyNode] = {}
+        self._edges: List[_LegacyEdge] = []
+        self._outgoing: Dict[str, List[_LegacyEdge]] = defaultdict(list)
+        self._incoming: Dict[str, List[_LegacyEdge]] = defaultdict(list)
+        self._by_type: Dict[NodeType, List[str]] = defaultdict(list)
+        self._by_slug: Dict[str, str] = {}
+
+    def add_node(self, node) -> None:
+        self._nodes[node.id] = node
+        self._by_type[node.type].append(node.id)
+        self._by_slug[node.slug] = node.id
+
+    def add_edge(self, edge) -> None:
+        self._edges.append(edge)
+        self._outgoing[edge.source_id].append(edge)
+        self._incoming[edge.target_id].append(edge)
+
+    def get_outgoing_edges(self, node_id: str, edge_type: Optional[EdgeType] = None):
+        edges = self._outgoing.get(node_id, [])
+        if edge_type:
+            return [e for e in edges if e.type == edge_type]
+        return list(edges)
+
+    def get_incoming_edges(self, node_id: str, edge_type: Optional[EdgeType] = None):
+        edges = self._incoming.get(node_id, [])
+        if edge_type:
+            return [e for e in edges if e.type == edge_type]
+        return list(edges)
+
+    def neighbors_of_type(self, node_id: str, edge_type: EdgeType, incoming: bool = False):
+        if incoming:
+            return [self._nodes[e.source_id] for e in self.get_incoming_edges(node_id, edge_type)]
+        return [self._nodes[e.target_id] for e in self.get_outgoing_edges(node_id, edge_type)]
+
+
+def _build(store_cls: Callable[[], Any], node_cls, edge_cls, n_nodes: int, n_edges: int, seed: int = 0):
+    rnd = random.Random(seed)
+    store = store_cls()
+    for i in range(n_nodes):
+        t = NODE_TYPES[i % len(NODE_TYPES)]
+        store.add_node(node_cls(f"{t.value}:{i}", t, f"Node {i}", f"n{i}", {"category": f"c{i % 7}"}))
+    ids = [f"{NODE_TYPES[i % len(NODE_TYPES)].value}:{i}" for i in range(n_nodes)]
+    for _ in range(n_edges):
+        store.add_edge(edge_cls(rnd.choice(ids), rnd.choice(ids), rnd.choice(EDGE_TYPES)))
+    if hasattr(store, "stats"):
+        store.get_outgoing_edges(ids[0])  # построить CSR
+        store.get_incoming_edges(ids[0])
+    return store, ids
+
+
+def _measure(fn: Callable[[int], Any], n: int) -> float:
+    times = []
+    for i in range(n):
+        started = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(times)
+
+
+def bench(n_edges: int, queries: int) -> None:
+    n_nodes = max(8, n_edges // 4)
+    print(f"\n== {n_edges} edges, {n_nodes} nodes ==")
+    for name, store_cls, node_cls, edge_cls in (
+        ("legacy", _LegacyGraphStore, _LegacyNode, _LegacyEdge),
+        ("csr", GraphStore, GraphNode, GraphEdge),
+    ):
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        store, ids = _build(store_cls, node_cls, edge_cls, n_nodes, n_edges)
+        build_ms = (time.perf_counter() - started) * 1000
+        mem_mb = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+
+        rnd = random.Random(1)
+        picks = [(rnd.choice(ids), rnd.choice(EDGE_TYPES)) for _ in range(queries)]
+        out_us = _measure(lambda i: store.get_outgoing_edges(*picks[i]), queries)
+        in_us = _measure(lambda i: store.get_incoming_edges(*picks[i]), queries)
+        nb_us = _measure(lambda i: store.neighbors_of_type(*picks[i]), queries)
+        print(
+            f"{name:<7} build={build_ms:9.1f} ms  mem={mem_mb:8.1f} MB  "
+            f"out={out_us:6.2f} us  in={in_us:6.2f} us  neighbors={nb_us:6.2f} us"
+        )
+        del store, ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edges", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    for n in args.edges:
+        bench(n, args.queries)
+
+
+if __name__ == "__main__":
+    main()
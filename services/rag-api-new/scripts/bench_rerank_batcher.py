@@ -0,0 +1,87 @@
+"""
+Бенчмарк micro-batching reranker'а под конкурентной нагрузкой.
+
+По умолчанию cross-encoder моделируется стоимостью вызова
+(фиксированный overhead + время на пару, без GIL — как у torch).
+С --model грузится настоящий CrossEncoder.
+
+    python -m scripts.bench_rerank_batcher --clients 16 --requests 20
+    python -m scripts.bench_rerank_batcher --model BAAI/bge-reranker-base
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+from typing import List
+
+from app.rag.rerank_batcher import MicroBatchReranker
+
+
+class _SimulatedCrossEncoder:
+    def __init__(self, overhead_ms: float, per_pair_ms: float) -> None:
+        self.overhead_s = overhead_ms / 1000
+        self.per_pair_s = per_pair_ms / 1000
+        self._lock = threading.Lock()  # одна модель: вызовы сериализуются
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        with self._lock:
+            time.sleep(self.overhead_s + self.per_pair_s * len(pairs))
+        return [0.0] * len(pairs)
+
+
+def _load(rr, clients: int, requests: int, pairs: int) -> tuple[float, float, float]:
+    rnd = random.Random(0)
+    text = "Проект на FastAPI и LangChain с гибридным поиском. " * 20
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def _client() -> None:
+        for _ in range(requests):
+            batch = [["Какие проекты с RAG?", text[: rnd.randint(200, 1000)]] for _ in range(pairs)]
+            started = time.perf_counter()
+            rr.predict(batch)
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return clients * requests / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--pairs", type=int, default=24, help="пар на запрос (shortlist)")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-pairs", type=int, default=128)
+    parser.add_argument("--overhead-ms", type=float, default=8.0)
+    parser.add_argument("--per-pair-ms", type=float, default=0.6)
+    parser.add_argument("--model", help="настоящий CrossEncoder вместо модели стоимости")
+    args = parser.parse_args()
+
+    if args.model:
+        from sentence_transformers import CrossEncoder
+
+        base = CrossEncoder(args.model, device="cpu")
+    else:
+        base = _SimulatedCrossEncoder(args.overhead_ms, args.per_pair_ms)
+
+    batched = MicroBatchReranker(base, window_ms=args.window_ms, max_pairs=args.max_pairs)
+    for name, rr in (("direct", base), ("micro-batched", batched)):
+        rps, p50, p99 = _load(rr, args.clients, args.requests, args.pairs)
+        print(f"{name:<14} {rps:8.1f} req/s  p50={p50:7.1f} ms  p99={p99:7.1f} ms")
+    print(batched.stats())
+    batched.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Сравнение бэкендов reranker'а: fp32 (torch) против int8 ONNX.
+
+Для каждого вопроса ранжирует один и тот же пул документов обоими бэкендами
+и выводит ранговую корреляцию Спирмена, пересечение top-k и латентность.
+Документы берутся из Chroma-коллекции (--chroma) или из встроенных примеров.
+
+    python -m scripts.bench_reranker_backends --max-tokens 384
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from typing import List
+
+from app.rag.rerank_backends import _CALIBRATION_DOCS, _CALIBRATION_QUERIES, load_reranker_backend, spearman
+
+
+def _docs_from_chroma(limit: int) -> List[str]:
+    from app.deps import chroma_client, settings
+
+    coll = chroma_client().get_or_create_collection(settings().chroma_collection)
+    data = coll.get(include=["documents"], limit=limit)
+    return [d for d in data.get("documents") or [] if d]
+
+
+def _timed_predict(model, pairs) -> tuple[List[float], float]:
+    started = time.perf_counter()
+    scores = [float(s) for s in model.predict(pairs)]
+    return scores, (time.perf_counter() - started) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="BAAI/bge-reranker-base")
+    parser.add_argument("--max-tokens", type=int, default=384)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--chroma", action="store_true", help="документы из Chroma вместо встроенных")
+    parser.add_argument("--limit", type=int, default=64)
+    parser.add_argument("--cache-dir", default=None, help="куда экспортировать ONNX (по умолчанию — временная папка)")
+    args = parser.parse_args()
+
+    docs = _docs_from_chroma(args.limit) if args.chroma else list(_CALIBRATION_DOCS)
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="reranker-onnx-")
+    fp32 = load_reranker_backend("torch", args.model, max_tokens=args.max_tokens, cache_dir=cache_dir)
+    int8 = load_reranker_backend("onnx-int8", args.model, max_tokens=args.max_tokens, cache_dir=cache_dir)
+
+    rhos, overlaps, t_fp32, t_int8 = [], [], [], []
+    for q in _CALIBRATION_QUERIES:
+        pairs = [[q, d] for d in docs]
+        ref, ms_ref = _timed_predict(fp32, pairs)
+        got, ms_got = _timed_predict(int8, pairs)
+        rhos.append(spearman(ref, got))
+        k = min(args.k, len(docs))
+        top_ref = set(sorted(range(len(docs)), key=lambda i: -ref[i])[:k])
+        top_got = set(sorted(range(len(docs)), key=lambda i: -got[i])[:k])
+        overlaps.append(len(top_ref & top_got) / k)
+        t_fp32.append(ms_ref)
+        t_int8.append(ms_got)
+
+    print(f"docs per query: {len(docs)}, queries: {len(_CALIBRATION_QUERIES)}, max_tokens: {args.max_tokens}")
+    print(f"spearman mean={statistics.fmean(rhos):.4f} min={min(rhos):.4f}")
+    print(f"top-{args.k} overlap mean={statistics.fmean(overlaps):.3f}")
+    print(f"latency fp32 torch: {statistics.median(t_fp32):.1f} ms/query, int8 onnx: {statistics.median(t_int8):.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
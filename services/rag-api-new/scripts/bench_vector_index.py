@@ -0,0 +1,90 @@
+"""
+Бенчмарк dense-поиска: in-process VectorIndex против Chroma.
+
+Синтетика (без Chroma):
+    python -m scripts.bench_vector_index --docs 2000 --dim 1024
+
+С живой Chroma (коллекция из настроек, нужен доступ к LiteLLM для эмбеддинга вопроса):
+    python -m scripts.bench_vector_index --chroma --queries 50
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.indexing.vector_index import VectorIndex
+
+WHERE = {"type": {"$in": ["project", "experience_project"]}, "project_id": {"$in": [1, 2, 3]}}
+
+
+def _measure(fn, n: int) -> dict[str, float]:
+    times = []
+    for i in range(n):
+        started = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return {
+        "p50_ms": statistics.median(times),
+        "p95_ms": times[int(len(times) * 0.95) - 1] if len(times) >= 20 else times[-1],
+        "mean_ms": statistics.fmean(times),
+    }
+
+
+def _report(name: str, stats: dict[str, float]) -> None:
+    print(f"{name:<28} " + "  ".join(f"{k}={v:8.3f}" for k, v in stats.items()))
+
+
+def bench_synthetic(docs: int, dim: int, queries: int, k: int) -> None:
+    rnd = np.random.default_rng(0)
+    vectors = rnd.normal(size=(docs, dim)).astype(np.float32)
+    types = ["project", "experience_project", "technology", "experience"]
+    metas = [{"type": types[i % 4], "project_id": i % 20} for i in range(docs)]
+    index = VectorIndex()
+    started = time.perf_counter()
+    index.upsert([f"doc:{i}" for i in range(docs)], vectors, [""] * docs, metas)
+    print(f"build: {docs} x {dim} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    qs = rnd.normal(size=(queries, dim)).astype(np.float32)
+    _report("local top-k", _measure(lambda i: index.search(qs[i], k), queries))
+    _report("local top-k + prefilter", _measure(lambda i: index.search(qs[i], k, where=WHERE), queries))
+
+
+def bench_chroma(queries: int, k: int) -> None:
+    from app.deps import embeddings, settings, vectorstore
+    from app.indexing import vector_index
+    from app.indexing.vector_persistence import vectors_sync_from_chroma
+
+    coll = settings().chroma_collection
+    vs = vectorstore(coll)
+    n = vectors_sync_from_chroma(coll, vs)
+    index = vector_index.get_index(coll)
+    print(f"synced {n} docs from Chroma collection {coll!r}")
+    q = embeddings().embed_query("Какие проекты с RAG и FastAPI?")
+
+    _report("chroma top-k", _measure(lambda _: vs.similarity_search_by_vector(q, k=k), queries))
+    _report("local top-k", _measure(lambda _: index.search(q, k), queries))
+    _report("chroma top-k + filter", _measure(lambda _: vs.similarity_search_by_vector(q, k=k, filter=WHERE), queries))
+    _report("local top-k + prefilter", _measure(lambda _: index.search(q, k, where=WHERE), queries))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--chroma", action="store_true", help="сравнить с живой Chroma")
+    args = parser.parse_args()
+
+    if args.chroma:
+        bench_chroma(args.queries, args.k)
+    else:
+        bench_synthetic(args.docs, args.dim, args.queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
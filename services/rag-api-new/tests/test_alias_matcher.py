@@ -0,0 +1,134 @@
+"""
+Тесты для AliasMatcher (app/rag/alias_matcher.py), FuzzyIndex (app/rag/fuzzy.py)
+и поиска сущностей EntityRegistry.
+"""
+from __future__ import annotations
+
+import random
+import re
+
+import pytest
+
+from app.rag.entities import EntityRegistry
+from app.rag.fuzzy import fuzzy_confidence, osa_distance
+from app.rag.search_types import EntityType
+
+
+def _find_by_scan(registry: EntityRegistry, text: str):
+    """find_entity перебором: точное совпадение, затем перебор алиасов, затем нечёткое."""
+    key = text.lower().strip()
+    if not key:
+        return None
+    if key in registry._aliases:
+        return (*registry._aliases[key], 1.0)
+    for alias, canonical in registry._aliases.items():
+        if len(alias) >= 3 and len(key) >= 3 and (key in alias or alias in key):
+            return (*canonical, 0.7)
+    hit = registry.alias_matcher().fuzzy(key)
+    if hit is not None:
+        rank, distance = hit
+        return (*registry._aliases[registry.alias_matcher().aliases[rank]], fuzzy_confidence(distance, len(key)))
+    return None
+
+
+def _extract_by_scan(registry: EntityRegistry, question: str):
+    words = re.findall(r"[a-zA-Zа-яА-ЯёЁ0-9\-\.]+", question.lower())
+    keys = [w for w in words if len(w) >= 2] + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    found, seen = [], set()
+    for key in keys:
+        hit = _find_by_scan(registry, key)
+        if hit and hit[1] not in seen:
+            found.append(hit)
+            seen.add(hit[1])
+    return found
+
+
+def _as_tuple(entity):
+    return None if entity is None else (entity.type, entity.slug, entity.name, entity.confidence)
+
+
+class TestAliasMatcher:
+    """Тесты для AliasMatcher."""
+
+    def test_extract_entities(self):
+        """Алиасы внутри слов, через границу биграммы и слово внутри алиаса."""
+        registry = EntityRegistry()
+        registry.register(EntityType.PROJECT, "ai-portfolio", "AI-Portfolio", ["ai portfolio"])
+        registry.register(EntityType.TECHNOLOGY, "postgresql", "PostgreSQL", ["postgres"])
+        registry.register(EntityType.TECHNOLOGY, "go", "Go", [])
+
+        entities = registry.extract_entities("Где в ai portfolio используется postgre и go?")
+        assert [(e.slug, e.confidence) for e in entities] == [
+            ("ai-portfolio", 0.7), ("postgresql", 0.7), ("go", 1.0),
+        ]
+        assert _as_tuple(registry.find_entity("ai-portfolio-v2")) == (
+            EntityType.PROJECT, "ai-portfolio", "AI-Portfolio", 0.7,
+        )
+        assert registry.find_entity("go") is not None and registry.find_entity("gol") is None
+
+    def test_matches_alias_scan(self):
+        """Результаты совпадают с перебором алиасов, в том числе после изменений реестра."""
+        rnd = random.Random(0)
+
+        def word() -> str:
+            return "".join(rnd.choice("abcdeo -.") for _ in range(rnd.randint(1, 7))).strip() or "x"
+
+        for _ in range(100):
+            registry = EntityRegistry()
+            entries = [
+                (rnd.choice(list(EntityType)), f"{word()}{i % 5}", word(), [word() for _ in range(rnd.randint(0, 3))])
+                for i in range(rnd.randint(0, 20))
+            ]
+            for entry in entries:
+                registry.register(*entry)
+            if entries and rnd.random() < 0.5:
+                registry.extract_entities("warm")
+                registry.unregister(*rnd.choice(entries))
+            for _ in range(10):
+                question = " ".join(word() for _ in range(rnd.randint(0, 8)))
+                assert [_as_tuple(e) for e in registry.extract_entities(question)] == _extract_by_scan(registry, question)
+                assert _as_tuple(registry.find_entity(question)) == _find_by_scan(registry, question)
+
+
+class TestFuzzyLookup:
+    """Тесты для нечёткого поиска сущностей."""
+
+    def test_typos_and_transliteration(self):
+        """Опечатки и кириллическая транслитерация находятся с confidence ниже частичного."""
+        registry = EntityRegistry()
+        registry.register(EntityType.TECHNOLOGY, "postgresql", "PostgreSQL", ["postgres"])
+        registry.register(EntityType.TECHNOLOGY, "langchain", "LangChain", [])
+        registry.register(EntityType.TECHNOLOGY, "django", "Django", [])
+
+        for text, slug in [("постгрес", "postgresql"), ("langchian", "langchain"), ("джанго", "django")]:
+            entity = registry.find_entity(text)
+            assert entity is not None and entity.slug == slug
+            assert 0 < entity.confidence < 0.7
+        assert registry.find_entity("постгрес").confidence > registry.find_entity("langchian").confidence
+        for text in ["проекты", "zangchain", "mongo", "postgis"]:
+            assert registry.find_entity(text) is None, text
+
+    def test_prefix_of_builder_alias(self):
+        """Транслитерированное начало названия находится по алиасам построителя графа."""
+        pytest.importorskip("pydantic")
+        from app.graph.builder import _generate_aliases
+
+        registry = EntityRegistry()
+        for slug, name in [("postgresql", "PostgreSQL"), ("mongodb", "MongoDB"), ("django", "Django")]:
+            registry.register(EntityType.TECHNOLOGY, slug, name, _generate_aliases(name))
+
+        for text, slug in [("постгрес", "postgresql"), ("монго", "mongodb"), ("джанго", "django")]:
+            entity = registry.find_entity(text)
+            assert entity is not None and entity.slug == slug, text
+            assert 0 < entity.confidence < 0.7
+        assert [e.slug for e in registry.extract_entities("опыт с постгрес")] == ["postgresql"]
+        # недописано больше max_distance + 1 символов, короткий ключ — не совпадение
+        for text in ["постг", "джан", "мон"]:
+            assert registry.find_entity(text) is None, text
+
+    def test_osa_distance(self):
+        """OSA: перестановка соседних символов — одна правка, превышение порога — bound + 1."""
+        assert osa_distance("langchian", "langchain", 2) == 1
+        assert osa_distance("postgres", "postgresql", 2) == 2
+        assert osa_distance("abcdef", "badcfe", 2) == 3
+        assert osa_distance("django", "django", 0) == 0
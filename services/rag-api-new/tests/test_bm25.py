@@ -0,0 +1,225 @@
+"""
+Тесты для инкрементального BM25-индекса (app/indexing/bm25.py).
+"""
+from __future__ import annotations
+
+import zlib
+
+import pytest
+
+from app.indexing import bm25
+from app.indexing.bm25 import _CollectionIndex, _tokenize
+from app.indexing.persistence import (
+    _HEADER,
+    MAGIC,
+    bm25_try_load,
+    bm25_try_save,
+    decode_index,
+    encode_index,
+)
+
+CORPUS = {
+    "project:1": "AI-Portfolio: RAG ассистент на FastAPI, LangChain и ChromaDB",
+    "project:2": "ReAct-Agent на LangGraph с памятью и инструментами",
+    "project:3": "Торговый терминал для брокера на C# и PostgreSQL",
+    "technology:1": "Python — основной язык, FastAPI и asyncio",
+    "technology:2": "PostgreSQL: индексы, репликация, оптимизация запросов",
+    "experience:1": "ALOR Broker: разработка backend на Python и C#",
+}
+
+QUERIES = [
+    "FastAPI",
+    "python fastapi",
+    "PostgreSQL брокер",
+    "RAG LangChain ChromaDB",
+    "неизвестное слово",
+]
+
+
+def _scores(index: _CollectionIndex, query: str) -> dict[str, float]:
+    return dict(index.search(query, k=len(index) or 1))
+
+
+class TestCollectionIndex:
+    """Тесты для _CollectionIndex."""
+
+    def test_incremental_matches_fresh_build(self):
+        """Индекс после add/delete совпадает с построенным с нуля."""
+        incremental = _CollectionIndex()
+        incremental.add_many(list(CORPUS.items()))
+        incremental.add_many([("project:9", "временный документ про Python")])
+        incremental.delete_many(["project:9", "project:2"])
+        incremental.add_many([("project:2", CORPUS["project:2"])])
+
+        fresh = _CollectionIndex()
+        fresh.add_many(list(CORPUS.items()))
+
+        for q in QUERIES:
+            got = _scores(incremental, q)
+            expected = _scores(fresh, q)
+            assert got.keys() == expected.keys()
+            for did, score in expected.items():
+                assert got[did] == pytest.approx(score)
+
+    def test_readd_replaces_document(self):
+        """Повторное добавление id заменяет текст, а не дублирует документ."""
+        index = _CollectionIndex()
+        index.add_many([("doc:1", "python fastapi"), ("doc:2", "docker"), ("doc:3", "redis")])
+        index.add_many([("doc:1", "postgresql")])
+
+        assert len(index) == 3
+        assert "doc:1" not in _scores(index, "python")
+        assert _scores(index, "postgresql")["doc:1"] > 0.0
+
+    def test_empty_index_and_query(self):
+        """Пустой индекс и пустой запрос возвращают пустой список."""
+        index = _CollectionIndex()
+        assert index.search("python") == []
+        index.add_many([("doc:1", "python")])
+        assert index.search("") == []
+
+    def test_pruned_top_k_matches_exhaustive(self):
+        """Top-k с MaxScore-отсечением совпадает с полным ранжированием."""
+        import random
+
+        rnd = random.Random(42)
+        vocab = [f"term{i}" for i in range(60)]
+        index = _CollectionIndex()
+        index.add_many([
+            (f"doc:{i}", " ".join(rnd.choices(vocab, k=rnd.randint(3, 40))))
+            for i in range(300)
+        ])
+
+        for _ in range(20):
+            q = " ".join(rnd.sample(vocab, 4))
+            full = index.search(q, k=len(index))
+            top = index.search(q, k=5)
+            assert [s for _, s in top] == pytest.approx([s for _, s in full[:5]])
+
+    def test_non_matching_docs_are_skipped(self):
+        """Документы без терминов запроса не попадают в выдачу."""
+        index = _CollectionIndex()
+        index.add_many(list(CORPUS.items()))
+        hits = index.search("LangGraph", k=10)
+        assert [did for did, _ in hits] == ["project:2"]
+
+    def test_matches_rank_bm25(self):
+        """Скоры совпадают с rank_bm25.BM25Okapi."""
+        rank_bm25 = pytest.importorskip("rank_bm25")
+        ids = list(CORPUS.keys())
+        reference = rank_bm25.BM25Okapi([_tokenize(CORPUS[i]) for i in ids])
+
+        index = _CollectionIndex()
+        index.add_many(list(CORPUS.items()))
+
+        for q in QUERIES:
+            expected = dict(zip(ids, reference.get_scores(_tokenize(q))))
+            got = _scores(index, q)
+            for did, score in expected.items():
+                if score > 0:
+                    assert got[did] == pytest.approx(float(score), rel=1e-6)
+
+
+class TestModuleApi:
+    """Тесты для модульного API bm25."""
+
+    def setup_method(self):
+        bm25.reset("test")
+
+    def teardown_method(self):
+        bm25.reset("test")
+
+    def test_add_search_delete(self):
+        """add_texts / search / delete_ids / snapshot (doc_id -> текст) / doc_ids."""
+        bm25.add_texts("test", list(CORPUS.keys()), list(CORPUS.values()))
+        hits = bm25.search("test", "PostgreSQL", k=2)
+        assert {did for did, _ in hits} == {"project:3", "technology:2"}
+
+        bm25.delete_ids("test", ["technology:2"])
+        hits = bm25.search("test", "PostgreSQL", k=1)
+        assert hits[0][0] == "project:3"
+        assert bm25.snapshot("test") == {k: v for k, v in CORPUS.items() if k != "technology:2"}
+        assert sorted(bm25.doc_ids("test")) == sorted(k for k in CORPUS if k != "technology:2")
+
+
+class TestSnapshot:
+    """Тесты для бинарного снапшота BM25 (app/indexing/persistence.py)."""
+
+    def setup_method(self):
+        bm25.reset("test")
+
+    def teardown_method(self):
+        bm25.reset("test")
+
+    def _index(self) -> _CollectionIndex:
+        index = _CollectionIndex()
+        index.add_many(list(CORPUS.items()))
+        index.delete_many(["project:2"])
+        return index
+
+    def test_roundtrip_preserves_scores(self):
+        """Индекс из снапшота даёт те же скоры, что исходный."""
+        original = self._index()
+        restored = decode_index(encode_index(original))
+
+        assert sorted(restored.doc_ids()) == sorted(original.doc_ids())
+        for q in QUERIES:
+            assert _scores(restored, q) == pytest.approx(_scores(original, q))
+
+    def test_texts_roundtrip(self):
+        """snapshot() отдаёт тексты документов снапшота (из mmap) и добавленных после него."""
+        restored = decode_index(encode_index(self._index()))
+        expected = {k: v for k, v in CORPUS.items() if k != "project:2"}
+        assert restored.snapshot() == expected
+
+        restored.delete_many(["technology:2"])
+        restored.add_many([("project:2", "ReAct"), ("project:1", "PostgreSQL")])
+        expected = {**expected, "project:2": "ReAct", "project:1": "PostgreSQL"}
+        del expected["technology:2"]
+        assert restored.snapshot() == expected
+        assert decode_index(encode_index(restored)).snapshot() == expected
+
+    def test_reads_version_1(self):
+        """Снапшот первой версии (без текстов) читается: поиск тот же, тексты пустые."""
+        original = self._index()
+        data = encode_index(original)
+        _magic, _version, n_docs, n_terms, n_postings, body_len, _crc = _HEADER.unpack_from(data, 0)
+        texts = original.snapshot()
+        text_section = 4 * (n_docs + 1) + sum(len(t.encode("utf-8")) for t in texts.values())
+        body = data[_HEADER.size:len(data) - text_section]
+        v1 = _HEADER.pack(MAGIC, 1, n_docs, n_terms, n_postings, len(body), zlib.crc32(body)) + body
+
+        restored = decode_index(v1)
+        for q in QUERIES:
+            assert _scores(restored, q) == pytest.approx(_scores(original, q))
+        assert restored.snapshot() == {k: "" for k in texts}
+
+    def test_updates_after_load(self):
+        """Индекс из снапшота поддерживает инкрементальные изменения."""
+        restored = decode_index(encode_index(self._index()))
+        restored.delete_many(["technology:2"])
+        restored.add_many([("project:2", CORPUS["project:2"]), ("project:1", "PostgreSQL")])
+
+        fresh = _CollectionIndex()
+        fresh.add_many([(k, v) for k, v in CORPUS.items() if k != "technology:2"])
+        fresh.add_many([("project:1", "PostgreSQL")])
+        for q in QUERIES + ["LangGraph", "PostgreSQL"]:
+            assert _scores(restored, q) == pytest.approx(_scores(fresh, q))
+
+    def test_checksum_mismatch_rejected(self):
+        """Повреждённый снапшот не загружается."""
+        data = bytearray(encode_index(self._index()))
+        data[-1] ^= 0xFF
+        with pytest.raises(ValueError):
+            decode_index(bytes(data))
+
+    def test_save_and_load_from_data_dir(self, tmp_path):
+        """bm25_try_save / bm25_try_load через mmap-файл в data_dir."""
+        bm25.add_texts("test", list(CORPUS.keys()), list(CORPUS.values()))
+        expected = bm25.search("test", "python fastapi")
+        bm25_try_save("test", data_dir=tmp_path)
+        assert (tmp_path / "bm25" / "test.bin").exists()
+
+        bm25.reset("test")
+        assert bm25_try_load("test", data_dir=tmp_path) is True
+        assert bm25.search("test", "python fastapi") == pytest.approx(expected)
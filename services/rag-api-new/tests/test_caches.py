@@ -0,0 +1,110 @@
+"""
+Тесты для кэшей процесса (app/utils/cache.py и обёрток над ним).
+"""
+from __future__ import annotations
+
+import pytest
+
+from app.utils.cache import TTLCache
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache:
+    """Тесты для TTLCache."""
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованная запись."""
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+
+    def test_ttl_expiry_and_counters(self):
+        """Просроченные записи считаются промахом; hits/misses в stats()."""
+        clock = _Clock()
+        cache = TTLCache(maxsize=8, ttl_s=10, clock=clock)
+        cache.set("q", [0.1])
+        assert cache.get("q") == [0.1]
+        clock.now = 11
+        assert cache.get("q") is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 0)
+
+
+class TestCachedEmbeddings:
+    """Тесты для CachedEmbeddings."""
+
+    def test_embeds_normalized_query_once(self):
+        """Повторный и отличающийся пробелами вопрос не эмбеддятся заново."""
+        pytest.importorskip("langchain_core")
+        from app.rag.embedding_cache import CachedEmbeddings
+
+        calls: list[str] = []
+
+        class _Base:
+            def embed_query(self, text):
+                calls.append(text)
+                return [float(len(text))]
+
+            def embed_documents(self, texts):
+                return [[0.0] for _ in texts]
+
+        emb = CachedEmbeddings(_Base(), model="m", maxsize=4)
+        assert emb.embed_query("Какие  проекты\nна Python? ") == emb.embed_query("Какие проекты на Python?")
+        assert calls == ["Какие проекты на Python?"]
+        assert emb.cache.stats()["hits"] == 1
+
+
+class TestCachedReranker:
+    """Тесты для CachedReranker и rerank()."""
+
+    def test_only_misses_are_predicted(self):
+        """Повторный вопрос не пересчитывается, изменённый content_hash — пересчитывается; в модель уходит ключевой вопрос."""
+        from app.rag.rank import rerank
+        from app.rag.rerank_cache import CachedReranker
+        from app.rag.types import Doc
+
+        calls: list[list[list[str]]] = []
+
+        class _CrossEncoder:
+            def predict(self, pairs):
+                calls.append(pairs)
+                return [float(len(text)) for _, text in pairs]
+
+        rr = CachedReranker(_CrossEncoder(), model="m")
+        docs = [Doc("python", {"content_hash": "h1"}), Doc("fastapi", {"content_hash": "h2"})]
+        first = rerank(rr, "  стек? ", docs)
+        second = rerank(rr, "стек?", docs)
+        assert [(sd.doc, sd.score) for sd in first] == [(sd.doc, sd.score) for sd in second]
+        assert calls == [[["стек?", "python"], ["стек?", "fastapi"]]]
+
+        rerank(rr, "стек?", [Doc("python 3.12", {"content_hash": "h1-new"}), docs[1]])
+        assert calls[-1] == [["стек?", "python 3.12"]]
+        stats = rr.stats()
+        assert (stats["hits"], stats["misses"]) == (3, 3)
+
+
+class TestSearchCacheKey:
+    """Тесты для ключа кэша результатов поиска."""
+
+    def test_key_follows_params_and_index_version(self):
+        """Ключ не зависит от пробелов и порядка фильтров, но меняется с версией индексов."""
+        from app.indexing.version import bump_index_version
+        from app.rag.search_cache import search_cache_key
+
+        a = search_cache_key("Где  FastAPI?", 8, "c", ["project", "technology"], {"tags_any": ["rag"], "company_slug": "alor"})
+        b = search_cache_key(" Где FastAPI?", 8, "c", {"technology", "project"}, {"company_slug": "alor", "tags_any": ["rag"]})
+        assert a == b
+        assert a != search_cache_key("Где FastAPI?", 8, "c", ["project"], {"company_slug": "alor", "tags_any": ["rag"]})
+        bump_index_version()
+        assert a != search_cache_key("Где FastAPI?", 8, "c", ["project", "technology"], {"tags_any": ["rag"], "company_slug": "alor"})
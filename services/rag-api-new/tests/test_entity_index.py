@@ -0,0 +1,197 @@
+"""
+Тесты для EntityIndex (app/indexing/entity_index.py).
+"""
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any
+
+from app.indexing import entity_index
+from app.indexing.entity_index import EntityIndex, match_values, token_matches
+
+DOCS = [
+    ("project:1", "AI-Portfolio: RAG ассистент на FastAPI и LangChain", {"slug": "ai-portfolio", "name": "AI-Portfolio", "technologies_csv": "python,fastapi,langchain", "content_hash": "h1"}),
+    ("project:2", "ReAct-Agent на LangGraph", {"slug": "react-agent", "name": "ReAct Agent", "tags": '["agents", "llm"]', "content_hash": "h2"}),
+    ("technology:1", "Go — язык для сервисов", {"slug": "go", "name": "Go", "content_hash": "h3"}),
+    ("technology:2", "Google Cloud, GoLand IDE", {"slug": "gcp", "name": "Google Cloud", "content_hash": "h4"}),
+    ("experience:1", "ALOR Broker: backend на C# и PostgreSQL", {"company_slug": "alor", "ref_id": 1, "project_names_csv": "Терминал", "content_hash": "h5"}),
+    ("experience:2", "", {"company_slug": "", "content_hash": "h6"}),
+]
+
+TOKEN_SETS = [
+    {"go"},
+    {"fastapi", "FastAPI".lower()},
+    {"alor", "alor broker"},
+    {"react-agent", "react agent"},
+    {"c#"},
+    {"1"},
+    {"терминал", "google cloud"},
+    {""},
+]
+
+
+def _reference_match(text: str, md: dict[str, Any], tokens: set[str]) -> bool:
+    """Построчная проверка из прежнего _apply_entity_filter (matches_entity_ext)."""
+
+    def _token_match(t: str, token: str) -> bool:
+        token = (token or "").strip().lower()
+        if not token:
+            return False
+        tl = (t or "").lower()
+        if not tl:
+            return False
+        if len(token) <= 3 and token.isalnum():
+            return re.search(rf"(?<![\w-]){re.escape(token)}(?![\w-])", tl) is not None
+        return token in tl
+
+    def _value_matches(val: Any) -> bool:
+        if val is None:
+            return False
+        if isinstance(val, (list, tuple, set)):
+            return any(_value_matches(v) for v in val)
+        if not isinstance(val, str):
+            val = str(val)
+        val_lower = val.lower()
+        if val_lower in tokens:
+            return True
+        return any(_token_match(val_lower, tok) for tok in tokens)
+
+    for key in entity_index.ENTITY_MATCH_KEYS:
+        if _value_matches(md.get(key)):
+            return True
+    return _value_matches(text or "")
+
+
+def _texts(ids: list[str]) -> dict[str, str]:
+    """Источник текстов документов (как Chroma)."""
+    texts = {did: text for did, text, _ in DOCS}
+    return {did: texts[did] for did in ids if did in texts}
+
+
+class TestEntityIndex:
+    """Тесты для EntityIndex."""
+
+    def test_postings_match_per_document_scan(self):
+        """Множества doc_id из индекса совпадают с построчной проверкой."""
+        index = EntityIndex(_texts)
+        index.add_documents(DOCS)
+        for tokens in TOKEN_SETS:
+            expected = {did for did, text, md in DOCS if _reference_match(text, md, tokens)}
+            assert index.matching(tokens) == expected, tokens
+            for did, text, md in DOCS:
+                values = match_values(md, text)
+                assert any(token_matches(values, t) for t in tokens) == (did in expected)
+
+    def test_updates_and_staleness(self):
+        """Переиндексация документа обновляет postings, is_current сверяет content_hash."""
+        index = EntityIndex(_texts)
+        index.add_documents(DOCS)
+        assert "technology:1" in index.matching({"go"})
+
+        index.add_documents([("technology:1", "Rust", {"slug": "rust", "content_hash": "h3-new"})])
+        assert "technology:1" not in index.matching({"go"})
+        assert index.is_current("technology:1", "h3-new")
+        assert not index.is_current("technology:1", "h3")
+
+        index.delete(["project:1"])
+        assert "project:1" not in index.matching({"fastapi"})
+
+    def test_snapshot_roundtrip(self, tmp_path, monkeypatch):
+        """Снапшот без текстов и postings; postings досчитываются по текстам из источника."""
+        fetched: list[list[str]] = []
+
+        def source(collection):
+            def fetch(ids):
+                fetched.append(ids)
+                return _texts(ids) | {"project:3": "Сервис на Go"}
+            return fetch
+
+        monkeypatch.setattr(entity_index, "_chroma_texts", source)
+        entity_index.reset("test")
+        try:
+            entity_index.add_documents("test", *map(list, zip(*DOCS)))
+            index = entity_index.get_index("test")
+            index.ensure_tokens(["go", "alor", "langchain"])
+            fetched.clear()
+            index.add_documents([("project:3", "Сервис на Go", {"slug": "svc", "content_hash": "h7"})])
+            before = index.matching({"go", "alor", "langchain"})
+            assert "project:3" in before
+            assert fetched == []  # postings известных токенов обновлены при инжесте
+            entity_index.entities_try_save("test", data_dir=tmp_path)
+
+            saved = (tmp_path / "entities" / "test.json").read_text(encoding="utf-8")
+            assert "postings" not in saved
+            assert "ассистент" not in saved
+
+            entity_index.reset("test")
+            assert entity_index.entities_try_load("test", data_dir=tmp_path) is True
+            assert entity_index.get_index("test").matching({"go", "alor", "langchain"}) == before
+            assert len(fetched) == 1
+        finally:
+            entity_index.reset("test")
+
+    def test_text_source_failure(self):
+        """Без текстов postings новых токенов не строятся: matching() -> None (построчная проверка)."""
+
+        def broken(ids):
+            raise ConnectionError("chroma is down")
+
+        index = EntityIndex(broken)
+        assert index.matching({"fastapi"}) == set()  # пустой индекс тексты не читает
+        index.add_documents(DOCS[:1])
+        assert index.matching({"fastapi"}) == {"project:1"}  # известный токен — при инжесте
+        assert index.matching({"langchain"}) is None
+        assert EntityIndex().matching({"fastapi"}) == set()
+
+    def test_texts_fetched_outside_lock(self):
+        """Тексты читаются вне блокировки; изменённый за время чтения документ дочитывается."""
+        fetched: list[list[str]] = []
+        index = EntityIndex()
+
+        def source(ids):
+            fetched.append(sorted(ids))
+            if len(fetched) == 1:
+                # инжест во время чтения: индекс не заблокирован на время обращения к Chroma
+                writer = threading.Thread(target=index.add_documents, args=(
+                    [("technology:1", "Rust", {"slug": "rust", "content_hash": "h3-new"})],
+                ))
+                writer.start()
+                writer.join(timeout=5)
+                assert not writer.is_alive()
+                return _texts(ids)
+            return {did: "Rust" for did in ids}
+
+        index._texts = source
+        index.add_documents(DOCS)
+        index._postings.clear()  # как после восстановления из снапшота
+
+        assert index.ensure_tokens(["go", "fastapi", "rust"]) is True
+        assert fetched == [sorted(did for did, _, _ in DOCS), ["technology:1"]]
+        assert index.matching({"go"}) == set()
+        assert index.matching({"rust"}) == {"technology:1"}
+        assert index.matching({"fastapi"}) == {"project:1"}
+        assert len(fetched) == 2
+
+    def test_ensure_tokens_all(self, monkeypatch):
+        """Warm start строит postings всех токенов во всех индексах одним чтением текстов на индекс."""
+        fetched: list[str] = []
+
+        def source(collection):
+            def fetch(ids):
+                fetched.append(collection)
+                return _texts(ids)
+            return fetch
+
+        monkeypatch.setattr(entity_index, "_chroma_texts", source)
+        try:
+            for collection in ("a", "b"):
+                entity_index.add_documents(collection, *map(list, zip(*DOCS)))
+            tokens = set().union(*TOKEN_SETS)
+            assert entity_index.ensure_tokens_all(tokens) is True
+            assert sorted(fetched) == ["a", "b"]
+            assert entity_index.get_index("a").matching({"go"}) == {"technology:1"}
+            assert sorted(fetched) == ["a", "b"]
+        finally:
+            entity_index.reset("a")
+            entity_index.reset("b")
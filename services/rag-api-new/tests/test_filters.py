@@ -0,0 +1,127 @@
+"""
+Тесты для компилятора фильтров (app/rag/filters.py) и MetadataIndex.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from app.indexing import bm25, metadata_index
+from app.indexing.metadata_index import MetadataIndex
+from app.rag.filters import compile_filters
+
+COLLECTION = "test_filters"
+
+DOCS = {
+    "technology:1": ("Python — основной язык, FastAPI", {"type": "technology", "category": "Language", "name": "Python"}),
+    "technology:2": ("PostgreSQL: индексы и репликация", {"type": "technology", "category": "database", "name": "PostgreSQL"}),
+    "technology:3": ("FastAPI фреймворк", {"type": "technology", "name": "FastAPI"}),
+    "project:1": ("AI-Portfolio: RAG на FastAPI и LangChain", {"type": "project", "slug": "ai-portfolio", "tags": "rag,llm"}),
+    "project:2": ("Торговый терминал на C# и PostgreSQL", {"type": "project", "slug": "terminal", "company_slug": "alor", "tags": ""}),
+    "experience:1": ("ALOR Broker: backend на Python", {"type": "experience", "company_name": "ALOR Broker"}),
+    "experience:2": ("Фриланс: боты на Python", {"type": "experience", "company_slug": "freelance", "tags": "bots"}),
+}
+
+FILTER_SETS = [
+    {"tech_category": "language"},
+    {"tech_category": "DATABASE"},
+    {"tech_category": "ml_framework"},
+    {"company_slug": "alor"},
+    {"company_id": "alor broker"},
+    {"project_slug": "portfolio"},
+    {"tags_any": ["RAG"]},
+    {"tags_any": ["devops"], "company_slug": "alor"},
+    {"tech_category": "language", "project_id": "python"},
+]
+
+
+def _reference_matches(md: dict[str, Any], filters: dict[str, Any]) -> bool:
+    """Построчная проверка из прежнего _apply_metadata_filters."""
+    tech_category = filters.get("tech_category")
+    company_slug = filters.get("company_slug") or filters.get("company_id")
+    project_slug = filters.get("project_slug") or filters.get("project_id")
+    tags_any = filters.get("tags_any", [])
+    if tech_category:
+        doc_category = (md.get("category") or "").lower()
+        if doc_category != tech_category.lower():
+            if md.get("type", "") == "technology":
+                return False
+    if company_slug:
+        slug_lower = company_slug.lower()
+        doc_company = (md.get("company_slug") or md.get("company_name") or "").lower()
+        if slug_lower not in doc_company and doc_company not in slug_lower:
+            return False
+    if project_slug:
+        slug_lower = project_slug.lower()
+        doc_project = (md.get("project_slug") or md.get("slug") or md.get("name") or "").lower()
+        if slug_lower not in doc_project and doc_project not in slug_lower:
+            return False
+    if tags_any:
+        doc_tags = md.get("tags", [])
+        if isinstance(doc_tags, str):
+            doc_tags = [t.strip() for t in doc_tags.split(",")]
+        if not {t.lower() for t in doc_tags} & {t.lower() for t in tags_any} and doc_tags:
+            return False
+    return True
+
+
+@pytest.fixture
+def indexed():
+    ids = list(DOCS)
+    bm25.add_texts(COLLECTION, ids, [DOCS[i][0] for i in ids])
+    metadata_index.add_documents(COLLECTION, ids, [DOCS[i][1] for i in ids])
+    yield
+    bm25.reset(COLLECTION)
+    metadata_index.reset(COLLECTION)
+
+
+class TestCompileFilters:
+    """Тесты для compile_filters."""
+
+    def test_same_semantics_as_per_document_filter(self, indexed):
+        """matches и candidate_ids совпадают с прежней построчной проверкой."""
+        for filters in FILTER_SETS:
+            compiled = compile_filters(filters, COLLECTION)
+            expected = {did for did, (_, md) in DOCS.items() if _reference_matches(md, filters)}
+            assert {did for did, (_, md) in DOCS.items() if compiled.matches(md)} == expected, filters
+            assert compiled.candidate_ids == expected, filters
+
+    def test_where_selects_tech_category_subset(self, indexed):
+        """where для tech_category отбирает ровно документы, прошедшие фильтр категории."""
+        np = pytest.importorskip("numpy")
+        from app.indexing.vector_index import VectorIndex
+
+        ids = list(DOCS)
+        index = VectorIndex()
+        index.upsert(ids, np.eye(len(ids), dtype=np.float32), [DOCS[i][0] for i in ids], [DOCS[i][1] for i in ids])
+        for tc in ("language", "DATABASE", "ml_framework"):
+            compiled = compile_filters({"tech_category": tc}, COLLECTION)
+            hits = index.search(np.zeros(len(ids), dtype=np.float32), len(ids), where=compiled.where)
+            got = {did for did, (text, _) in DOCS.items() if text in {d.page_content for d, _ in hits}}
+            assert got == {did for did, (_, md) in DOCS.items() if _reference_matches(md, {"tech_category": tc})}
+
+        # документ без type в Chroma не выразить — where не строится, остаётся candidate_ids
+        metadata_index.add_documents(COLLECTION, ["note:1"], [{"name": "заметка"}])
+        bm25.add_texts(COLLECTION, ["note:1"], ["заметка"])
+        compiled = compile_filters({"tech_category": "language"}, COLLECTION)
+        assert compiled.where is None and "note:1" in compiled.candidate_ids
+
+    def test_bm25_candidates_keep_scores(self, indexed):
+        """BM25 с allowed_ids — тот же ранжированный список, что и пост-фильтрация полного."""
+        allowed = {"technology:1", "experience:1", "experience:2"}
+        full = bm25.search(COLLECTION, "python fastapi", k=len(DOCS))
+        restricted = bm25.search(COLLECTION, "python fastapi", k=len(DOCS), allowed_ids=allowed)
+        assert restricted == [(did, s) for did, s in full if did in allowed]
+        assert bm25.search(COLLECTION, "python", k=5, allowed_ids={"missing"}) == []
+
+    def test_index_not_used_when_out_of_sync(self):
+        """Без согласованного с BM25 индекса остаётся только построчная проверка."""
+        metadata_index.add_documents(COLLECTION, ["project:1"], [DOCS["project:1"][1]])
+        try:
+            compiled = compile_filters({"tech_category": "language"}, COLLECTION)
+            assert compiled.candidate_ids is None and compiled.where is None
+            restored = MetadataIndex.from_dict(metadata_index.get_index(COLLECTION).to_dict())
+            assert restored.values("tags") == [("llm", "rag")]
+        finally:
+            metadata_index.reset(COLLECTION)
@@ -0,0 +1,354 @@
+"""
+Тесты для графа знаний (app/graph/store.py, app/graph/builder.py).
+"""
+from __future__ import annotations
+
+import datetime
+import random
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app.graph.builder import build_graph_from_export  # noqa: E402
+from app.graph.diff import upsert_graph_from_export  # noqa: E402
+from app.graph.persistence import decode_graph, encode_graph, graph_try_load, graph_try_save_export  # noqa: E402
+from app.graph.query import graph_query, graph_query_with_filters  # noqa: E402
+from app.graph.schema import EdgeType, GraphEdge, GraphNode, NodeType  # noqa: E402
+from app.graph.store import (  # noqa: E402
+    GraphSnapshot,
+    GraphStore,
+    current_graph,
+    get_graph_store,
+    pinned_graph,
+    publish_graph,
+    reset_graph_store,
+)
+from app.rag.entities import EntityRegistry, get_entity_registry  # noqa: E402
+from app.rag.search_types import EntityType, Intent  # noqa: E402
+from app.schemas.export import (  # noqa: E402
+    CompanyExperienceExport,
+    ExperienceProjectExport,
+    ExportPayload,
+    ProfileExport,
+    ProjectExport,
+    TechnologyExport,
+)
+
+
+def _payload(*names: str) -> ExportPayload:
+    techs = [TechnologyExport(id=i, name=n, slug=n.lower()) for i, n in enumerate(names, 1)]
+    return ExportPayload(experiences=[], projects=[], technologies=techs)
+
+
+def _graph_state() -> tuple:
+    snapshot = current_graph()
+    store = snapshot.store
+    nodes = [n for t in NodeType for n in store.get_nodes_by_type(t)]
+    return (
+        sorted((n.id, n.name, n.slug, repr(n.data)) for n in nodes),
+        sorted((e.source_id, e.target_id, e.type.value) for n in nodes for e in store.get_outgoing_edges(n.id)),
+        {alias: (t, slug, name) for alias, t, slug, name in snapshot.registry.to_dict()["aliases"]},
+        dict(snapshot.views),
+    )
+
+
+def _ordered_state(store: GraphStore, registry: EntityRegistry) -> tuple:
+    """Всё, что видно читателям графа, с порядком перечисления."""
+    nodes = [n for t in NodeType for n in store.get_nodes_by_type(t)]
+    return (
+        [[n.id for n in store.get_nodes_by_type(t)] for t in NodeType],
+        [(store.get_outgoing_edges(n.id), store.get_incoming_edges(n.id)) for n in nodes],
+        [store.get_node_by_slug(n.slug) for n in nodes],
+        [store.nodes_by_data(NodeType.TECHNOLOGY, "category", c) for c in ("language", "database", "cloud")],
+        registry.to_dict(),
+    )
+
+
+_CATEGORIES = ("language", "database", "cloud", None)
+
+
+def _random_payload(rng: random.Random) -> ExportPayload:
+    techs = [
+        TechnologyExport(id=i, name=name, slug=name.lower(), category=rng.choice(_CATEGORIES))
+        for i, name in enumerate(["Python", "Go", "Rust", "SQL", "PostgreSQL", "Redis", "Docker", "GCP"], 1)
+    ]
+    experiences = [
+        CompanyExperienceExport(
+            id=i, role="Backend Developer", company_name=f"Company {i}", company_slug=f"company-{i}",
+            start_date=datetime.date(2020, 1, 1), is_current=i == 1,
+            projects=[
+                ExperienceProjectExport(
+                    id=i * 10 + j, name=f"Service {i}{j}", slug=f"service-{i}{j}",
+                    achievements_md="- сократил время ответа вдвое\n- перевёл сборку на Docker",
+                )
+                for j in range(2)
+            ],
+        )
+        for i in range(1, 4)
+    ]
+    projects = [
+        ProjectExport(id=i, name=f"Project {i}", slug=f"project-{i}", featured=i % 2 == 0,
+                      technologies=rng.sample([t.name for t in techs], 3))
+        for i in range(1, 7)
+    ]
+    return ExportPayload(
+        profile=ProfileExport(id=1, full_name="Dmitry", title="Developer"),
+        experiences=experiences, projects=projects, technologies=techs,
+    )
+
+
+def _mutate(payload: ExportPayload, rng: random.Random, step: int) -> ExportPayload:
+    """Несколько мелких правок: вставка в середину, удаление, правка, перестановка."""
+    out = payload.model_copy(deep=True)
+    for _ in range(rng.randint(1, 3)):
+        action = rng.choice(["insert_tech", "delete_tech", "edit_tech", "project_techs",
+                             "insert_project", "delete_project", "swap_projects", "achievements"])
+        if action == "insert_tech":
+            name = f"Tech{step}{rng.randint(0, 99)}"
+            out.technologies.insert(rng.randint(0, len(out.technologies)), TechnologyExport(
+                id=100 + step * 10 + rng.randint(0, 9), name=name, slug=name.lower(),
+                category=rng.choice(_CATEGORIES)))
+        elif action == "delete_tech" and len(out.technologies) > 3:
+            out.technologies.pop(rng.randrange(len(out.technologies)))
+        elif action == "edit_tech":
+            rng.choice(out.technologies).category = rng.choice(_CATEGORIES)
+        elif action == "project_techs":
+            project = rng.choice(out.projects)
+            project.technologies = rng.sample([t.name for t in out.technologies], 2)
+        elif action == "insert_project":
+            pid = 100 + step * 10 + rng.randint(0, 9)
+            out.projects.insert(rng.randint(0, len(out.projects)), ProjectExport(
+                id=pid, name=f"Project {pid}", slug=f"project-{pid}", featured=True,
+                technologies=rng.sample([t.name for t in out.technologies], 2)))
+        elif action == "delete_project" and len(out.projects) > 2:
+            out.projects.pop(rng.randrange(len(out.projects)))
+        elif action == "swap_projects":
+            i, j = rng.sample(range(len(out.projects)), 2)
+            out.projects[i], out.projects[j] = out.projects[j], out.projects[i]
+        elif action == "achievements":
+            project = rng.choice(rng.choice(out.experiences).projects)
+            project.achievements_md = f"- внедрил Go в сервис {step}\n" + (project.achievements_md or "")
+    # id в пределах одного экспорта уникальны
+    out.technologies = list({t.id: t for t in out.technologies}.values())
+    out.projects = list({p.id: p for p in out.projects}.values())
+    return out
+
+
+class TestGraphStore:
+    """Тесты для CSR-представления GraphStore."""
+
+    def test_typed_slices_match_filtered_adjacency(self):
+        """Типизированные срезы совпадают с фильтрацией списка рёбер в порядке добавления."""
+        store = GraphStore()
+        edges = []
+        for i in range(6):
+            store.add_node(GraphNode(f"n{i}", NodeType.PROJECT, f"N{i}", f"n{i}"))
+        for i, (s, t, et) in enumerate([(0, 1, EdgeType.USES), (0, 2, EdgeType.KNOWS), (0, 3, EdgeType.USES),
+                                        (1, 3, EdgeType.USES), (2, 0, EdgeType.BELONGS_TO), (0, 9, EdgeType.USES)]):
+            edge = GraphEdge(f"n{s}", f"n{t}", et, {"i": i})
+            edges.append(edge)
+            store.add_edge(edge)
+        for node in [f"n{i}" for i in range(6)] + ["missing"]:
+            for et in EdgeType:
+                assert store.get_outgoing_edges(node, et) == [e for e in edges if e.source_id == node and e.type == et]
+                assert store.get_incoming_edges(node, et) == [e for e in edges if e.target_id == node and e.type == et]
+        assert [n.id for n in store.neighbors_of_type("n0", EdgeType.USES)] == ["n1", "n3"]
+        assert [n.id for n in store.neighbors_of_type("n3", EdgeType.USES, incoming=True)] == ["n0", "n1"]
+        assert [n.id for n in store.traverse("n2", {EdgeType.BELONGS_TO, EdgeType.USES})] == ["n0", "n1", "n3"]
+        assert store.dangling_edges() == 1
+        assert store.stats()["edges"] == 6 and store.stats()["nodes"] == 6
+
+
+    def test_data_indexes_match_scans(self):
+        """Вторичные индексы дают те же узлы и порядок, что и линейный просмотр."""
+        store = GraphStore()
+        rows = [("a1", "ai-portfolio", ""), ("a2", "", "alor"), ("a3", "Terminal", "alor"), ("a4", None, None)]
+        for nid, proj, comp in rows:
+            store.add_node(GraphNode(nid, NodeType.ACHIEVEMENT, nid, nid, {"project_slug": proj, "company_slug": comp}))
+        store.add_node(GraphNode("t1", NodeType.TECHNOLOGY, "Py", "py", {"category": "Language"}))
+        store.add_node(GraphNode("t2", NodeType.TECHNOLOGY, "Pg", "pg", {"category": "database"}))
+        store.add_node(GraphNode("t1", NodeType.TECHNOLOGY, "Py", "py", {"category": "database"}))
+
+        # обновлённый на месте t1 остаётся на своём месте, как в get_nodes_by_type
+        assert [n.id for n in store.nodes_by_data(NodeType.TECHNOLOGY, "category", "database")] == [
+            n.id for n in store.get_nodes_by_type(NodeType.TECHNOLOGY) if n.data["category"] == "database"
+        ] == ["t1", "t2"]
+        assert store.nodes_by_data(NodeType.TECHNOLOGY, "category", "language") == []
+        assert [n.id for n in store.find_nodes_by_data(NodeType.ACHIEVEMENT, "company_slug", "alor")] == ["a2", "a3"]
+        for key in ("alor", "terminal", "ai", "zzz"):
+            def slug_match(v: str, key=key) -> bool:
+                return key in v or v in key
+
+            expected = [
+                n.id for n in store.get_nodes_by_type(NodeType.ACHIEVEMENT)
+                if slug_match((n.data.get("project_slug") or "").lower())
+                or slug_match((n.data.get("company_slug") or "").lower())
+            ]
+            got = store.nodes_where_data(NodeType.ACHIEVEMENT, {"project_slug": slug_match, "company_slug": slug_match})
+            assert [n.id for n in got] == expected, key
+
+
+class TestGraphSnapshot:
+    """Тесты для GraphSnapshot."""
+
+    def test_rebuild_publishes_pair_atomically(self):
+        """Пересборка не трогает закреплённый снимок; граф и реестр меняются вместе."""
+        build_graph_from_export(_payload("Python"))
+        with pinned_graph() as pinned:
+            build_graph_from_export(_payload("Go", "Rust"))
+            assert get_graph_store() is pinned.store
+            assert get_entity_registry() is pinned.registry
+            assert get_graph_store().stats()["nodes"] == 1
+        snapshot = current_graph()
+        assert snapshot.version > pinned.version
+        assert snapshot.store.stats()["nodes"] == 2
+        assert get_entity_registry() is snapshot.registry
+
+    def test_invalid_rebuild_keeps_previous_graph(self, monkeypatch):
+        """Если проверка не прошла, опубликованным остаётся прежний граф."""
+        build_graph_from_export(_payload("Python"))
+        before = current_graph()
+        monkeypatch.setattr("app.graph.builder.GraphStore.add_node", lambda self, node: None)
+        with pytest.raises(ValueError):
+            build_graph_from_export(_payload("Go"))
+        assert current_graph() is before
+
+    def test_views_match_computed_answers(self):
+        """Материализованные представления совпадают с ответами, вычисленными по графу."""
+        payload = _payload("Python", "Go")
+        payload.technologies[0].category = "Language"
+        payload.technologies[1].category = "language"
+        payload.projects = [ProjectExport(id=1, name="AI Portfolio", slug="ai-portfolio", featured=True,
+                                          technologies=["Python", "Go"])]
+        build_graph_from_export(payload)
+        snapshot = current_graph()
+        view = snapshot.views[(Intent.TECHNOLOGIES, "ai-portfolio", None)]
+        assert graph_query(Intent.TECHNOLOGIES, "ai-portfolio") is view
+        assert graph_query_with_filters(Intent.TECHNOLOGIES, tech_category="language") is \
+            snapshot.views[(Intent.TECHNOLOGIES, None, "language")]
+
+        # тот же граф без представлений — ответы вычисляются
+        with pinned_graph(GraphSnapshot(snapshot.store, snapshot.registry)):
+            for (intent, key, category), view in snapshot.views.items():
+                if category is None:
+                    expected = graph_query(intent, key)
+                elif intent == Intent.LANGUAGES:
+                    expected = graph_query_with_filters(intent)
+                else:
+                    expected = graph_query_with_filters(intent, tech_category=category)
+                assert view == expected, (intent, key, category)
+
+
+class TestGraphPersistence:
+    """Тесты для снапшота графа (app/graph/persistence.py)."""
+
+    def test_snapshot_roundtrip_and_staleness(self, tmp_path):
+        """Граф, реестр и представления восстанавливаются из снапшота; устаревший снапшот игнорируется."""
+        payload = _payload("Python", "Go")
+        build_graph_from_export(payload)
+        graph_try_save_export(payload, tmp_path)
+        before = current_graph()
+
+        reset_graph_store()
+        assert graph_try_load(tmp_path)
+        restored = current_graph()
+        assert restored.store.export() == before.store.export()
+        assert restored.registry.to_dict() == before.registry.to_dict()
+        assert dict(restored.views) == dict(before.views)
+
+        # export.json перезаписан, снапшот — нет: граф строится из экспорта
+        (tmp_path / "graph" / "export.json").write_text(_payload("Rust").model_dump_json())
+        reset_graph_store()
+        assert graph_try_load(tmp_path)
+        assert [n.name for n in get_graph_store().get_nodes_by_type(NodeType.TECHNOLOGY)] == ["Rust"]
+
+
+class TestGraphDiff:
+    """Тесты для инкрементального обновления графа (app/graph/diff.py)."""
+
+    def test_diff_matches_full_rebuild(self):
+        """Дифф по сущностям даёт тот же граф, реестр и представления, что и полная сборка."""
+        payload = _payload("Python", "Go", "Rust", "SQL", "Bash", "Perl")
+        payload.projects = [
+            ProjectExport(id=1, name="AI Portfolio", slug="ai-portfolio", featured=True, technologies=["Python", "Go"]),
+            ProjectExport(id=2, name="Terminal", slug="terminal", featured=False, technologies=["Rust"]),
+        ]
+        reset_graph_store()
+        assert upsert_graph_from_export(payload).full_rebuild
+        version = current_graph().version
+        assert not upsert_graph_from_export(payload).changed
+        assert current_graph().version == version
+
+        changed = payload.model_copy(deep=True)
+        changed.projects[0].technologies = ["Python"]
+        changed.technologies = changed.technologies[:5] + [TechnologyExport(id=7, name="C#", slug="csharp")]
+        diff = upsert_graph_from_export(changed)
+        assert not diff.full_rebuild
+        assert (diff.inserted, diff.updated, diff.deleted) == (["technology:7"], ["project:1"], ["technology:6"])
+
+        incremental = _graph_state()
+        build_graph_from_export(changed)
+        assert _graph_state() == incremental
+
+    @pytest.mark.parametrize("seed", range(8))
+    def test_random_diffs_keep_full_build_order(self, seed):
+        """Цепочка диффов: порядок узлов, соседей, ответов graph_query и представлений как у полной сборки."""
+        rng = random.Random(seed)
+        payload = _random_payload(rng)
+        reset_graph_store()
+        upsert_graph_from_export(payload)
+        incremental_steps = 0
+        for step in range(12):
+            payload = _mutate(payload, rng, step)
+            diff = upsert_graph_from_export(payload)
+            incremental_steps += diff.changed and not diff.full_rebuild
+            snapshot = current_graph()
+            state = _ordered_state(snapshot.store, snapshot.registry)
+            views = list(snapshot.views.items())
+            answers = [graph_query(Intent.TECHNOLOGIES, "go"), graph_query(Intent.PROJECT_DETAILS, "project-1")]
+
+            # снапшот на диске восстанавливает тот же порядок
+            store, registry, _ = decode_graph(encode_graph(snapshot.store, snapshot.registry, b"\0" * 32))
+            assert _ordered_state(store, registry) == state
+
+            build_graph_from_export(payload)
+            full = current_graph()
+            assert _ordered_state(full.store, full.registry) == state, step
+            assert list(full.views.items()) == views, step
+            assert [graph_query(Intent.TECHNOLOGIES, "go"), graph_query(Intent.PROJECT_DETAILS, "project-1")] == answers
+            # следующий шаг — дифф к графу, полученному диффами
+            publish_graph(snapshot.store, snapshot.registry, snapshot.views, snapshot.fragments)
+        assert incremental_steps
+
+    def test_diff_failure_falls_back_to_full_build(self, monkeypatch):
+        """Ошибка применения диффа не ломает инжест: граф собирается целиком."""
+        import app.graph.diff as graph_diff
+
+        payload = _payload("Python", "Go", "Rust", "SQL")
+        reset_graph_store()
+        upsert_graph_from_export(payload)
+
+        def broken(*args, **kwargs):
+            raise ValueError("Graph diff produced 1 dangling edges")
+
+        monkeypatch.setattr(graph_diff, "apply_diff", broken)
+        changed = _payload("Python", "Go", "Rust", "Bash")
+        diff = upsert_graph_from_export(changed)
+        assert diff.full_rebuild and diff.changed
+        assert get_graph_store().get_node_by_slug("bash") is not None
+        assert get_graph_store().get_node_by_slug("sql") is None
+
+    def test_registry_unregister_restores_shadowed_alias(self):
+        """Общий алиас после удаления сущности переходит к предыдущей, replace сохраняет место."""
+        alor = (EntityType.COMPANY, "alor", "ALOR", ["backend developer"])
+        registry = EntityRegistry()
+        registry.register(*alor)
+        registry.register(EntityType.COMPANY, "freelance", "Freelance", ["backend developer"])
+        registry.replace(alor, (EntityType.COMPANY, "alor", "ALOR Broker", ["backend developer"]))
+        assert registry.find_entity("backend developer").slug == "freelance"
+
+        registry.unregister(EntityType.COMPANY, "freelance", "Freelance", ["backend developer"])
+        assert registry.find_entity("backend developer").name == "ALOR Broker"
+        assert registry.find_entity("freelance") is None
+        assert registry.list_by_type(EntityType.COMPANY) == ["alor"]
@@ -0,0 +1,96 @@
+"""
+Тесты для кэша планов PlannerLLM (app/agent/planner/plan_cache.py).
+"""
+from __future__ import annotations
+
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app.agent.planner.plan_cache import PlanCache, plan_cache_key  # noqa: E402
+from app.agent.planner.schemas_v3 import IntentV3, QueryPlanV3, ToolCallV3  # noqa: E402
+from app.indexing.version import bump_index_version  # noqa: E402
+
+_STOP = {"а", "и", "с", "в", "на", "про", "расскажи", "какой", "какие", "есть", "был"}
+
+
+def _embed(text: str) -> list[float]:
+    """Мешок слов без стоп-слов: перефразы с теми же словами дают косинус 1."""
+    vector = np.zeros(64, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        if word not in _STOP:
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+    return vector.tolist()
+
+
+def _entities(text: str):
+    return frozenset(("technology", w) for w in ("python", "java") if w in text.lower())
+
+
+def _plan(intent: IntentV3) -> QueryPlanV3:
+    return QueryPlanV3(intents=[intent], tool_calls=[ToolCallV3(tool="portfolio_search_tool", args={})])
+
+
+def _cache(**kwargs) -> PlanCache:
+    return PlanCache(embed=_embed, entities=_entities, **kwargs)
+
+
+class TestPlanCache:
+    """Тесты для PlanCache."""
+
+    def test_exact_and_semantic_hits(self):
+        """Точное совпадение после нормализации, затем перефраз через ближайшего соседа."""
+        cache = _cache(similarity=0.9)
+        cache.put("Какие проекты с Python?", _plan(IntentV3.TECHNOLOGY_USAGE))
+
+        assert plan_cache_key("  какие  проекты с python ") == plan_cache_key("Какие проекты с Python?")
+        assert cache.get("какие проекты с python").intents == [IntentV3.TECHNOLOGY_USAGE]
+        assert cache.get("Расскажи про проекты на Python").intents == [IntentV3.TECHNOLOGY_USAGE]
+        assert cache.get("где работает") is None
+
+        stats = cache.stats()
+        assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+        assert stats["nearest_similarity"][">=0.99"] == 1
+        assert sum(stats["nearest_similarity"].values()) == 2
+
+    def test_different_entities_never_share_plan(self):
+        """Близкий вопрос про другую сущность — промах, даже выше порога."""
+        cache = _cache(similarity=0.4)
+        cache.put("проекты с Python", _plan(IntentV3.TECHNOLOGY_USAGE))
+        assert cache.get("проекты с Java") is None
+        assert cache.stats()["entity_mismatches"] == 1
+
+    def test_invalidated_by_index_version(self):
+        """Смена версии индексов сбрасывает кэш; план, построенный до смены, не сохраняется."""
+        cache = _cache()
+        cache.put("контакты", _plan(IntentV3.CONTACTS))
+        old = bump_index_version() - 1
+        assert cache.get("контакты") is None
+        assert cache.stats()["invalidations"] == 1
+
+        cache.put("контакты", _plan(IntentV3.CONTACTS), version=old)
+        assert len(cache) == 0
+
+    def test_lru_bound(self):
+        """При переполнении вытесняется давно не использованный план, его вектор — тоже."""
+        cache = _cache(maxsize=2)
+        cache.put("контакты", _plan(IntentV3.CONTACTS))
+        cache.put("где работает", _plan(IntentV3.CURRENT_JOB))
+        assert cache.get("контакты") is not None
+        cache.put("опыт работы", _plan(IntentV3.EXPERIENCE_SUMMARY))
+
+        assert len(cache) == 2
+        assert cache.get("где работает") is None
+        assert cache.get("работает где") is None  # перефраз вытесненного вопроса
+        assert cache.get("опыт работы").intents == [IntentV3.EXPERIENCE_SUMMARY]
+
+    def test_returns_copy(self):
+        """Изменение выданного плана не портит кэш."""
+        cache = _cache()
+        cache.put("контакты", _plan(IntentV3.CONTACTS))
+        cache.get("контакты").intents.append(IntentV3.CURRENT_JOB)
+        assert cache.get("контакты").intents == [IntentV3.CONTACTS]
@@ -0,0 +1,113 @@
+"""
+Тесты для rule-based fast path планировщика (app/agent/planner/fast_path.py).
+"""
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app.agent.planner.fast_path import FastPathPlanner, build_plan, route_question  # noqa: E402
+from app.agent.planner.schemas_v3 import IntentV3, TechCategory  # noqa: E402
+from app.rag.entities import EntityRegistry  # noqa: E402
+from app.rag.search_types import EntityType  # noqa: E402
+
+
+@pytest.fixture
+def registry() -> EntityRegistry:
+    registry = EntityRegistry()
+    registry.register(EntityType.TECHNOLOGY, "python", "Python", [])
+    registry.register(EntityType.TECHNOLOGY, "postgresql", "PostgreSQL", ["postgres"])
+    registry.register(EntityType.TECHNOLOGY, "docker", "Docker", [])
+    registry.register(EntityType.COMPANY, "alor", "ALOR Broker", ["алор"])
+    registry.register(EntityType.PROJECT, "ai-portfolio", "AI-Portfolio", ["ai portfolio"])
+    registry.register(EntityType.PERSON, "person", "Дмитрий", [])
+    return registry
+
+
+def _route(registry: EntityRegistry, question: str):
+    return route_question(question, registry.extract_entities(question), "portfolio_patterns_matched: 1")
+
+
+class TestRouteQuestion:
+    """Тесты для маршрутизации вопросов правилами."""
+
+    @pytest.mark.parametrize("question, intent, entity, category", [
+        ("Контакты", IntentV3.CONTACTS, None, None),
+        ("Где сейчас работает Дмитрий?", IntentV3.CURRENT_JOB, None, None),
+        ("Какие языки программирования знает?", IntentV3.TECHNOLOGY_OVERVIEW, None, "language"),
+        ("какие векторные базы использовал", IntentV3.TECHNOLOGY_OVERVIEW, None, "vector_store"),
+        ("Опыт работы с Python", IntentV3.TECHNOLOGY_USAGE, "python", None),
+        ("стек проекта AI-Portfolio", IntentV3.PROJECT_TECH_STACK, "ai-portfolio", None),
+        ("что делал в алор", IntentV3.EXPERIENCE_SUMMARY, "alor", None),
+    ])
+    def test_unambiguous(self, registry, question, intent, entity, category):
+        """Однозначные вопросы: один intent, не больше одной сущности, уверенность выше порога."""
+        route, reason = _route(registry, question)
+        assert reason == "" and route is not None
+        assert route.intent == intent
+        assert (route.entity.slug if route.entity else None) == entity
+        assert route.tech_category == category
+        assert route.confidence >= 0.8
+
+    @pytest.mark.parametrize("question, reason", [
+        ("расскажи про docker и postgres", "ambiguous_entities"),
+        ("расскажи о себе", "no_rule"),
+        ("какая погода", "no_rule"),
+    ])
+    def test_deferred(self, registry, question, reason):
+        """Несколько сущностей или ни одного правила — вопрос уходит в LLM."""
+        assert _route(registry, question) == (None, reason)
+
+    @pytest.mark.parametrize("question", [
+        "Сравни Python и C#",
+        "где работал и какие проекты делал",
+        "где использовал постгрес",
+    ])
+    def test_low_confidence(self, registry, question):
+        """Составные вопросы и нечёткие совпадения сущностей не проходят порог."""
+        route, _reason = _route(registry, question)
+        assert route is not None and route.confidence < 0.8
+
+
+class TestBuildPlan:
+    """Тесты для QueryPlanV3 fast path."""
+
+    def test_entity_plan(self, registry):
+        """Один вызов graph_query_tool с entity_id, fallback на portfolio_search_tool."""
+        route, _reason = _route(registry, "Опыт работы с Python")
+        plan = build_plan(route)
+        assert plan.intents == [IntentV3.TECHNOLOGY_USAGE]
+        assert [(c.tool, c.args) for c in plan.tool_calls] == [
+            ("graph_query_tool", {"intent": "technology_usage", "entity_id": "technology:python"}),
+        ]
+        assert plan.entities[0]["id"] == "technology:python"
+        assert plan.fallback.tool == "portfolio_search_tool"
+        assert plan.confidence == route.confidence
+
+    def test_tech_filter_only_for_known_categories(self, registry):
+        """tech_filter — только для категорий TechCategory; остальные передаются аргументом tool."""
+        plan = build_plan(_route(registry, "Какие языки программирования знает?")[0])
+        assert plan.tech_filter.category == TechCategory.LANGUAGE
+        plan = build_plan(_route(registry, "какие векторные базы использовал")[0])
+        assert plan.tech_filter is None
+        assert plan.tool_calls[0].args["tech_category"] == "vector_store"
+
+
+class TestFastPathPlanner:
+    """Тесты для статистики FastPathPlanner."""
+
+    def test_stats(self, registry, monkeypatch):
+        """Планы без LLM и причины отказа попадают в stats()."""
+        planner = FastPathPlanner(threshold=0.8)
+        monkeypatch.setattr(planner, "route", lambda q: _route(registry, q))
+        assert planner.plan("Контакты") is not None
+        assert planner.plan("Сравни Python и C#") is None
+        assert planner.plan("расскажи о себе") is None
+        planner.record_llm(1000.0)
+
+        stats = planner.stats()
+        assert stats["questions"] == 3 and stats["fast_path"] == 1
+        assert stats["deferred_reasons"] == {"low_confidence": 1, "no_rule": 1}
+        assert stats["by_intent"] == {"contacts": 1}
+        assert 0 < stats["saved_ms_est"] <= 1000.0
@@ -0,0 +1,256 @@
+"""
+Тесты для реранка: каскад (app/rag/cascade.py) и micro-batching (app/rag/rerank_batcher.py).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from app.rag.cascade import cascade_rerank, feature_map, recall_at_k, shortlist
+from app.rag.rank import rerank
+from app.rag.retrieval import rrf_scores
+from app.rag.types import Doc
+
+
+class _Reranker:
+    def __init__(self, truth: dict[str, float]) -> None:
+        self.truth = truth
+        self.pairs = 0
+
+    def predict(self, pairs):
+        self.pairs += len(pairs)
+        return [self.truth[text] for _, text in pairs]
+
+
+def _fixture():
+    dense_ids = [f"doc:{i}" for i in range(20)]
+    bm_hits = [(f"doc:{i}", 10.0 - i) for i in range(10, 25)]
+    expanded = [f"doc:{i}" for i in range(25, 100)]
+    rrf = rrf_scores([(d, 1.0) for d in dense_ids], bm_hits)
+    features = feature_map(dense_ids, bm_hits, rrf, expanded)
+    docs = [Doc(did, {"doc_id": did, "type": "project", **({"expanded": True} if did in expanded else {})})
+            for did in dense_ids + [d for d, _ in bm_hits if d not in dense_ids] + expanded]
+    # "истина" cross-encoder: лучше всего документы, найденные обоими legs
+    truth = {d.page_content: 1.0 / (1 + i) for i, d in enumerate(sorted(docs, key=lambda d: -rrf.get(d.page_content, 0.0)))}
+    return docs, features, truth
+
+
+class TestCascade:
+    """Тесты для shortlist и cascade_rerank."""
+
+    def test_recall_and_pair_reduction(self):
+        """Shortlist сохраняет top-k полного реранка и сокращает пары cross-encoder."""
+        docs, features, truth = _fixture()
+        full, cascade = _Reranker(truth), _Reranker(truth)
+        reference = rerank(full, "q", docs)
+        got = cascade_rerank(cascade, "q", docs, features, size=24, min_size=8)
+
+        assert recall_at_k(reference, got, 8) == 1.0
+        assert cascade.pairs == 24 and full.pairs == len(docs)
+
+    def test_adaptive_cutoff_keeps_min_size(self):
+        """Отсечка по разрыву скоров не опускает shortlist ниже min_size."""
+        docs, features, _ = _fixture()
+        short = shortlist(docs, features, size=50, min_size=8, gap_ratio=0.99)
+        assert 8 <= len(short) < 50
+
+
+class TestMicroBatchReranker:
+    """Тесты для MicroBatchReranker."""
+
+    def test_concurrent_calls_are_batched(self):
+        """Пары конкурентных вызовов объединяются, каждый получает свои скоры в исходном порядке."""
+        import threading
+        import time
+
+        from app.rag.rerank_batcher import MicroBatchReranker
+
+        calls: list[int] = []
+
+        class _CrossEncoder:
+            def predict(self, pairs):
+                calls.append(len(pairs))
+                time.sleep(0.02)  # пока считается батч, остальные вызовы встают в очередь
+                return [float(len(text)) for _, text in pairs]
+
+        rr = MicroBatchReranker(_CrossEncoder(), window_ms=50, max_pairs=1000)
+        results: dict[int, list[float]] = {}
+
+        def _call(i: int) -> None:
+            results[i] = rr.predict([["q", "x" * (i + j)] for j in range(3)])
+
+        threads = [threading.Thread(target=_call, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        rr.close()
+
+        assert results == {i: [float(i + j) for j in range(3)] for i in range(8)}
+        assert sum(calls) == 24 and len(calls) < 8
+        assert rr.stats()["pairs"] == 24
+
+    def test_single_call_does_not_wait_window(self):
+        """Без конкурентов вызов уходит в predict сразу, не дожидаясь окна."""
+        import time
+
+        from app.rag.rerank_batcher import MicroBatchReranker
+
+        class _CrossEncoder:
+            def predict(self, pairs):
+                return [1.0] * len(pairs)
+
+        rr = MicroBatchReranker(_CrossEncoder(), window_ms=2000, max_pairs=1000)
+        started = time.perf_counter()
+        assert rr.predict([["q", "a"], ["q", "b"]]) == [1.0, 1.0]
+        assert rr.predict([["q", "c"]]) == [1.0]
+        assert time.perf_counter() - started < 1.0
+        rr.close()
+        assert rr.stats()["immediate_batches"] == 2
+
+
+class TestRerankBackends:
+    """Тесты для вспомогательных функций бэкендов реранка."""
+
+    def test_spearman(self):
+        """Spearman: совпадающий, обратный порядок и связи."""
+        from app.rag.rerank_backends import spearman
+
+        assert spearman([1, 2, 3, 4], [10, 20, 30, 40]) == pytest.approx(1.0)
+        assert spearman([1, 2, 3, 4], [4, 3, 2, 1]) == pytest.approx(-1.0)
+        assert 0.0 < spearman([1, 2, 2, 3], [1, 2, 3, 4]) < 1.0
+
+    def test_length_buckets(self):
+        """Батчи идут по возрастанию длины и покрывают все индексы."""
+        from app.rag.rerank_backends import length_buckets
+
+        buckets = length_buckets([50, 10, 40, 20, 30], batch_size=2)
+        assert buckets == [[1, 3], [4, 2], [0]]
+
+    def test_ensure_int8_exports_once_and_atomically(self, tmp_path, monkeypatch):
+        """Экспорт один на всех, упавший экспорт не оставляет файлов, недописанная директория заменяется."""
+        import threading
+
+        from app.rag import rerank_backends
+
+        calls = []
+
+        def fake_export(model_name, out_dir):
+            calls.append(model_name)
+            if model_name == "broken":
+                (Path(out_dir) / "model.int8.onnx").write_bytes(b"half")
+                raise RuntimeError("export failed")
+            (Path(out_dir) / "model.int8.onnx").write_bytes(b"int8")
+            (Path(out_dir) / "report.json").write_text("{}", encoding="utf-8")
+            return {}
+
+        monkeypatch.setattr(rerank_backends, "export_int8", fake_export)
+        cache = tmp_path / "models"
+
+        with pytest.raises(RuntimeError):
+            rerank_backends.ensure_int8("broken", cache)
+        assert not (cache / "broken").exists()
+        assert [p.name for p in cache.iterdir() if not p.name.endswith(".lock")] == []
+
+        stale = rerank_backends.int8_dir("org/model", cache)
+        stale.mkdir(parents=True)
+        (stale / "model.int8.onnx").write_bytes(b"half")  # прерванный экспорт без report.json
+        threads = [threading.Thread(target=rerank_backends.ensure_int8, args=("org/model", cache)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert calls == ["broken", "org/model"]
+        assert (stale / "model.int8.onnx").read_bytes() == b"int8"
+
+    def test_onnx_int8_tiny_model(self, tmp_path):
+        """Экспорт крошечной модели в int8 ONNX: отчёт о корреляции и скоры в шкале sigmoid."""
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("onnx")
+        pytest.importorskip("torch")
+        transformers = pytest.importorskip("transformers")
+        from app.rag.rerank_backends import OnnxInt8CrossEncoder
+
+        src = tmp_path / "tiny"
+        src.mkdir()
+        words = ["rag", "fastapi", "python", "postgresql", "docker", "broker", "backend", "frontend"]
+        (src / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *words]), encoding="utf-8")
+        transformers.BertTokenizer(str(src / "vocab.txt")).save_pretrained(src)
+        config = transformers.BertConfig(
+            vocab_size=len(words) + 5, hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+            intermediate_size=32, max_position_embeddings=64, num_labels=1,
+        )
+        transformers.BertForSequenceClassification(config).save_pretrained(src)
+
+        encoder = OnnxInt8CrossEncoder(str(src), cache_dir=tmp_path / "models", max_tokens=32)
+        report = json.loads((encoder.dir / "report.json").read_text(encoding="utf-8"))
+        assert -1.0 <= report["spearman_min"] <= report["spearman_mean"] <= 1.0
+        scores = encoder.predict([["python", "fastapi backend"], ["rag", "docker"], ["broker", ""]])
+        assert len(scores) == 3 and all(0.0 < x < 1.0 for x in scores)
+
+
+class _LengthScorer:
+    def predict(self, pairs):
+        return [float(len(q) + len(d)) for q, d in pairs]
+
+
+def _length_scorer_factory():
+    return _LengthScorer()
+
+
+class TestProcessReranker:
+    """Тесты для ProcessReranker (predict в пуле процессов)."""
+
+    def test_predict_small_and_shared(self, monkeypatch):
+        """Скоры считаются в воркере — и для пар байтами, и через shared memory."""
+        from app.rag import scoring_pool
+        from app.rag.scoring_pool import ProcessReranker
+
+        rr = ProcessReranker(_length_scorer_factory, workers=1)
+        try:
+            assert rr.warmup().result(timeout=60) is True
+            pairs = [["вопрос", "документ" * i] for i in range(5)]
+            expected = [float(len("вопрос") + len("документ") * i) for i in range(5)]
+            assert rr.predict(pairs) == expected
+            monkeypatch.setattr(scoring_pool, "SHARED_MIN_BYTES", 0)
+            assert rr.predict(pairs) == expected
+            assert rr.predict(pairs) == expected
+        finally:
+            rr.shutdown()
+
+    def test_apredict_does_not_block_event_loop(self, monkeypatch):
+        """apredict ждёт воркер в event loop: пока идёт predict, другие корутины выполняются."""
+        from app.rag import scoring_pool
+        from app.rag.scoring_pool import ProcessReranker
+
+        rr = ProcessReranker(_length_scorer_factory, workers=1)
+        pairs = [["вопрос", "документ" * i] for i in range(5)]
+        expected = [float(len("вопрос") + len("документ") * i) for i in range(5)]
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            task = asyncio.create_task(ticker())
+            try:
+                assert await rr.apredict([]) == []
+                assert await rr.apredict(pairs) == expected
+                monkeypatch.setattr(scoring_pool, "SHARED_MIN_BYTES", 0)
+                assert await rr.apredict(pairs) == expected
+            finally:
+                task.cancel()
+            return ticks
+
+        try:
+            assert rr.warmup().result(timeout=60) is True
+            assert asyncio.run(run()) > 0
+        finally:
+            rr.shutdown()
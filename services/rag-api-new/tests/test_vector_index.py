@@ -0,0 +1,149 @@
+"""
+Тесты для in-process векторного индекса (app/indexing/vector_index.py).
+"""
+from __future__ import annotations
+
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.indexing import vector_index
+from app.indexing.vector_index import LocalVectorStore, UnsupportedFilter, VectorIndex
+from app.indexing.vector_persistence import decode_vectors, encode_vectors, vectors_try_load, vectors_try_save
+
+
+def _corpus(n: int = 200, dim: int = 16, seed: int = 7):
+    rnd = np.random.default_rng(seed)
+    vectors = rnd.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"doc:{i}" for i in range(n)]
+    metas = [{"type": ["project", "technology", "experience"][i % 3], "project_id": i % 10} for i in range(n)]
+    return ids, vectors, [f"text {i}" for i in range(n)], metas
+
+
+def _brute_force(ids, vectors, metas, q, k, allowed=lambda md: True):
+    dist = ((vectors - q) ** 2).sum(axis=1)
+    order = [i for i in np.argsort(dist, kind="stable") if allowed(metas[i])]
+    return [ids[i] for i in order[:k]]
+
+
+class TestVectorIndex:
+    """Тесты для VectorIndex."""
+
+    def test_top_k_matches_brute_force(self):
+        """Top-k совпадает с полным перебором по L2, в т.ч. с фильтрами."""
+        ids, vectors, texts, metas = _corpus()
+        index = VectorIndex()
+        index.upsert(ids, vectors, texts, metas)
+        q = vectors[3] + 0.01
+
+        got = [d.page_content for d, _ in index.search(q, 5)]
+        assert got == [texts[ids.index(i)] for i in _brute_force(ids, vectors, metas, q, 5)]
+
+        where = {"type": {"$in": ["project"]}, "project_id": {"$in": [0, 3]}}
+        hits = index.search(q, 5, where=where)
+        expected = _brute_force(
+            ids, vectors, metas, q, 5,
+            allowed=lambda md: md["type"] == "project" and md["project_id"] in (0, 3),
+        )
+        assert [texts.index(d.page_content) for d, _ in hits] == [ids.index(i) for i in expected]
+
+    def test_upsert_and_delete_keep_rows_aligned(self):
+        """Удаление и повторная вставка не ломают соответствие векторов и id."""
+        ids, vectors, texts, metas = _corpus(n=20)
+        index = VectorIndex()
+        index.upsert(ids, vectors, texts, metas)
+        index.delete(["doc:0", "doc:5"])
+        index.upsert(["doc:7"], vectors[:1], ["replaced"], [{"type": "project"}])
+
+        assert len(index) == 18
+        hit, dist = index.search(vectors[0], 1)[0]
+        assert hit.page_content == "replaced" and dist == pytest.approx(0.0, abs=1e-4)
+        assert index.get(["doc:0", "doc:19"])["ids"] == ["doc:19"]
+
+    def test_unsupported_filter(self):
+        """Неподдерживаемые операторы фильтра отдаются в Chroma."""
+        ids, vectors, texts, metas = _corpus(n=5)
+        index = VectorIndex()
+        index.upsert(ids, vectors, texts, metas)
+        with pytest.raises(UnsupportedFilter):
+            index.search(vectors[0], 1, where={"project_id": {"$gt": 1}})
+
+    def test_local_store_falls_back_to_chroma(self):
+        """LocalVectorStore: локальный поиск, fallback и дозапрос пропущенных id."""
+
+        class _Chroma:
+            def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+                return ["chroma"]
+
+            def get(self, ids=None, include=None):
+                return {"ids": ids, "documents": ["from chroma"] * len(ids), "metadatas": [{}] * len(ids)}
+
+        ids, vectors, texts, metas = _corpus(n=5)
+        vector_index.upsert("test", ids, vectors, texts, metas)
+        try:
+            store = LocalVectorStore(_Chroma(), "test")
+            assert store.similarity_search_by_vector(vectors[2], k=1)[0].page_content == "text 2"
+            assert store.similarity_search_by_vector(vectors[2], k=1, filter={"project_id": {"$gt": 1}}) == ["chroma"]
+            data = store.get(ids=["doc:1", "missing"])
+            assert data["documents"] == ["text 1", "from chroma"]
+        finally:
+            vector_index.reset("test")
+
+
+class TestVectorSnapshot:
+    """Тесты для снапшота векторного индекса."""
+
+    def test_roundtrip(self, tmp_path):
+        """Снапшот восстанавливает векторы, тексты и метаданные."""
+        ids, vectors, texts, metas = _corpus(n=30)
+        index = VectorIndex()
+        index.upsert(ids, vectors, texts, metas)
+        restored = decode_vectors(encode_vectors(index))
+        q = vectors[11]
+        assert [d.page_content for d, _ in restored.search(q, 3)] == [d.page_content for d, _ in index.search(q, 3)]
+
+        vector_index.install("test", index)
+        try:
+            vectors_try_save("test", data_dir=tmp_path)
+            vector_index.reset("test")
+            assert vectors_try_load("test", data_dir=tmp_path) is True
+            assert len(vector_index.get_index("test")) == 30
+        finally:
+            vector_index.reset("test")
+
+    def test_checksum_mismatch_falls_back_to_chroma(self, tmp_path):
+        """Повреждённый снапшот не загружается: индекс заполняется из Chroma, снапшот перезаписывается."""
+        ids, vectors, texts, metas = _corpus(n=30)
+        index = VectorIndex()
+        index.upsert(ids, vectors, texts, metas)
+        data = encode_vectors(index)
+
+        # матрица изменена, meta (crc32) — прежняя
+        with np.load(io.BytesIO(data)) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+        arrays["matrix"] = arrays["matrix"] + 1.0
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        with pytest.raises(ValueError, match="checksum"):
+            decode_vectors(buf.getvalue())
+
+        class _Collection:
+            def get(self, ids=None, include=None):
+                return {"ids": ids_chroma, "embeddings": vectors[:10], "documents": texts[:10], "metadatas": metas[:10]}
+
+        class _Chroma:
+            _collection = _Collection()
+
+        ids_chroma = ids[:10]
+        path = tmp_path / "vectors" / "test.npz"
+        path.parent.mkdir()
+        path.write_bytes(buf.getvalue())
+        try:
+            assert vectors_try_load("test", data_dir=tmp_path) is False
+            assert vectors_try_load("test", data_dir=tmp_path, vs=_Chroma()) is True
+            assert len(vector_index.get_index("test")) == 10
+            assert len(decode_vectors(path.read_bytes())) == 10
+        finally:
+            vector_index.reset("test")
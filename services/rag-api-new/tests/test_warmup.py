@@ -0,0 +1,63 @@
+"""
+Тесты для warm start (app/warmup.py).
+"""
+from __future__ import annotations
+
+import pytest
+
+from app import warmup
+from app.indexing.version import index_version
+
+
+@pytest.fixture
+def state(monkeypatch):
+    """Чистое состояние warm start с подменёнными загрузчиками."""
+    fresh = warmup.WarmupState()
+    monkeypatch.setattr(warmup, "_STATE", fresh)
+    monkeypatch.setattr(warmup, "_post_loaders", lambda: {})
+    return fresh
+
+
+class TestWarmStart:
+    """Тесты для warm_start."""
+
+    def test_bumps_index_version_after_loaders(self, state, monkeypatch):
+        """Версия индексов растёт после всех загрузчиков (и postings сущностей) и до готовности."""
+        seen = []
+
+        def loader() -> bool:
+            seen.append(index_version())
+            return True
+
+        def failing() -> bool:
+            raise RuntimeError("broken snapshot")
+
+        monkeypatch.setattr(warmup, "_loaders", lambda: {"bm25": loader, "graph": loader, "vectors": failing})
+        monkeypatch.setattr(warmup, "_post_loaders", lambda: {"entity_postings": loader})
+        before = index_version()
+
+        assert warmup.warm_start() is state
+        assert seen == [before, before, before]
+        assert list(state.indexes)[-1] == "entity_postings"
+        assert index_version() == before + 1
+        assert state.ready
+        assert state.indexes["bm25"].loaded and state.indexes["vectors"].error == "broken snapshot"
+
+        # повторный вызов ничего не загружает и версию не меняет
+        assert warmup.warm_start() is state
+        assert index_version() == before + 1
+
+    def test_indexes_replaced_not_mutated(self, state, monkeypatch):
+        """/readyz читает indexes без блокировки: словарь заменяется, а не меняется на месте."""
+        views = []
+
+        def loader() -> bool:
+            views.append((state.indexes, dict(state.indexes), state.to_dict()))
+            return True
+
+        monkeypatch.setattr(warmup, "_loaders", lambda: {f"index{i}": loader for i in range(4)})
+        warmup.warm_start()
+
+        for published, copy, payload in views:
+            assert published == copy and not payload["ready"]
+        assert sorted(state.to_dict()["indexes"]) == [f"index{i}" for i in range(4)]